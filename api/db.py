@@ -0,0 +1,27 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from config.settings import Config
+from database.connection import ARCHIVE_DB_PATH, ARCHIVE_SCHEMA, SQLALCHEMY_DATABASE_URL
+
+# Та же база, что и у приложения, через асинхронный драйвер aiosqlite
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=Config.API_DB_POOL_SIZE,
+    max_overflow=Config.API_DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    connect_args={"timeout": 15},  # как и у приложения: ждем, если база занята
+)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _attach_archive(dbapi_connection, connection_record):
+    # Холодный архив журналов, как у соединений приложения (database/connection.py):
+    # журнал планов, перенесенных в архив, читается из схемы "archive"
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (ARCHIVE_DB_PATH,))
+    cursor.close()
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
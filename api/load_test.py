@@ -0,0 +1,219 @@
+"""
+Нагрузочный тест локального API: запросы в секунду и задержки (p50/p95/p99).
+
+Запуск из корня проекта (сервер поднимается автоматически на свободном порту):
+    python -m api.load_test
+    python -m api.load_test --duration 20 --concurrency 50 --write --output bench_output.txt
+Или против уже запущенного сервера:
+    python -m api.load_test --url http://127.0.0.1:8601
+
+Код выхода 1 при ошибках (5xx, обрывы соединения) или если p99 превышает --max-p99-ms.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import aiohttp
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Смесь запросов: операция -> вес (запись включается флагом --write)
+READ_MIX = {"student": 30, "plan": 25, "plan_logs": 25, "students_stream": 10}
+WRITE_MIX = {"journal_batch": 10}
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Перцентиль по ближайшему рангу (values отсортированы)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(session: aiohttp.ClientSession, url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{url}/api/health") as r:
+                if r.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Сервер API не ответил на /api/health")
+
+
+async def _read_ndjson(response: aiohttp.ClientResponse) -> list:
+    return [json.loads(line) async for line in response.content if line.strip()]
+
+
+class LoadTest:
+    def __init__(self, url: str, concurrency: int, duration: float, write: bool):
+        self.url = url
+        self.concurrency = concurrency
+        self.duration = duration
+        self.mix = dict(READ_MIX, **(WRITE_MIX if write else {}))
+        self.latencies = defaultdict(list)  # операция -> [мс]
+        self.statuses = defaultdict(lambda: defaultdict(int))  # операция -> {код: число}
+        self.errors = 0
+        self.student_ids = []
+        self.plan_ids = []
+
+    async def prepare(self, session: aiohttp.ClientSession):
+        """Идентификаторы учеников и их активных планов для запросов."""
+        async with session.get(f"{self.url}/api/students") as r:
+            self.student_ids = [s["id"] for s in await _read_ndjson(r)]
+        for student_id in self.student_ids:
+            async with session.get(f"{self.url}/api/students/{student_id}/plan") as r:
+                if r.status == 200:
+                    self.plan_ids.append((await r.json())["id"])
+        if not self.student_ids:
+            raise RuntimeError("В базе нет учеников — заполните демо-данные")
+
+    async def _journal_batch(self, session: aiohttp.ClientSession) -> int:
+        """Чтение журнала плана за неделю и повторное сохранение тех же записей с их версиями."""
+        plan_id = random.choice(self.plan_ids)
+        async with session.get(f"{self.url}/api/plans/{plan_id}/logs") as r:
+            logs = await _read_ndjson(r)
+        if not logs:
+            return 200
+        last_day = logs[-1]["date"]
+        entries = [
+            {k: log[k] for k in ("item_id", "date", "status", "score", "notes", "version")}
+            for log in logs if log["date"] == last_day
+        ]
+        async with session.post(f"{self.url}/api/journal/batch", json={"entries": entries}) as r:
+            await r.read()
+            return r.status
+
+    async def _request(self, session: aiohttp.ClientSession, op: str) -> int:
+        if op == "journal_batch":
+            return await self._journal_batch(session)
+        if op == "student":
+            path = f"/api/students/{random.choice(self.student_ids)}"
+        elif op == "plan":
+            path = f"/api/students/{random.choice(self.student_ids)}/plan"
+        elif op == "plan_logs":
+            path = f"/api/plans/{random.choice(self.plan_ids)}/logs"
+        else:
+            path = "/api/students"
+        async with session.get(self.url + path) as r:
+            await r.read()  # полное тело, включая потоковые ответы
+            return r.status
+
+    async def _worker(self, session: aiohttp.ClientSession, deadline: float):
+        ops, weights = list(self.mix), list(self.mix.values())
+        if not self.plan_ids:
+            weights = [0 if op in ("plan_logs", "journal_batch") else w for op, w in zip(ops, weights)]
+        while time.monotonic() < deadline:
+            op = random.choices(ops, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status = await self._request(session, op)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.errors += 1
+                continue
+            self.latencies[op].append((time.perf_counter() - t0) * 1000)
+            self.statuses[op][status] += 1
+            if status >= 500:
+                self.errors += 1
+
+    async def run(self) -> dict:
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await _wait_ready(session, self.url)
+            await self.prepare(session)
+            started = time.monotonic()
+            deadline = started + self.duration
+            await asyncio.gather(*(self._worker(session, deadline) for _ in range(self.concurrency)))
+            elapsed = time.monotonic() - started
+
+        def summary(values):
+            values = sorted(values)
+            return {
+                "requests": len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1] if values else 0.0,
+            }
+
+        all_latencies = [v for values in self.latencies.values() for v in values]
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "concurrency": self.concurrency,
+            "duration_s": round(elapsed, 2),
+            "rps": len(all_latencies) / elapsed if elapsed else 0.0,
+            "errors": self.errors,
+            "total": summary(all_latencies),
+            "operations": {
+                op: dict(summary(values), statuses=dict(self.statuses[op]))
+                for op, values in sorted(self.latencies.items())
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест локального API")
+    parser.add_argument("--url", help="адрес запущенного API (по умолчанию сервер запускается автоматически)")
+    parser.add_argument("--duration", type=float, default=10, help="длительность, сек")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных клиентов")
+    parser.add_argument("--write", action="store_true", help="добавить пакетную запись журнала")
+    parser.add_argument("--max-p99-ms", type=float, help="допустимый p99 по всем запросам, мс")
+    parser.add_argument("--output", help="дописать результат (JSON-строка) в файл")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "api.server", "--port", str(port)],
+            cwd=PROJECT_DIR, stdout=subprocess.DEVNULL,
+        )
+    try:
+        report = asyncio.run(LoadTest(url.rstrip("/"), args.concurrency, args.duration, args.write).run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    total = report["total"]
+    print(f"{total['requests']} запросов за {report['duration_s']} с, {args.concurrency} клиентов: "
+          f"{report['rps']:.0f} запросов/с, ошибок {report['errors']}")
+    print(f"{'операция':<18} {'запросов':>8} {'p50':>8} {'p95':>8} {'p99':>8}  коды ответа")
+    for op, s in list(report["operations"].items()) + [("ВСЕГО", total)]:
+        codes = ", ".join(f"{k}: {v}" for k, v in sorted(s.get("statuses", {}).items()))
+        print(f"{op:<18} {s['requests']:>8} {s['p50_ms']:>6.1f}мс {s['p95_ms']:>6.1f}мс {s['p99_ms']:>6.1f}мс  {codes}")
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    failed = False
+    if report["errors"]:
+        print("ОШИБКА: есть неуспешные запросы")
+        failed = True
+    if args.max_p99_ms is not None and total["p99_ms"] > args.max_p99_ms:
+        print("ОШИБКА: p99 превышает допустимое значение")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""
+Локальный JSON API для интеграций (расписание, школьный портал).
+
+Работает отдельным процессом рядом с приложением и с той же базой:
+    python -m api.server
+    python -m api.server --host 127.0.0.1 --port 8601
+
+Чтение и запись идут через те же сервисы, что и у страниц (внутри
+AsyncSession.run_sync), длинные списки отдаются потоком JSON Lines
+(application/x-ndjson), запись — пакетами в одной транзакции.
+"""
+import argparse
+import json
+from datetime import date
+from functools import partial
+
+from aiohttp import web
+from sqlalchemy import literal, select
+
+from api.db import AsyncSessionLocal, async_engine
+from config.settings import Config
+from database.connection import engine
+from database.models import DiagnosticType, Exercise, LogStatus, SkillCategory, Student
+from database.schema import bootstrap_schema
+from services.change_journal import ChangeFeed, ChangeLogGapError, latest_seq, read_changes
+from services.concurrency import VersionConflictError
+from services.diagnostic_service import DiagnosticService
+from services.log_service import LogService
+from services.student_service import StudentService
+
+# Сколько строк забирать из курсора за раз при потоковой выдаче
+STREAM_PARTITION = 500
+
+routes = web.RouteTableDef()
+
+# Кириллица в ответах без \uXXXX-экранирования
+_dumps = partial(json.dumps, ensure_ascii=False)
+json_response = partial(web.json_response, dumps=_dumps)
+
+
+class ValidationError(ValueError):
+    """Некорректные данные запроса (ответ 400)."""
+
+
+# --- Разбор входных данных ---
+
+def _parse_date(value, field: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{field}: ожидается дата в формате ГГГГ-ММ-ДД")
+
+
+def _parse_int(value, field: str, optional: bool = False):
+    if value is None and optional:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{field}: ожидается целое число")
+
+
+async def _read_batch(request: web.Request, key: str) -> list:
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise ValidationError("Тело запроса должно быть JSON")
+    items = body.get(key) if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValidationError(f"Ожидается непустой список '{key}'")
+    if len(items) > Config.API_MAX_BATCH:
+        raise web.HTTPRequestEntityTooLarge(
+            max_size=Config.API_MAX_BATCH, actual_size=len(items),
+            text=_dumps({"error": f"Не больше {Config.API_MAX_BATCH} элементов в пакете"}),
+            content_type="application/json",
+        )
+    return items
+
+
+def _int_path(request: web.Request, name: str) -> int:
+    return _parse_int(request.match_info[name], name)
+
+
+def _unknown_references(db, student_ids: set, skill_ids: set):
+    """id учеников и навыков из пакета, которых нет в базе (один запрос на весь пакет)."""
+    stmt = select(literal("student"), Student.id).where(Student.id.in_(student_ids))\
+        .union_all(select(literal("skill"), SkillCategory.id).where(SkillCategory.id.in_(skill_ids)))
+    found = {"student": set(), "skill": set()}
+    for kind, ref_id in db.execute(stmt):
+        found[kind].add(ref_id)
+    return sorted(student_ids - found["student"]), sorted(skill_ids - found["skill"])
+
+
+# --- Сериализация (вызывается внутри run_sync, пока доступна ленивая загрузка) ---
+
+def _student_dict(s: Student) -> dict:
+    return {
+        "id": s.id,
+        "full_name": s.full_name,
+        "birth_date": s.birth_date.isoformat() if s.birth_date else None,
+        "diagnosis_code": s.diagnosis_code,
+        "parent_contact": s.parent_contact,
+        "active": s.active,
+        "medical_tags": [t for t in (s.medical_tags or "").split(",") if t],
+    }
+
+
+def _diagnostic_dict(d) -> dict:
+    return {
+        "id": d.id,
+        "student_id": d.student_id,
+        "teacher_id": d.teacher_id,
+        "date": d.date.isoformat() if isinstance(d.date, date) else d.date,
+        "type": d.type.value,
+        "summary": d.summary,
+        "scores": {r.skill_id: r.score for r in d.results},
+    }
+
+
+def _plan_dict(plan) -> dict:
+    return {
+        "id": plan.id,
+        "student_id": plan.student_id,
+        "status": plan.status.value,
+        "goal": plan.goal_description,
+        "start_date": plan.start_date.isoformat() if plan.start_date else None,
+        "end_date": plan.end_date.isoformat() if plan.end_date else None,
+        "version": plan.version,
+        "items": [
+            {
+                "id": item.id,
+                "exercise_id": item.exercise_id,
+                "title": item.exercise_title,
+                "frequency": item.frequency,
+                "target_score": item.target_score,
+                "order_index": item.order_index,
+                "version": item.version,
+            }
+            for item in plan.items
+        ],
+    }
+
+
+async def _stream_rows(request: web.Request, stmt, to_dict) -> web.StreamResponse:
+    """Потоковая выдача результата запроса в формате JSON Lines."""
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson; charset=utf-8"})
+    await response.prepare(request)
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions(STREAM_PARTITION):
+            chunk = "".join(_dumps(to_dict(row)) + "\n" for row in partition)
+            await response.write(chunk.encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+# --- Ошибки ---
+
+@web.middleware
+async def error_middleware(request: web.Request, handler):
+    try:
+        return await handler(request)
+    except ValidationError as e:
+        return json_response({"error": str(e)}, status=400)
+    except VersionConflictError as e:
+        return json_response({"error": str(e), "current": e.current}, status=409)
+    except ChangeLogGapError as e:
+        return json_response({"error": str(e)}, status=410)
+
+
+# --- Ученики ---
+
+@routes.get("/api/health")
+async def health(request: web.Request):
+    return json_response({"status": "ok"})
+
+
+@routes.get("/api/students")
+async def list_students(request: web.Request):
+    """Все ученики потоком JSON Lines. ?active_only=0 — включая выбывших."""
+    stmt = select(Student).order_by(Student.id)
+    if request.query.get("active_only", "1") != "0":
+        stmt = stmt.where(Student.active == True)
+    return await _stream_rows(request, stmt, lambda row: _student_dict(row[0]))
+
+
+@routes.get("/api/students/{student_id}")
+async def get_student(request: web.Request):
+    student_id = _int_path(request, "student_id")
+    async with AsyncSessionLocal() as session:
+        data = await session.run_sync(
+            lambda db: (lambda s: _student_dict(s) if s else None)(StudentService(db).get_student_by_id(student_id))
+        )
+    if data is None:
+        return json_response({"error": "Ученик не найден"}, status=404)
+    return json_response(data)
+
+
+@routes.post("/api/students/batch")
+async def create_students(request: web.Request):
+    """{"students": [{full_name, birth_date, diagnosis_code, parent_contact, medical_tags}]}"""
+    items = await _read_batch(request, "students")
+    rows = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("full_name"):
+            raise ValidationError(f"students[{i}].full_name: обязательное поле")
+        tags = item.get("medical_tags") or []
+        if not isinstance(tags, list):
+            raise ValidationError(f"students[{i}].medical_tags: ожидается список")
+        rows.append({
+            "full_name": str(item["full_name"]).strip(),
+            "birth_date": _parse_date(item.get("birth_date"), f"students[{i}].birth_date"),
+            "diagnosis_code": item.get("diagnosis_code"),
+            "parent_contact": item.get("parent_contact"),
+            "medical_tags": [str(t).strip() for t in tags if str(t).strip()],
+        })
+
+    async with AsyncSessionLocal() as session:
+        ids = await session.run_sync(lambda db: [s.id for s in StudentService(db).create_students(rows)])
+    return json_response({"ids": ids}, status=201)
+
+
+# --- Диагностика ---
+
+@routes.get("/api/students/{student_id}/diagnostics")
+async def list_diagnostics(request: web.Request):
+    student_id = _int_path(request, "student_id")
+    async with AsyncSessionLocal() as session:
+        data = await session.run_sync(
+            lambda db: [_diagnostic_dict(d) for d in DiagnosticService(db).get_all_diagnostics(student_id)]
+        )
+    return json_response(data)
+
+
+@routes.post("/api/diagnostics/batch")
+async def create_diagnostics(request: web.Request):
+    """{"diagnostics": [{student_id, teacher_id, type, date, summary, scores: {skill_id: балл}}]}"""
+    items = await _read_batch(request, "diagnostics")
+    types = {t.value for t in DiagnosticType}
+    parsed = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValidationError(f"diagnostics[{i}]: ожидается объект")
+        if item.get("type") not in types:
+            raise ValidationError(f"diagnostics[{i}].type: одно из {sorted(types)}")
+        scores = item.get("scores")
+        if not isinstance(scores, dict) or not scores:
+            raise ValidationError(f"diagnostics[{i}].scores: ожидается непустой объект {{skill_id: балл}}")
+        try:
+            scores = {int(k): float(v) for k, v in scores.items()}
+        except (TypeError, ValueError):
+            raise ValidationError(f"diagnostics[{i}].scores: id навыков и баллы должны быть числами")
+        if any(not 0 <= v <= 5 for v in scores.values()):
+            raise ValidationError(f"diagnostics[{i}].scores: баллы от 0 до 5")
+        parsed.append({
+            "student_id": _parse_int(item.get("student_id"), f"diagnostics[{i}].student_id"),
+            "teacher_id": _parse_int(item.get("teacher_id", 1), f"diagnostics[{i}].teacher_id"),
+            "type": item["type"],
+            "date": _parse_date(item["date"], f"diagnostics[{i}].date") if item.get("date") else None,
+            "summary": item.get("summary", ""),
+            "scores": scores,
+        })
+
+    def save(db):
+        # SQLite без PRAGMA foreign_keys не проверяет ссылки — проверяем сами, до записи пакета
+        students, skills = _unknown_references(
+            db, {p["student_id"] for p in parsed}, {skill_id for p in parsed for skill_id in p["scores"]}
+        )
+        missing = ([f"учеников {students}"] if students else []) + ([f"навыков {skills}"] if skills else [])
+        if missing:
+            raise ValidationError("diagnostics: нет в базе " + ", ".join(missing))
+        return [d.id for d in DiagnosticService(db).save_diagnostics(parsed)]
+
+    async with AsyncSessionLocal() as session:
+        ids = await session.run_sync(save)
+    return json_response({"ids": ids}, status=201)
+
+
+# --- Планы и журнал ---
+
+@routes.get("/api/students/{student_id}/plan")
+async def get_active_plan(request: web.Request):
+    student_id = _int_path(request, "student_id")
+    async with AsyncSessionLocal() as session:
+        data = await session.run_sync(
+            lambda db: (lambda p: _plan_dict(p) if p else None)(LogService(db).get_active_plan(student_id))
+        )
+    if data is None:
+        return json_response({"error": "Нет активного плана"}, status=404)
+    return json_response(data)
+
+
+@routes.get("/api/plans/{plan_id}/logs")
+async def list_plan_logs(request: web.Request):
+    """Журнал плана потоком JSON Lines. ?start=ГГГГ-ММ-ДД&end=ГГГГ-ММ-ДД — необязательный период."""
+    plan_id = _int_path(request, "plan_id")
+    # Основные таблицы или холодный архив — как у отчетов (LogService.plan_entities)
+    async with AsyncSessionLocal() as session:
+        item, log = await session.run_sync(lambda db: LogService(db).plan_entities(plan_id))
+    # Пункт без методики (упражнение удалено из базы) остается в журнале с title = null
+    stmt = select(
+        log.plan_item_id, log.date, log.status,
+        log.performance_score, log.teacher_notes, log.version, Exercise.title,
+    ).join(item, log.plan_item_id == item.id)\
+        .outerjoin(Exercise, item.exercise_id == Exercise.id)\
+        .where(item.plan_id == plan_id)\
+        .order_by(log.date, item.order_index)
+    if "start" in request.query:
+        stmt = stmt.where(log.date >= _parse_date(request.query["start"], "start"))
+    if "end" in request.query:
+        stmt = stmt.where(log.date <= _parse_date(request.query["end"], "end"))
+
+    return await _stream_rows(request, stmt, lambda row: {
+        "item_id": row.plan_item_id,
+        "date": row.date.isoformat(),
+        "status": row.status.value,
+        "score": row.performance_score,
+        "notes": row.teacher_notes,
+        "version": row.version,
+        "title": row.title,
+    })
+
+
+@routes.post("/api/journal/batch")
+async def save_journal(request: web.Request):
+    """
+    {"entries": [{item_id, date, status, score, notes, version}]}
+    version — версия записи, на которой основано изменение (null — новая запись).
+    Записи без конфликтов сохраняются; при конфликтах ответ 409 с их списком.
+    """
+    items = await _read_batch(request, "entries")
+    statuses = {s.value for s in LogStatus}
+    entries = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValidationError(f"entries[{i}]: ожидается объект")
+        if item.get("status") not in statuses:
+            raise ValidationError(f"entries[{i}].status: одно из {sorted(statuses)}")
+        score = _parse_int(item.get("score"), f"entries[{i}].score", optional=True)
+        if score is not None and not 1 <= score <= 5:
+            raise ValidationError(f"entries[{i}].score: от 1 до 5")
+        entries.append({
+            "item_id": _parse_int(item.get("item_id"), f"entries[{i}].item_id"),
+            "date": _parse_date(item.get("date"), f"entries[{i}].date"),
+            "status": item["status"],
+            "score": score,
+            "notes": item.get("notes") or "",
+            "version": _parse_int(item.get("version"), f"entries[{i}].version", optional=True),
+        })
+
+    async with AsyncSessionLocal() as session:
+        versions, conflicts = await session.run_sync(lambda db: LogService(db).apply_daily_logs(entries))
+
+    body = {
+        "versions": versions,
+        "conflicts": [
+            {"entry": dict(c["entry"], date=c["entry"]["date"].isoformat()), "current": c["current"]}
+            for c in conflicts
+        ],
+    }
+    return json_response(body, status=409 if conflicts else 200)
+
+
+# --- Журнал изменений ---
+
+@routes.get("/api/changes")
+async def list_changes(request: web.Request):
+    """
+    Изменения данных по порядку: {"changes": [{seq, entity, id, op}], "latest": seq}.
+    ?consumer=имя — после сохраненной позиции потребителя (подтверждается POST /api/changes/ack),
+    ?after=seq — после указанного номера (позицию хранит клиент). ?limit=N — не больше N (до API_MAX_BATCH).
+    id = null — изменено много строк сразу, сущность нужно перечитать целиком.
+    Ответ 410 — записи после позиции уже удалены очисткой: нужно перечитать данные целиком.
+    """
+    limit = min(_parse_int(request.query.get("limit", Config.API_MAX_BATCH), "limit"), Config.API_MAX_BATCH)
+    consumer = request.query.get("consumer")
+    after = _parse_int(request.query.get("after", 0), "after")
+
+    def read(db):
+        changes = ChangeFeed(db, consumer).read(limit) if consumer else read_changes(db, after, limit=limit)
+        return changes, latest_seq(db)
+
+    async with AsyncSessionLocal() as session:
+        changes, latest = await session.run_sync(read)
+    return json_response({
+        "changes": [{"seq": c.seq, "entity": c.entity, "id": c.entity_id, "op": c.op} for c in changes],
+        "latest": latest,
+    })
+
+
+@routes.post("/api/changes/ack")
+async def ack_changes(request: web.Request):
+    """{"consumer": имя, "seq": номер} — изменения до seq включительно обработаны."""
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise ValidationError("Тело запроса должно быть JSON")
+    if not isinstance(body, dict) or not body.get("consumer"):
+        raise ValidationError("consumer: обязательное поле")
+    consumer, seq = str(body["consumer"]), _parse_int(body.get("seq"), "seq")
+    async with AsyncSessionLocal() as session:
+        await session.run_sync(lambda db: ChangeFeed(db, consumer).commit(seq))
+    return json_response({"consumer": consumer, "seq": seq})
+
+
+# --- Приложение ---
+
+async def _on_startup(app: web.Application):
+    # Та же проверка версии схемы, что и при старте приложения
+    bootstrap_schema(engine)
+
+
+async def _on_cleanup(app: web.Application):
+    await async_engine.dispose()
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[error_middleware], client_max_size=16 * 1024 ** 2)
+    app.add_routes(routes)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный JSON API ИОМ")
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--port", type=int, default=Config.API_PORT)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
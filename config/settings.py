@@ -6,6 +6,74 @@ class Config:
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     DB_NAME = "app.db"
     DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, DB_NAME)}"
+
+    # Пул соединений приложения с базой: постоянные + временные сверх них.
+    # Каждый одновременный перезапуск страницы держит соединение до своего окончания,
+    # поэтому сумма — с запасом на число одновременно работающих специалистов
+    # (проверка: python -m utils.load_test)
+    DB_POOL_SIZE = 10
+    DB_MAX_OVERFLOW = 50
+    # Журнал WAL основной базы: чтение не блокирует запись, а запись — чтение
+    # (режим сохраняется в файле БД; холодный архив всегда в режиме DELETE)
+    DB_WAL = True
+    # Отчеты и аналитика читают через отдельный движок только для чтения (тот же размер пула).
+    # None — тот же файл SQLite, открытый с mode=ro; для других СУБД — адрес реплики
+    READ_DATABASE_URL = None
+
+    # Локальная очередь записей журнала (write-behind): каталог с файлами очереди
+    JOURNAL_QUEUE_DIR = os.path.join(BASE_DIR, "journal_queue")
+    # Как часто фоновый процесс переносит очередь в основную БД (сек)
+    JOURNAL_FLUSH_INTERVAL = 1.0
+
+    # Холодный архив: через сколько дней после архивации плана его пункты и журнал
+    # переносятся в archive.db, и как часто запускается перенос (сек)
+    ARCHIVE_AFTER_DAYS = 180
+    ARCHIVE_INTERVAL = 6 * 3600
+
+    # Мягкое удаление учеников: через сколько дней скрытые ученики удаляются окончательно
+    # вместе со всеми данными, и как часто запускается очистка (сек)
+    STUDENT_PURGE_AFTER_DAYS = 30
+    STUDENT_PURGE_INTERVAL = 3600
+
+    # Журнал изменений (services/change_journal.py): сколько последних записей хранить
+    # и как часто удалять более старые (сек)
+    CHANGE_LOG_KEEP = 1_000_000
+    CHANGE_LOG_PRUNE_INTERVAL = 6 * 3600
+
+    # Резервные копии (utils/backup.py): каталог, как часто снимать (сек),
+    # сколько копий хранить и не дольше скольких дней
+    BACKUP_DIR = os.path.join(BASE_DIR, "backups")
+    BACKUP_INTERVAL = 24 * 3600
+    BACKUP_KEEP = 7
+    BACKUP_RETENTION_DAYS = 30
+    # Страниц за один шаг копирования и пауза между шагами (сек): блокировка чтения
+    # держится только на время шага, пауза дает писателям пройти
+    BACKUP_PAGES_PER_STEP = 256
+    BACKUP_STEP_SLEEP = 0.005
+
+    # Кэш справочных списков (services/read_cache.py): срок жизни записи (сек) —
+    # столько могут быть не видны изменения из других процессов — и максимум записей
+    READ_CACHE_TTL = 60
+    READ_CACHE_SIZE = 64
+
+    # Профилирование страниц (utils/profiler.py): каталог профилей, сколько последних
+    # хранить и интервал выборки стека для flame graph (сек)
+    PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+    PROFILE_KEEP = 20
+    PROFILE_SAMPLE_INTERVAL = 0.005
+
+    # Снимок данных, который восстанавливает кнопка «Пересоздать демо-данные»
+    # (создается командой python -m utils.snapshot demo; без него — наполнение seed_database)
+    DEMO_SNAPSHOT = os.path.join(BASE_DIR, "snapshots", "demo.iomsnap")
+
+    # Локальный JSON API для интеграций (python -m api.server)
+    API_HOST = "127.0.0.1"
+    API_PORT = 8601
+    # Пул соединений API с базой: постоянные + временные сверх них
+    API_DB_POOL_SIZE = 5
+    API_DB_MAX_OVERFLOW = 10
+    # Максимум элементов в одном пакетном запросе
+    API_MAX_BATCH = 1000
     
     # Настройки приложения
     APP_TITLE = "ИОМ: Система построения образовательных траекторий"
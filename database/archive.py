@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Index, MetaData, Table
+from sqlalchemy.engine import Connection
+from database.connection import ARCHIVE_SCHEMA
+from database.models import PlanItem, ProgressLog
+
+# Холодный архив: пункты и журнал давно архивированных планов лежат в отдельном
+# файле БД рядом с основным (подключается к соединениям в database/connection.py).
+
+archive_metadata = MetaData(schema=ARCHIVE_SCHEMA)
+
+
+def _archive_copy(source: Table) -> Table:
+    # Те же колонки, что и в горячей таблице, но без внешних ключей:
+    # SQLite не поддерживает ссылки между разными файлами БД.
+    # При добавлении колонки в горячую таблицу ее нужно добавить и сюда (миграцией архива).
+    return Table(
+        source.name, archive_metadata,
+        *[Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in source.columns]
+    )
+
+
+ARCHIVE_PLAN_ITEMS = _archive_copy(PlanItem.__table__)
+ARCHIVE_PROGRESS_LOG = _archive_copy(ProgressLog.__table__)
+Index("ix_archive_plan_items_plan_id", ARCHIVE_PLAN_ITEMS.c.plan_id)
+Index("ix_archive_progress_log_item_date", ARCHIVE_PROGRESS_LOG.c.plan_item_id, ARCHIVE_PROGRESS_LOG.c.date)
+
+
+def ensure_archive_schema(conn: Connection):
+    archive_metadata.create_all(conn)
@@ -1,6 +1,12 @@
-from sqlalchemy import create_engine
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from config.settings import Config
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
 
@@ -11,10 +17,91 @@ engine = create_engine(
     connect_args={
         "check_same_thread": False, # Отключаем проверку потоков
         "timeout": 15               # Ждем 15 секунд, если база занята
-    }
+    },
+    # Соединение занято все время перезапуска страницы (см. release_sessions)
+    pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW,
 )
 
+# Холодный архив журналов (database/archive.py): отдельный файл рядом с основной базой,
+# подключается к каждому соединению как схема "archive"
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(engine.url.database)), "archive.db")
+
+@event.listens_for(engine, "connect")
+def _attach_archive(dbapi_connection, connection_record):
+    dbapi_connection.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (ARCHIVE_DB_PATH,))
+    if Config.DB_WAL:
+        # Для уже переведенных файлов — пустая операция
+        dbapi_connection.execute("PRAGMA journal_mode = WAL")
+    # Архив остается в режиме DELETE. Транзакция по файлам в разных режимах (и вообще
+    # при основной базе в WAL) атомарна только для каждого файла по отдельности,
+    # поэтому перенос в архив и удаление из него идут двумя транзакциями
+    # (services/archive_service.py, StudentService.purge_deleted_students).
+    mode, = dbapi_connection.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode").fetchone()
+    if mode == "wal":
+        # Архив, переведенный в WAL прежними версиями. Выйти из WAL можно только
+        # без других соединений — иначе переключит следующее подключение
+        try:
+            dbapi_connection.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode = DELETE")
+        except sqlite3.OperationalError:
+            pass
+
+# --- Движок только для чтения: отчеты и аналитика ---
+# Длинные выборки отчетов не занимают соединения пула записи, а с WAL и не блокируют
+# сохранения журнала. Каждая транзакция чтения — один снимок базы: все запросы
+# сессии (за перезапуск страницы, см. release_sessions) видят данные на момент
+# первого чтения, даже если журнал в это время сохраняют.
+if Config.READ_DATABASE_URL:
+    READ_DATABASE_URL = Config.READ_DATABASE_URL
+else:
+    READ_DATABASE_URL = f"sqlite:///{Path(engine.url.database).resolve().as_uri()}?mode=ro&uri=true"
+
+read_engine = create_engine(
+    READ_DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 15} if READ_DATABASE_URL.startswith("sqlite") else {},
+    pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW,
+)
+
+if read_engine.dialect.name == "sqlite":
+    @event.listens_for(read_engine, "connect")
+    def _read_only_connect(dbapi_connection, connection_record):
+        # Файл архива создает основной движок при подключении; здесь он открывается только для чтения
+        if not os.path.exists(ARCHIVE_DB_PATH):
+            engine.connect().close()
+        dbapi_connection.execute(
+            f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (Path(ARCHIVE_DB_PATH).resolve().as_uri() + "?mode=ro",)
+        )
+        # sqlite3 не начинает транзакцию перед SELECT, и каждый запрос видел бы свой снимок:
+        # транзакции начинаются явно в _begin_snapshot
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(read_engine, "begin")
+    def _begin_snapshot(conn):
+        conn.exec_driver_sql("BEGIN")
+
+@contextmanager
+def foreign_keys_enforced(bind):
+    """
+    Отдельное соединение с включенной проверкой внешних ключей.
+    В SQLite она выключена по умолчанию, а без нее не работает ON DELETE CASCADE.
+    Включаем только на время удаления: PRAGMA действует вне транзакции, поэтому
+    выполняется до первого изменения, а по выходу соединение возвращается в пул выключенным.
+    """
+    with bind.connect() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+        conn.commit()
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+            conn.commit()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Сессии отчетов и аналитики: запись через них завершится ошибкой "readonly database"
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -24,3 +111,44 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Как get_db, но сессия только для чтения со снимком базы (страницы отчетов и аналитики)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Сессии, начавшие транзакцию в потоке внутри release_sessions()
+_run_state = threading.local()
+
+@event.listens_for(SessionLocal, "after_begin")
+@event.listens_for(ReadSessionLocal, "after_begin")
+def _track_session(session, transaction, connection):
+    sessions = getattr(_run_state, "sessions", None)
+    if sessions is not None:
+        sessions.add(session)
+
+@contextmanager
+def release_sessions():
+    """
+    Закрыть по выходу все сессии, которые обращались к базе внутри блока
+    (в этом потоке): их соединения возвращаются в пул.
+
+    Страницы получают сессию через next(get_db()): генератор закрывает ее сразу,
+    а следующий запрос снова берет соединение из пула и держит его до сборки
+    мусора. Поэтому перезапуск скрипта (main) и перезапуск фрагмента выполняются
+    внутри release_sessions(). Вложенные вызовы ничего не делают — сессии
+    закрывает внешний.
+    """
+    if getattr(_run_state, "sessions", None) is not None:
+        yield
+        return
+    _run_state.sessions = set()
+    try:
+        yield
+    finally:
+        sessions, _run_state.sessions = _run_state.sessions, None
+        for session in sessions:
+            session.close()
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey, Text, Float, Enum, DateTime
+from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey, Text, Float, Enum, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database.connection import Base
@@ -54,13 +54,34 @@ class Student(Base):
     parent_contact = Column(String, nullable=True)
     enrollment_date = Column(Date, default=func.now())
     active = Column(Boolean, default=True)
+    # Мягкое удаление: ученик скрыт (active = False) и окончательно удаляется
+    # фоновой очисткой через Config.STUDENT_PURGE_AFTER_DAYS дней
+    deleted_at = Column(DateTime, nullable=True)
     
     # НОВОЕ ПОЛЕ: Список болезней через запятую (напр: "Астма,Эпилепсия")
+    # Для запросов по тегу те же значения лежат построчно в student_tags (StudentTag)
     medical_tags = Column(String, nullable=True, default="") 
 
     # Связи
-    diagnostics = relationship("Diagnostic", back_populates="student")
-    plans = relationship("EducationalPlan", back_populates="student")
+    # Проверка внешних ключей в сессиях выключена, и ON DELETE CASCADE срабатывает только
+    # в StudentService.purge_students; при удалении через ORM дочерние строки удаляет сам ORM
+    diagnostics = relationship("Diagnostic", back_populates="student", cascade="all, delete-orphan")
+    plans = relationship("EducationalPlan", back_populates="student", cascade="all, delete-orphan")
+
+
+class StudentTag(Base):
+    """
+    Медицинский тег ученика, по строке на пару (ученик, тег).
+    Заполняется StudentService вместе с Student.medical_tags; индекс по тегу
+    позволяет считать и выбирать учеников с тегом без разбора строк.
+    """
+    __tablename__ = "student_tags"
+    __table_args__ = (
+        Index("ix_student_tags_tag_student", "tag", "student_id"),
+    )
+
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String, primary_key=True)
 
 
 class SkillCategory(Base):
@@ -71,7 +92,7 @@ class SkillCategory(Base):
     # Самоссылающаяся связь (Сфера -> Навык)
     parent_id = Column(Integer, ForeignKey("skills_categories.id"), nullable=True)
     
-    children = relationship("SkillCategory", backref="parent", remote_side=[id])
+    parent = relationship("SkillCategory", backref="children", remote_side=[id])
     exercises = relationship("Exercise", back_populates="skill")
     diagnostic_results = relationship("DiagnosticResult", back_populates="skill")
 
@@ -100,7 +121,7 @@ class Diagnostic(Base):
     __tablename__ = "diagnostics"
 
     id = Column(Integer, primary_key=True, index=True)
-    student_id = Column(Integer, ForeignKey("students.id"))
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), index=True)
     teacher_id = Column(Integer, ForeignKey("users.id"))
     date = Column(Date, default=func.now())
     type = Column(Enum(DiagnosticType), default=DiagnosticType.PRIMARY)
@@ -116,7 +137,7 @@ class DiagnosticResult(Base):
     __tablename__ = "diagnostic_results"
 
     id = Column(Integer, primary_key=True, index=True)
-    diagnostic_id = Column(Integer, ForeignKey("diagnostics.id"))
+    diagnostic_id = Column(Integer, ForeignKey("diagnostics.id", ondelete="CASCADE"), index=True)
     skill_id = Column(Integer, ForeignKey("skills_categories.id"))
     score = Column(Float, nullable=False) # 0.0 - 5.0 (можно дробные)
     comment = Column(Text, nullable=True)
@@ -130,13 +151,20 @@ class EducationalPlan(Base):
     __tablename__ = "educational_plans"
 
     id = Column(Integer, primary_key=True, index=True)
-    student_id = Column(Integer, ForeignKey("students.id"))
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), index=True)
     creator_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(Enum(PlanStatus), default=PlanStatus.DRAFT)
     goal_description = Column(Text, nullable=True)
     start_date = Column(Date, nullable=True)
     end_date = Column(Date, nullable=True)
+    # Когда план ушел в архив и когда его пункты и журнал перенесены в холодный архив (database/archive.py)
+    archived_at = Column(DateTime, nullable=True)
+    cold_archived_at = Column(DateTime, nullable=True)
+    # Версия строки для оптимистичной блокировки: каждое UPDATE увеличивает ее на 1
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Связи
     student = relationship("Student", back_populates="plans")
@@ -146,13 +174,20 @@ class EducationalPlan(Base):
 
 class PlanItem(Base):
     __tablename__ = "plan_items"
+    __table_args__ = (
+        # id не переиспользуется: строки, перенесенные в холодный архив, сохраняют свои id
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    plan_id = Column(Integer, ForeignKey("educational_plans.id"))
+    plan_id = Column(Integer, ForeignKey("educational_plans.id", ondelete="CASCADE"), index=True)
     exercise_id = Column(Integer, ForeignKey("exercises.id"))
     frequency = Column(String, nullable=True) # "2 раза в неделю"
     target_score = Column(Integer, nullable=True)
     order_index = Column(Integer, default=0) # Порядок выполнения
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Связи
     plan = relationship("EducationalPlan", back_populates="items")
@@ -162,13 +197,64 @@ class PlanItem(Base):
 
 class ProgressLog(Base):
     __tablename__ = "progress_log"
+    __table_args__ = (
+        # Одна запись на упражнение в день; по этому же индексу журнал читается за период
+        Index("ix_progress_log_item_date", "plan_item_id", "date", unique=True),
+        # id не переиспользуется: строки, перенесенные в холодный архив, сохраняют свои id
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    plan_item_id = Column(Integer, ForeignKey("plan_items.id"))
+    plan_item_id = Column(Integer, ForeignKey("plan_items.id", ondelete="CASCADE"))
     date = Column(Date, default=func.now())
     status = Column(Enum(LogStatus), default=LogStatus.COMPLETED)
     performance_score = Column(Integer, nullable=True) # 1-5
     teacher_notes = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Связи
-    item = relationship("PlanItem", back_populates="logs")
\ No newline at end of file
+    item = relationship("PlanItem", back_populates="logs")
+
+
+class ImportCheckpoint(Base):
+    """Прогресс пакетного импорта файла (utils/importer.py): сколько записей уже обработано."""
+    __tablename__ = "import_checkpoints"
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String, unique=True, nullable=False)  # вид импорта + отпечаток файла
+    kind = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    rows_done = Column(Integer, nullable=False, default=0)   # записей файла обработано (вставлено + отклонено)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_rejected = Column(Integer, nullable=False, default=0)
+    finished = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class ChangeRecord(Base):
+    """
+    Журнал изменений (services/change_journal.py): одна строка на изменение строки
+    отслеживаемой таблицы, в той же транзакции, что и само изменение.
+    Строки только добавляются; seq растет в порядке фиксации транзакций.
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_entity_seq", "entity", "seq"),
+        # seq не переиспользуется даже после очистки старых записей
+        {"sqlite_autoincrement": True},
+    )
+
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)     # имя таблицы
+    entity_id = Column(Integer, nullable=True)  # NULL — изменено много строк сразу
+    op = Column(String, nullable=False)         # insert / update / delete
+
+
+class ChangeCursor(Base):
+    """Позиция потребителя журнала изменений: последняя обработанная запись."""
+    __tablename__ = "change_cursors"
+
+    consumer = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
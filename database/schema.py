@@ -0,0 +1,193 @@
+import threading
+from sqlalchemy import Table, inspect
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.schema import CreateTable
+from database.connection import ARCHIVE_SCHEMA, Base
+import database.models  # noqa: F401  (регистрирует таблицы в Base.metadata)
+from database.archive import ensure_archive_schema
+
+# Версия схемы, которую ожидает код. Хранится в PRAGMA user_version файла БД.
+# Версия 1 — исходная схема (базы, созданные до появления версий, имеют user_version = 0).
+SCHEMA_VERSION = 9
+
+# Миграции: целевая версия -> функция(conn), переводящая схему из (версия - 1).
+# Новые таблицы создаются автоматически через create_all, миграции нужны
+# только для изменения существующих таблиц и переноса данных.
+def _migrate_journal_indexes(conn: Connection):
+    """v2: индексы для чтения журнала за период (и уникальность записи на день)."""
+    # Дубликаты (упражнение, дата) могли остаться от старых версий — оставляем последнюю запись
+    conn.exec_driver_sql("""
+        DELETE FROM progress_log
+        WHERE id NOT IN (SELECT MAX(id) FROM progress_log GROUP BY plan_item_id, date)
+    """)
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_progress_log_item_date ON progress_log (plan_item_id, date)"
+    )
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_plan_items_plan_id ON plan_items (plan_id)")
+
+
+def _migrate_row_versions(conn: Connection):
+    """v3: версии строк планов, пунктов плана и журнала (оптимистичная блокировка)."""
+    for table in ("educational_plans", "plan_items", "progress_log"):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _migrate_plan_archive_dates(conn: Connection):
+    """v5: даты архивации планов для переноса старых журналов в холодный архив."""
+    conn.exec_driver_sql("ALTER TABLE educational_plans ADD COLUMN archived_at DATETIME")
+    conn.exec_driver_sql("ALTER TABLE educational_plans ADD COLUMN cold_archived_at DATETIME")
+    # Дата архивации старых планов неизвестна — отсчитываем срок хранения от момента обновления
+    conn.exec_driver_sql(
+        "UPDATE educational_plans SET archived_at = CURRENT_TIMESTAMP WHERE status = 'ARCHIVED'"
+    )
+
+
+def _rebuild_table(conn: Connection, table: Table):
+    """
+    Пересоздание таблицы по текущему описанию модели с сохранением данных.
+    SQLite не умеет менять внешние ключи через ALTER TABLE, поэтому используется
+    стандартная процедура: новая таблица -> копирование -> удаление старой -> переименование.
+    """
+    tmp_name = f"_new_{table.name}"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE {tmp_name} (", 1))
+
+    # Копируем только колонки, которые есть в старой таблице (новые получат значения по умолчанию)
+    old_columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+    columns = ", ".join(c.name for c in table.columns if c.name in old_columns)
+    conn.exec_driver_sql(f"INSERT INTO {tmp_name} ({columns}) SELECT {columns} FROM {table.name}")
+    conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {tmp_name} RENAME TO {table.name}")
+
+    # Индексы удалены вместе со старой таблицей
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _migrate_cascade_deletes(conn: Connection):
+    """v6: ON DELETE CASCADE для данных ученика и отметка мягкого удаления."""
+    conn.exec_driver_sql("ALTER TABLE students ADD COLUMN deleted_at DATETIME")
+    # Удаленные до этой версии записи могли оставить строки без родителя — чистим их,
+    # иначе при включенной проверке внешних ключей они мешали бы удалению
+    conn.exec_driver_sql("DELETE FROM diagnostics WHERE student_id NOT IN (SELECT id FROM students)")
+    conn.exec_driver_sql("DELETE FROM diagnostic_results WHERE diagnostic_id NOT IN (SELECT id FROM diagnostics)")
+    conn.exec_driver_sql("DELETE FROM educational_plans WHERE student_id NOT IN (SELECT id FROM students)")
+    conn.exec_driver_sql("DELETE FROM plan_items WHERE plan_id NOT IN (SELECT id FROM educational_plans)")
+    conn.exec_driver_sql("DELETE FROM progress_log WHERE plan_item_id NOT IN (SELECT id FROM plan_items)")
+
+    for model in (database.models.Diagnostic, database.models.DiagnosticResult,
+                  database.models.EducationalPlan, database.models.PlanItem,
+                  database.models.ProgressLog):
+        _rebuild_table(conn, model.__table__)
+
+
+def _migrate_student_tags(conn: Connection):
+    """v8: теги учеников построчно в student_tags (заполняются из строки medical_tags)."""
+    database.models.StudentTag.__table__.create(conn, checkfirst=True)
+    # Разбор "Астма, Эпилепсия" на строки одним запросом (рекурсивный CTE)
+    conn.exec_driver_sql("""
+        WITH RECURSIVE split(student_id, tag, rest) AS (
+            SELECT id, '', medical_tags || ',' FROM students
+            WHERE medical_tags IS NOT NULL AND medical_tags != ''
+            UNION ALL
+            SELECT student_id, trim(substr(rest, 1, instr(rest, ',') - 1)), substr(rest, instr(rest, ',') + 1)
+            FROM split WHERE rest != ''
+        )
+        INSERT OR IGNORE INTO student_tags (student_id, tag)
+        SELECT student_id, tag FROM split WHERE tag != ''
+    """)
+
+
+def _migrate_monotonic_ids(conn: Connection):
+    """
+    v9: AUTOINCREMENT для пунктов плана и журнала. Без него SQLite выдает новым строкам
+    id строк, перенесенных в холодный архив, и перенос следующего плана путал их.
+    Счетчик начинается после наибольшего id и в основной таблице, и в архиве.
+    """
+    archive_tables = {name for (name,) in conn.exec_driver_sql(
+        f"SELECT name FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table'"
+    )}
+    for model in (database.models.PlanItem, database.models.ProgressLog):
+        table = model.__table__
+        _rebuild_table(conn, table)
+        last_id = conn.exec_driver_sql(f"SELECT COALESCE(MAX(id), 0) FROM {table.name}").scalar()
+        if table.name in archive_tables:
+            last_id = max(last_id, conn.exec_driver_sql(
+                f"SELECT COALESCE(MAX(id), 0) FROM {ARCHIVE_SCHEMA}.{table.name}"
+            ).scalar())
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table.name,))
+        if last_id:
+            conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, last_id))
+
+
+MIGRATIONS = {
+    1: lambda conn: None,  # базовая схема, изменений нет
+    2: _migrate_journal_indexes,
+    3: _migrate_row_versions,
+    4: lambda conn: None,  # таблица import_checkpoints (создается через create_all)
+    5: _migrate_plan_archive_dates,
+    6: _migrate_cascade_deletes,
+    7: lambda conn: None,  # журнал изменений change_log / change_cursors (создается через create_all)
+    8: _migrate_student_tags,
+    9: _migrate_monotonic_ids,
+}
+
+_bootstrap_lock = threading.Lock()
+_bootstrapped_urls = set()
+
+
+class SchemaVersionError(RuntimeError):
+    """Версия схемы в файле БД не совпадает с версией кода и не может быть приведена к ней."""
+
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def _set_schema_version(conn: Connection, version: int):
+    # PRAGMA не поддерживает параметры, значение — целое число из кода
+    conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+
+def _upgrade(conn: Connection):
+    current = get_schema_version(conn)
+
+    if current > SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"База данных имеет версию схемы {current}, а приложение — {SCHEMA_VERSION}. "
+            f"Обновите приложение."
+        )
+
+    # Пустая база: создаем актуальную схему целиком
+    if not inspect(conn).get_table_names():
+        Base.metadata.create_all(conn)
+        _set_schema_version(conn, SCHEMA_VERSION)
+        return
+
+    for version in range(max(current, 0) + 1, SCHEMA_VERSION + 1):
+        migration = MIGRATIONS.get(version)
+        if migration is None:
+            raise SchemaVersionError(f"Нет миграции схемы до версии {version}.")
+        migration(conn)
+
+    Base.metadata.create_all(conn)
+    _set_schema_version(conn, SCHEMA_VERSION)
+
+
+def bootstrap_schema(engine: Engine):
+    """
+    Проверка и подготовка схемы БД. Выполняется один раз на процесс для каждой базы:
+    повторные вызовы ничего не делают и не обращаются к БД.
+    """
+    url = str(engine.url)
+    if url in _bootstrapped_urls:
+        return
+
+    with _bootstrap_lock:
+        if url in _bootstrapped_urls:
+            return
+        with engine.begin() as conn:
+            if get_schema_version(conn) != SCHEMA_VERSION:
+                _upgrade(conn)
+            ensure_archive_schema(conn)
+        _bootstrapped_urls.add(url)
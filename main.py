@@ -1,14 +1,66 @@
+import importlib
+import os
 import streamlit as st
-from database.connection import engine, Base, get_db
+from database.connection import engine, get_db, get_read_db, release_sessions
+from database.schema import bootstrap_schema
 from utils.seed_data import seed_database
 # Импорт конфигурации UI
 from config.ui_config import set_app_theme, render_sidebar_header
-# Импорт страниц
-from views import dashboard, students, diagnostics, plan_builder, reports, lesson_log, library
+from utils.state_store import memory_report
+from services.journal_queue import get_journal_queue
+from services.archive_service import ArchiveService, run_archive_job
+from services.student_service import run_purge_job
+from services.change_journal import run_prune_job
+from utils.background import start_worker
+from utils.backup import BackupError, create_backup, list_backups, run_backup_job
+from utils.snapshot import SnapshotError, restore_snapshot
+from services.read_cache import reference_cache
+from utils.profiler import cancel_profiling, remaining_runs, request_profiling, run_page, show_results
+from config.settings import Config
 
+# Страницы: пункт меню -> (модуль, функция отрисовки).
+# Модули (и их тяжелые зависимости: pandas, plotly, python-docx) импортируются
+# только при первом открытии страницы, а не при старте приложения.
+PAGES = {
+    "🏠 Главная": ("views.dashboard", "show_dashboard"),
+    "👶 Ученики": ("views.students", "show_students_page"),
+    "🩺 Диагностика": ("views.diagnostics", "show_diagnostics_page"),
+    "🚀 Конструктор ИОМ": ("views.plan_builder", "show_plan_builder"),
+    "📚 Библиотека методик": ("views.library", "show_library_page"),
+    "📅 Дневник занятий": ("views.lesson_log", "show_log_page"),
+    "🖨️ Отчеты": ("views.reports", "show_reports_page"),
+    "📈 Аналитика групп": ("views.cohorts", "show_cohorts_page"),
+}
+
+def load_page(page: str):
+    """Возвращает функцию отрисовки страницы, импортируя модуль при первом обращении."""
+    module_name, func_name = PAGES[page]
+    return getattr(importlib.import_module(module_name), func_name)
+
+@st.cache_resource(show_spinner=False)
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # Один раз на процесс: проверка версии схемы и создание таблиц.
+    # Повторные запуски скрипта берут результат из кэша и не трогают БД.
+    bootstrap_schema(engine)
+    # Фоновый перенос очереди журнала (и записей, оставшихся с прошлого запуска)
+    get_journal_queue()
+    # Перенос журналов давно архивированных планов в холодный архив
+    start_worker("cold_archive", run_archive_job, Config.ARCHIVE_INTERVAL)
+    # Окончательное удаление учеников, удаленных мягко больше STUDENT_PURGE_AFTER_DAYS дней назад
+    start_worker("student_purge", run_purge_job, Config.STUDENT_PURGE_INTERVAL)
+    # Очистка старых записей журнала изменений
+    start_worker("change_log_prune", run_prune_job, Config.CHANGE_LOG_PRUNE_INTERVAL)
+    # Резервная копия раз в BACKUP_INTERVAL; проверка раз в час, чтобы перезапуски не сдвигали расписание
+    start_worker("backup", run_backup_job, min(Config.BACKUP_INTERVAL, 3600))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def archive_stats():
+    # Четыре COUNT(*) по журналу и архиву — не на каждый перезапуск скрипта;
+    # фоновый перенос в архив отразится не позже чем через минуту
+    return ArchiveService(next(get_read_db())).get_archive_stats()
 
+# Сессии БД, открытые страницей за перезапуск, закрываются по его окончании
+@release_sessions()
 def main():
     # 1. Настройка страницы (Всегда первая!)
     st.set_page_config(
@@ -31,40 +83,80 @@ def main():
     with st.sidebar:
         page = st.radio(
             "Навигация:",
-            [
-                "🏠 Главная", 
-                "👶 Ученики", 
-                "🩺 Диагностика", 
-                "🚀 Конструктор ИОМ", 
-                "📚 Библиотека методик",
-                "📅 Дневник занятий",   
-                "🖨️ Отчеты"
-            ]
+            list(PAGES.keys())
         )
         
         st.markdown("---")
         # Кнопка администрирования (внизу сайдбара)
         with st.expander("⚙️ Администрирование"):
-            if st.button("🛠 Пересоздать демо-данные"):
+            if os.path.exists(Config.DEMO_SNAPSHOT):
+                # Все данные заменяются демо-снимком целиком (постранично, за секунды)
+                confirm = st.checkbox("Заменить все данные демо-снимком", key="demo_reset_confirm")
+                if st.button("🛠 Пересоздать демо-данные", disabled=not confirm):
+                    try:
+                        manifest = restore_snapshot(Config.DEMO_SNAPSHOT)
+                        archive_stats.clear()
+                        st.toast(f"Демо-данные восстановлены за {manifest['seconds']:.1f} с", icon="✅")
+                    except SnapshotError as e:
+                        st.error(f"Демо-данные не восстановлены: {e}")
+            elif st.button("🛠 Пересоздать демо-данные"):
                 db = next(get_db())
                 seed_database(db)
                 st.toast("База знаний обновлена!", icon="✅")
 
+            if st.button("🧊 Перенести старые журналы в архив"):
+                moved = run_archive_job()
+                archive_stats.clear()
+                st.toast(f"В архив перенесено: планов {moved['plans']}, записей журнала {moved['logs']}", icon="🧊")
+            stats = archive_stats()
+            st.caption(f"🧊 Журнал: {stats['hot_logs']} записей в работе, {stats['archived_logs']} в архиве")
+
+            if st.button("💾 Создать резервную копию"):
+                try:
+                    manifest = create_backup()
+                    st.toast(f"Резервная копия {manifest['name']} создана и проверена", icon="💾")
+                except BackupError as e:
+                    st.error(f"Резервная копия не создана: {e}")
+            backups = list_backups()
+            if backups:
+                size = sum(info["size"] for info in backups[0]["files"].values())
+                st.caption(f"💾 Последняя копия: {backups[0]['created_at'].replace('T', ' ')}, "
+                           f"{size / 1e6:.1f} МБ (всего копий: {len(backups)})")
+
+            cache = reference_cache.stats()
+            st.caption(f"⚡ Кэш справочников: попаданий {cache['hits']}, промахов {cache['misses']} "
+                       f"({cache['hit_rate']:.0%}), записей {cache['entries']}")
+
+            queue = get_journal_queue()
+            if queue.pending_count():
+                st.caption(f"📝 В очереди журнала: {queue.pending_count()} записей")
+            if queue.worker is not None and queue.worker.last_error:
+                st.caption(f"⚠️ Перенос журнала: {queue.worker.last_error}")
+            if queue.dead_letter_count():
+                st.caption(f"🚫 Не сохранено записей журнала: {queue.dead_letter_count()} (dead_letter.jsonl)")
+                if st.button("Показать несохраненные записи"):
+                    st.dataframe(queue.dead_letters(), hide_index=True)
+
+            # Профилирование страницы: cProfile + tracemalloc на следующие N запусков
+            st.caption("🔬 Профилирование страницы")
+            if remaining_runs():
+                st.caption(f"Осталось профилировать запусков: {remaining_runs()}")
+                if st.button("⏹ Остановить профилирование"):
+                    cancel_profiling()
+            else:
+                runs = st.number_input("Запусков", min_value=1, max_value=20, value=3, key="profile_runs")
+                if st.button("🔬 Профилировать"):
+                    request_profiling(int(runs))
+
+            # Объем данных сессии по пространствам имен (оценка размера обходит все значения —
+            # считаем только по запросу)
+            if st.checkbox("💾 Память сессии", key="show_memory_report"):
+                for row in memory_report():
+                    st.caption(f"{row['namespace']}: {row['keys']} ключей, групп {row['groups']}, ~{row['bytes'] / 1024:.1f} КБ")
+
     # 6. РОУТИНГ (Вывод страниц в зависимости от выбора в меню)
-    if page == "🏠 Главная":
-        dashboard.show_dashboard()
-    elif page == "👶 Ученики":
-        students.show_students_page()
-    elif page == "🩺 Диагностика":
-        diagnostics.show_diagnostics_page()
-    elif page == "🚀 Конструктор ИОМ":
-        plan_builder.show_plan_builder()
-    elif page == "📚 Библиотека методик":
-        library.show_library_page()
-    elif page == "📅 Дневник занятий":
-        lesson_log.show_log_page()
-    elif page == "🖨️ Отчеты":
-        reports.show_reports_page()
+    run_page(page, load_page(page))
+    show_results()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,243 @@
+import threading
+from datetime import date
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, cast, Integer, String, type_coerce
+from sqlalchemy.orm import Session
+from database.models import ProgressLog, PlanItem, EducationalPlan, LogStatus, Student
+from services.change_journal import (
+    DELETE, INSERT, ChangeLogAheadError, ChangeLogGapError, latest_seq, read_changes
+)
+
+# julianday('0001-01-01') = 1721425.5 -> вычитая 1721424.5, получаем date.toordinal()
+_JULIAN_TO_ORDINAL = 1721424.5
+
+# Снимок журнала общий для всех сессий процесса.
+# Снимок помнит номер последнего учтенного изменения (services/change_journal.py)
+# и при следующем обращении догружает только измененные с тех пор записи.
+_snapshot_lock = threading.Lock()
+_snapshot = {"seq": None, "frame": None}
+
+SNAPSHOT_DTYPES = {
+    "log_id": np.int64, "student_id": np.int32, "plan_item_id": np.int32, "exercise_id": np.int32,
+    "day": np.int32, "score": np.float32, "completed": bool,
+}
+SORT_COLUMNS = ["student_id", "exercise_id", "day", "log_id"]
+# exercise_id пунктов, чья методика удалена из базы (в БД NULL): записи журнала
+# остаются в метриках по ученику, а int32-колонка не принимает None
+NO_EXERCISE = -1
+
+# Таблицы, от которых зависит снимок
+SNAPSHOT_ENTITIES = (ProgressLog.__tablename__, PlanItem.__tablename__,
+                     EducationalPlan.__tablename__, Student.__tablename__)
+# Больше изменений за раз — дешевле перечитать журнал целиком
+MAX_INCREMENTAL_CHANGES = 20000
+# Сколько id записей журнала догружать одним запросом
+LOAD_CHUNK = 500
+
+
+class AnalyticsService:
+    """
+    Аналитика журнала занятий в колоночном виде (NumPy/pandas).
+    Данные читаются одним Core-запросом без создания ORM-объектов,
+    все метрики считаются векторно по снимку.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def invalidate():
+        """Сбросить снимок: следующее обращение перечитает журнал целиком."""
+        with _snapshot_lock:
+            _snapshot["seq"] = None
+            _snapshot["frame"] = None
+
+    def _load_frame(self, log_ids: Optional[list] = None) -> pd.DataFrame:
+        """
+        Загрузка журнала в колонки: int-идентификаторы, порядковый номер дня, балл.
+        log_ids — только эти записи (для догрузки изменений).
+        """
+        stmt = select(
+            ProgressLog.id,
+            EducationalPlan.student_id,
+            ProgressLog.plan_item_id,
+            func.coalesce(PlanItem.exercise_id, NO_EXERCISE),
+            cast(func.julianday(ProgressLog.date) - _JULIAN_TO_ORDINAL, Integer),
+            ProgressLog.performance_score,
+            # Сырое имя статуса, без преобразования в Enum для каждой строки
+            type_coerce(ProgressLog.status, String),
+        ).join_from(ProgressLog, PlanItem, ProgressLog.plan_item_id == PlanItem.id)\
+         .join(EducationalPlan, PlanItem.plan_id == EducationalPlan.id)\
+         .order_by(EducationalPlan.student_id, PlanItem.exercise_id, ProgressLog.date, ProgressLog.id)
+
+        if log_ids is None:
+            rows = self.db.execute(stmt).all()
+        else:
+            rows = [row for start in range(0, len(log_ids), LOAD_CHUNK)
+                    for row in self.db.execute(stmt.where(ProgressLog.id.in_(log_ids[start:start + LOAD_CHUNK])))]
+        if not rows:
+            return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in SNAPSHOT_DTYPES.items()})
+
+        log_id, student_id, item_id, exercise_id, day, score, status = zip(*rows)
+        return pd.DataFrame({
+            "log_id": np.asarray(log_id, dtype=np.int64),
+            "student_id": np.asarray(student_id, dtype=np.int32),
+            "plan_item_id": np.asarray(item_id, dtype=np.int32),
+            "exercise_id": np.asarray(exercise_id, dtype=np.int32),
+            "day": np.asarray(day, dtype=np.int32),
+            "score": np.asarray([np.nan if s is None else s for s in score], dtype=np.float32),
+            "completed": np.asarray(status, dtype=object) == LogStatus.COMPLETED.name,
+        })
+
+    def _apply_changes(self, frame: pd.DataFrame, changes) -> Optional[pd.DataFrame]:
+        """
+        Новый снимок = старый без затронутых строк + затронутые записи, перечитанные из БД.
+        Возвращает None, если изменения нельзя применить точечно (нужно перечитать все).
+        """
+        log_ids, item_ids, student_ids = set(), set(), set()
+        for change in changes:
+            if change.entity_id is None:
+                return None
+            if change.entity == ProgressLog.__tablename__:
+                # Вставка, обновление и удаление обрабатываются одинаково:
+                # строка убирается и перечитывается (удаленная просто не найдется)
+                log_ids.add(change.entity_id)
+            elif change.op == INSERT:
+                continue  # у новых учеников, планов и пунктов еще нет записей журнала
+            elif change.entity == Student.__tablename__:
+                if change.op == DELETE:
+                    student_ids.add(change.entity_id)  # журнал удален каскадом
+            elif change.entity == PlanItem.__tablename__ and change.op == DELETE:
+                item_ids.add(change.entity_id)
+            else:
+                # Изменения планов и пунктов (смена упражнения, перенос в холодный архив)
+                return None
+
+        stale = frame["log_id"].isin(log_ids) | frame["plan_item_id"].isin(item_ids) | \
+            frame["student_id"].isin(student_ids)
+        fresh = self._load_frame(sorted(log_ids)) if log_ids else None
+        if not stale.any() and (fresh is None or fresh.empty):
+            return frame
+
+        parts = [frame[~stale]]
+        if fresh is not None and not fresh.empty:
+            parts.append(fresh)
+        return pd.concat(parts, ignore_index=True)\
+            .sort_values(SORT_COLUMNS, kind="stable", ignore_index=True)
+
+    def get_snapshot(self) -> pd.DataFrame:
+        """
+        Колоночный снимок журнала (отсортирован по ученику, упражнению и дате).
+        Из БД догружаются только записи, изменившиеся после предыдущего обращения;
+        целиком журнал перечитывается при первом обращении и после изменений планов.
+        """
+        with _snapshot_lock:
+            seq, frame = _snapshot["seq"], _snapshot["frame"]
+
+        if frame is not None:
+            try:
+                changes = read_changes(self.db, seq, SNAPSHOT_ENTITIES, limit=MAX_INCREMENTAL_CHANGES + 1)
+            except ChangeLogAheadError:
+                # Снимок сохранила сессия, которая видит базу позже этой (сессии отчетов
+                # читают со снимка БД); после замены базы снимок сбрасывается invalidate()
+                return frame
+            except ChangeLogGapError:
+                changes = None
+            if changes == []:
+                return frame
+            if changes is not None and len(changes) <= MAX_INCREMENTAL_CHANGES:
+                updated = self._apply_changes(frame, changes)
+                if updated is not None:
+                    return self._store(changes[-1].seq, updated)
+
+        # Номер берется до чтения: изменения, попавшие между ними, применятся повторно (это безопасно)
+        seq = latest_seq(self.db, SNAPSHOT_ENTITIES)
+        return self._store(seq, self._load_frame())
+
+    @staticmethod
+    def _store(seq: int, frame: pd.DataFrame) -> pd.DataFrame:
+        with _snapshot_lock:
+            # Параллельный запрос мог уже сохранить более свежий снимок
+            if _snapshot["seq"] is None or _snapshot["seq"] <= seq:
+                _snapshot["seq"] = seq
+                _snapshot["frame"] = frame
+        return frame
+
+    def rolling_scores(self, window: int = 5, student_id: Optional[int] = None) -> pd.DataFrame:
+        """
+        Скользящее среднее балла по последним `window` занятиям
+        для каждой пары (ученик, упражнение).
+        """
+        df = self.get_snapshot()
+        if student_id is not None:
+            df = df[df["student_id"] == student_id]
+
+        result = df[["student_id", "exercise_id", "day", "score"]].copy()
+        result["rolling_avg"] = df.groupby(["student_id", "exercise_id"], sort=False)["score"]\
+            .rolling(window, min_periods=1).mean()\
+            .reset_index(level=[0, 1], drop=True)
+        result["date"] = result["day"].map(date.fromordinal)
+        return result
+
+    def completion_rates(self, by_exercise: bool = True) -> pd.DataFrame:
+        """Доля выполненных занятий по ученику (и упражнению)."""
+        keys = ["student_id", "exercise_id"] if by_exercise else ["student_id"]
+        df = self.get_snapshot()
+
+        stats = df.groupby(keys, sort=False).agg(
+            entries=("log_id", "size"),
+            completed=("completed", "sum"),
+            avg_score=("score", "mean"),
+        ).reset_index()
+        stats["completion_rate"] = stats["completed"] / stats["entries"]
+        return stats
+
+    def streaks(self, by_exercise: bool = False, today: Optional[date] = None) -> pd.DataFrame:
+        """
+        Серии занятий подряд (по дням с выполненными упражнениями).
+        Возвращает для каждого ученика (и упражнения) самую длинную и текущую серию.
+        Текущая серия считается живой, если последний день — сегодня или вчера.
+        """
+        keys = ["student_id", "exercise_id"] if by_exercise else ["student_id"]
+        today_ord = (today or date.today()).toordinal()
+
+        df = self.get_snapshot()
+        days = df.loc[df["completed"], keys + ["day"]].drop_duplicates().sort_values(keys + ["day"])
+        if days.empty:
+            return pd.DataFrame(columns=keys + ["longest_streak", "current_streak", "last_day"])
+
+        # Новая серия начинается при смене группы или разрыве больше одного дня
+        group_change = np.zeros(len(days), dtype=bool)
+        for key in keys:
+            values = days[key].to_numpy()
+            group_change[1:] |= values[1:] != values[:-1]
+        group_change[0] = True
+        gaps = np.diff(days["day"].to_numpy(), prepend=days["day"].iloc[0] - 2) != 1
+        run_id = np.cumsum(group_change | gaps)
+
+        runs = days.assign(run_id=run_id).groupby("run_id", sort=False).agg(
+            **{key: (key, "first") for key in keys},
+            length=("day", "size"),
+            last_day=("day", "max"),
+        )
+        result = runs.groupby(keys, sort=False).agg(
+            longest_streak=("length", "max"),
+            last_run=("length", "last"),
+            last_day=("last_day", "max"),
+        ).reset_index()
+        alive = result["last_day"].to_numpy() >= today_ord - 1
+        result["current_streak"] = np.where(alive, result["last_run"], 0)
+        return result.drop(columns="last_run")
+
+    def activity_window(self, days: int = 7, today: Optional[date] = None) -> Tuple[int, float]:
+        """Число проведенных занятий (ученик × день) и доля выполненных за последние `days` дней."""
+        since = (today or date.today()).toordinal() - days + 1
+        df = self.get_snapshot()
+        recent = df[df["day"] >= since]
+        if recent.empty:
+            return 0, 0.0
+        sessions = len(recent[["student_id", "day"]].drop_duplicates())
+        return sessions, float(recent["completed"].mean())
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from config.settings import Config
+from database.archive import ARCHIVE_PLAN_ITEMS, ARCHIVE_PROGRESS_LOG
+from database.connection import SessionLocal
+from database.models import EducationalPlan, PlanItem, PlanStatus, ProgressLog
+from services.change_journal import UPDATE, record_changes
+
+# Сколько планов переносить одной транзакцией (короткие транзакции не держат блокировку записи)
+ARCHIVE_BATCH_PLANS = 50
+
+
+class ArchiveConflictError(RuntimeError):
+    """В архиве уже есть другая строка с тем же id: перенос остановлен, горячие строки не тронуты."""
+
+
+def run_archive_job() -> Dict[str, int]:
+    """Задача фонового процесса: отдельная сессия на каждый запуск."""
+    db = SessionLocal()
+    try:
+        return ArchiveService(db).archive_cold_plans()
+    finally:
+        db.close()
+
+
+class ArchiveService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def archive_cold_plans(self, older_than_days: int = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Перенос пунктов и журнала планов, архивированных больше older_than_days дней назад,
+        в холодный архив (archive.db). Перенос выполняется set-based запросами
+        INSERT ... SELECT / DELETE пачками по ARCHIVE_BATCH_PLANS планов. Транзакция сразу
+        по двум файлам SQLite не атомарна (основная база в WAL), поэтому каждая пачка —
+        две транзакции: копия в архив, затем удаление скопированного из основной базы.
+        Сбой между ними оставляет строки в обоих файлах, и повторный запуск
+        продолжает перенос: уже скопированные строки (тот же id и те же ключи) не копируются
+        повторно, а чужая строка с тем же id — ArchiveConflictError.
+        Из основной базы удаляется только то, что лежит в архиве с теми же ключами;
+        план получает отметку cold_archived_at, только когда в основной базе
+        не осталось ни одного его пункта. Сами планы остаются в основной базе.
+        Возвращает {plans, items, logs} — сколько перенесено.
+        """
+        now = now or datetime.now()
+        days = Config.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        cutoff = now - timedelta(days=days)
+        moved = {"plans": 0, "items": 0, "logs": 0}
+
+        while True:
+            plan_ids = self.db.execute(
+                select(EducationalPlan.id)
+                .where(EducationalPlan.status == PlanStatus.ARCHIVED,
+                       EducationalPlan.archived_at <= cutoff,
+                       EducationalPlan.cold_archived_at.is_(None))
+                .order_by(EducationalPlan.id)
+                .limit(ARCHIVE_BATCH_PLANS)
+            ).scalars().all()
+            if not plan_ids:
+                break
+
+            hot_logs, hot_items = ProgressLog.__table__, PlanItem.__table__
+            item_ids = select(hot_items.c.id).where(hot_items.c.plan_id.in_(plan_ids)).scalar_subquery()
+            log_cols = [c.name for c in ARCHIVE_PROGRESS_LOG.columns]
+            item_cols = [c.name for c in ARCHIVE_PLAN_ITEMS.columns]
+            # Строка уже в архиве: тот же id и те же ключи (а не просто совпавший id).
+            # Псевдонимы: имена архивных таблиц совпадают с горячими
+            archived_logs = ARCHIVE_PROGRESS_LOG.alias("archived_logs")
+            archived_items = ARCHIVE_PLAN_ITEMS.alias("archived_items")
+            log_copied = exists().where(archived_logs.c.id == hot_logs.c.id,
+                                        archived_logs.c.plan_item_id == hot_logs.c.plan_item_id,
+                                        archived_logs.c.date == hot_logs.c.date)
+            item_copied = exists().where(archived_items.c.id == hot_items.c.id,
+                                         archived_items.c.plan_id == hot_items.c.plan_id)
+
+            # 1. Копируем в архив (сначала журнал — его выборка опирается на пункты в основной базе).
+            # Без OR IGNORE: чужая строка архива с тем же id — нарушение первичного ключа
+            try:
+                logs = self.db.execute(
+                    insert(ARCHIVE_PROGRESS_LOG).from_select(
+                        log_cols,
+                        select(*[hot_logs.c[c] for c in log_cols])
+                        .where(hot_logs.c.plan_item_id.in_(item_ids), ~log_copied)
+                    )
+                ).rowcount
+                items = self.db.execute(
+                    insert(ARCHIVE_PLAN_ITEMS).from_select(
+                        item_cols,
+                        select(*[hot_items.c[c] for c in item_cols])
+                        .where(hot_items.c.plan_id.in_(plan_ids), ~item_copied)
+                    )
+                ).rowcount
+                self.db.commit()
+            except IntegrityError as e:
+                self.db.rollback()
+                raise ArchiveConflictError(
+                    f"Перенос планов {plan_ids[0]}–{plan_ids[-1]} в архив остановлен: "
+                    f"в архиве уже есть другие строки с теми же id ({e.orig})"
+                )
+
+            # 2. Удаляем из горячих таблиц только скопированное: журнал — по (id, пункт, дата),
+            # пункты — по (id, план) и только без оставшихся записей журнала
+            self.db.execute(delete(hot_logs).where(hot_logs.c.plan_item_id.in_(item_ids), log_copied))
+            self.db.execute(
+                delete(hot_items).where(
+                    hot_items.c.plan_id.in_(plan_ids),
+                    item_copied,
+                    ~exists().where(hot_logs.c.plan_item_id == hot_items.c.id),
+                )
+            )
+
+            # 3. Отмечаем планы, перенесенные целиком: их журнал теперь читается из архива.
+            # Строки, добавленные между шагами, остались в основной базе — план
+            # перенесется следующим запуском
+            done = self.db.execute(
+                update(EducationalPlan.__table__)
+                .where(EducationalPlan.id.in_(plan_ids),
+                       ~exists().where(hot_items.c.plan_id == EducationalPlan.id))
+                .values(cold_archived_at=now)
+                .returning(EducationalPlan.id)
+            ).scalars().all()
+            record_changes(self.db, EducationalPlan.__tablename__, done, UPDATE)
+            self.db.commit()
+
+            moved["plans"] += len(done)
+            moved["items"] += items
+            moved["logs"] += logs
+            if not done:
+                break
+
+        return moved
+
+    def get_archive_stats(self) -> Dict[str, int]:
+        """Размер горячих таблиц и архива (для панели администратора)."""
+        def count(table):
+            return self.db.execute(select(func.count()).select_from(table)).scalar()
+
+        return {
+            "hot_items": count(PlanItem.__table__),
+            "hot_logs": count(ProgressLog.__table__),
+            "archived_items": count(ARCHIVE_PLAN_ITEMS),
+            "archived_logs": count(ARCHIVE_PROGRESS_LOG),
+        }
@@ -0,0 +1,154 @@
+from collections import namedtuple
+from typing import Iterable, List, Optional, Sequence, Union
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from config.settings import Config
+from database.connection import SessionLocal
+from database.models import (
+    ChangeCursor, ChangeRecord, Diagnostic, DiagnosticResult, EducationalPlan,
+    Exercise, PlanItem, ProgressLog, Student
+)
+
+# Журнал изменений: каждая запись в отслеживаемые таблицы добавляет строку
+# (seq, entity, entity_id, op) в change_log в той же транзакции.
+# Изменения через ORM попадают в журнал автоматически (after_flush ниже),
+# массовые Core-запросы сервисов вызывают record_changes() сами.
+#
+# entity_id = NULL означает "изменено много строк сразу" (импорт): потребитель
+# перечитывает сущность целиком. Удаление ученика каскадно удаляет его данные
+# (см. StudentService.purge_students) — отдельных записей о них нет.
+
+INSERT, UPDATE, DELETE = "insert", "update", "delete"
+
+TRACKED_MODELS = (Student, Exercise, Diagnostic, DiagnosticResult, EducationalPlan, PlanItem, ProgressLog)
+_TRACKED_TABLES = {model.__table__ for model in TRACKED_MODELS}
+
+Change = namedtuple("Change", ["seq", "entity", "entity_id", "op"])
+
+
+class ChangeLogGapError(RuntimeError):
+    """Записи после курсора уже удалены очисткой: потребителю нужно перечитать данные целиком."""
+
+
+class ChangeLogAheadError(ChangeLogGapError):
+    """
+    Курсор больше последнего номера в журнале: он получен в другой базе (база заменена
+    копией или снимком) или в транзакции, которая видит более поздние данные, чем эта.
+    """
+
+
+def record_changes(executor: Union[Session, Connection], entity: str, ids: Optional[Iterable[int]], op: str):
+    """
+    Добавить записи об изменении строк `ids` таблицы `entity` в текущую транзакцию executor.
+    ids=None — одна запись "изменено много строк".
+    """
+    rows = [{"entity": entity, "entity_id": None, "op": op}] if ids is None else \
+        [{"entity": entity, "entity_id": entity_id, "op": op} for entity_id in ids]
+    if rows:
+        executor.execute(insert(ChangeRecord.__table__), rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_orm_changes(session: Session, flush_context):
+    rows = []
+    for objects, op in ((session.new, INSERT), (session.dirty, UPDATE), (session.deleted, DELETE)):
+        for obj in objects:
+            table = getattr(type(obj), "__table__", None)
+            if table not in _TRACKED_TABLES:
+                continue
+            if op == UPDATE and not session.is_modified(obj, include_collections=False):
+                continue
+            rows.append({"entity": table.name, "entity_id": obj.id, "op": op})
+    if rows:
+        # Core-запрос на соединении сессии: та же транзакция, новый flush не запускается
+        session.connection().execute(insert(ChangeRecord.__table__), rows)
+
+
+def latest_seq(db: Session, entities: Optional[Sequence[str]] = None) -> int:
+    """Номер последнего изменения (по указанным сущностям), 0 — изменений не было."""
+    stmt = select(func.max(ChangeRecord.seq))
+    if entities:
+        stmt = stmt.where(ChangeRecord.entity.in_(entities))
+    return db.execute(stmt).scalar() or 0
+
+
+def read_changes(db: Session, after_seq: int, entities: Optional[Sequence[str]] = None,
+                 limit: Optional[int] = None) -> List[Change]:
+    """
+    Изменения с номером больше after_seq в порядке фиксации.
+    Если часть из них уже удалена очисткой или курсор получен в другой базе
+    (номер больше последнего — база заменена копией или снимком),
+    выбрасывает ChangeLogGapError.
+    """
+    latest = latest_seq(db)
+    if after_seq > latest:
+        raise ChangeLogAheadError(f"Курсор на {after_seq}, а последнее изменение в журнале — {latest}")
+    oldest = db.execute(select(func.min(ChangeRecord.seq))).scalar()
+    if oldest is not None and oldest > after_seq + 1 and after_seq < latest:
+        # seq не имеет пропусков, кроме удаленных очисткой записей
+        raise ChangeLogGapError(f"Журнал изменений очищен до {oldest - 1}, курсор на {after_seq}")
+
+    stmt = select(ChangeRecord.seq, ChangeRecord.entity, ChangeRecord.entity_id, ChangeRecord.op)\
+        .where(ChangeRecord.seq > after_seq)\
+        .order_by(ChangeRecord.seq)
+    if entities:
+        stmt = stmt.where(ChangeRecord.entity.in_(entities))
+    if limit:
+        stmt = stmt.limit(limit)
+    return [Change(*row) for row in db.execute(stmt)]
+
+
+class ChangeFeed:
+    """
+    Чтение журнала изменений с сохраненной позицией (таблица change_cursors).
+    Потребитель читает read(), обрабатывает изменения и подтверждает commit(seq);
+    после сбоя чтение продолжится с последнего подтвержденного изменения.
+    """
+
+    def __init__(self, db: Session, consumer: str, entities: Optional[Sequence[str]] = None):
+        self.db = db
+        self.consumer = consumer
+        self.entities = entities
+
+    @property
+    def cursor(self) -> int:
+        seq = self.db.execute(select(ChangeCursor.seq).where(ChangeCursor.consumer == self.consumer)).scalar()
+        return seq or 0
+
+    def read(self, limit: int = 1000) -> List[Change]:
+        return read_changes(self.db, self.cursor, self.entities, limit)
+
+    def commit(self, seq: int):
+        """Сохранить позицию: изменения до seq включительно обработаны."""
+        stmt = sqlite_insert(ChangeCursor).values(consumer=self.consumer, seq=seq)
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[ChangeCursor.consumer],
+            set_={"seq": stmt.excluded.seq, "updated_at": func.now()},
+        ))
+        self.db.commit()
+
+    def reset(self):
+        """Начать сначала (после ChangeLogGapError — вместе с полным перечитыванием данных)."""
+        self.commit(latest_seq(self.db))
+
+
+def prune_changes(db: Session, keep: int = None) -> int:
+    """Удаление старых записей журнала: остаются последние `keep`. Возвращает число удаленных."""
+    keep = Config.CHANGE_LOG_KEEP if keep is None else keep
+    deleted = db.execute(
+        delete(ChangeRecord.__table__).where(ChangeRecord.seq <= latest_seq(db) - keep)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+def run_prune_job() -> int:
+    """Задача фонового процесса: очистка журнала изменений."""
+    db = SessionLocal()
+    try:
+        return prune_changes(db)
+    finally:
+        db.close()
@@ -0,0 +1,180 @@
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import select, func, case, cast, and_, Integer
+from sqlalchemy.orm import Session, aliased
+from database.models import Diagnostic, DiagnosticResult, DiagnosticType, SkillCategory, Student
+from services.change_journal import latest_seq
+
+# Повторные расчеты берутся из кэша, пока в журнале изменений нет новых записей
+# по диагностикам и ученикам (включая смену диагноза в карточке).
+# TTL страхует от изменений в обход сервисов (ручная правка файла БД).
+CACHE_TTL_SECONDS = 600
+
+_cache_lock = threading.Lock()
+_cache: Dict[tuple, tuple] = {}  # (метод, параметры) -> (ключ данных, время, результат)
+
+NO_DIAGNOSIS = "Не указан"
+
+# Таблицы, от которых зависят расчеты
+COHORT_ENTITIES = (Diagnostic.__tablename__, DiagnosticResult.__tablename__, Student.__tablename__)
+
+
+class CohortService:
+    """
+    Когортный анализ: как меняются баллы по навыкам между первичной и итоговой
+    диагностикой в группах учеников с одинаковым диагнозом.
+    Все расчеты выполняются в БД (оконные функции + GROUP BY), в Python
+    попадают только агрегаты размером "диагнозы × навыки".
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # --- Построение запросов ---
+
+    def _edge_diagnostics(self, d_type: DiagnosticType, latest: bool):
+        """Одна диагностика заданного типа на ученика: самая ранняя или самая поздняя."""
+        order = (Diagnostic.date.desc(), Diagnostic.id.desc()) if latest else (Diagnostic.date.asc(), Diagnostic.id.asc())
+        ranked = select(
+            Diagnostic.id.label("diagnostic_id"),
+            Diagnostic.student_id,
+            func.row_number().over(partition_by=Diagnostic.student_id, order_by=order).label("rn"),
+        ).where(Diagnostic.type == d_type).subquery()
+        return select(ranked.c.diagnostic_id, ranked.c.student_id).where(ranked.c.rn == 1).subquery()
+
+    def _deltas(self, active_only: bool):
+        """
+        Строка на (ученик, навык): балл первичной (самой ранней) и итоговой (самой поздней)
+        диагностики и их разница.
+        """
+        primary = self._edge_diagnostics(DiagnosticType.PRIMARY, latest=False)
+        final = self._edge_diagnostics(DiagnosticType.FINAL, latest=True)
+        res_p = aliased(DiagnosticResult)
+        res_f = aliased(DiagnosticResult)
+
+        stmt = select(
+            func.coalesce(func.nullif(Student.diagnosis_code, ""), NO_DIAGNOSIS).label("diagnosis"),
+            res_p.skill_id.label("skill_id"),
+            Student.id.label("student_id"),
+            res_p.score.label("primary_score"),
+            res_f.score.label("final_score"),
+            (res_f.score - res_p.score).label("delta"),
+        ).select_from(primary)\
+            .join(final, final.c.student_id == primary.c.student_id)\
+            .join(Student, Student.id == primary.c.student_id)\
+            .join(res_p, res_p.diagnostic_id == primary.c.diagnostic_id)\
+            .join(res_f, and_(res_f.diagnostic_id == final.c.diagnostic_id, res_f.skill_id == res_p.skill_id))
+
+        if active_only:
+            stmt = stmt.where(Student.active == True)
+        return stmt.subquery()
+
+    def _data_key(self) -> int:
+        """Ключ актуальности: номер последнего изменения диагностик и учеников."""
+        return latest_seq(self.db, COHORT_ENTITIES)
+
+    def _cached(self, name: str, params: tuple, compute):
+        data_key = self._data_key()
+        cache_key = (name, params)
+        now = time.monotonic()
+        with _cache_lock:
+            hit = _cache.get(cache_key)
+            if hit and hit[0] == data_key and now - hit[1] < CACHE_TTL_SECONDS:
+                return hit[2]
+
+        result = compute()
+        with _cache_lock:
+            _cache[cache_key] = (data_key, now, result)
+        return result
+
+    @staticmethod
+    def invalidate():
+        with _cache_lock:
+            _cache.clear()
+
+    # --- Публичные методы ---
+
+    def get_skill_outcomes(self, active_only: bool = True) -> List[Dict]:
+        """
+        Сводка по (диагноз, навык): число учеников, среднее и медиана прироста,
+        мин/макс, средние баллы "до" и "после", доля учеников с улучшением.
+        """
+        return self._cached("outcomes", (active_only,), lambda: self._compute_outcomes(active_only))
+
+    def get_delta_distribution(self, active_only: bool = True) -> List[Dict]:
+        """
+        Распределение прироста: число учеников в каждом целом интервале прироста
+        для каждой пары (диагноз, навык).
+        """
+        return self._cached("distribution", (active_only,), lambda: self._compute_distribution(active_only))
+
+    def get_group_sizes(self, active_only: bool = True) -> Dict[str, int]:
+        """Сколько учеников каждой группы прошли и первичную, и итоговую диагностику."""
+        def compute():
+            deltas = self._deltas(active_only)
+            rows = self.db.execute(
+                select(deltas.c.diagnosis, func.count(func.distinct(deltas.c.student_id)))
+                .group_by(deltas.c.diagnosis)
+            ).all()
+            return {diagnosis: cnt for diagnosis, cnt in rows}
+
+        return self._cached("sizes", (active_only,), compute)
+
+    # --- Расчеты ---
+
+    def _compute_outcomes(self, active_only: bool) -> List[Dict]:
+        deltas = self._deltas(active_only)
+        group = (deltas.c.diagnosis, deltas.c.skill_id)
+
+        # Медиана: берем одну или две средние строки в каждой группе по порядку прироста
+        ordered = select(
+            deltas.c.diagnosis, deltas.c.skill_id, deltas.c.delta,
+            func.row_number().over(partition_by=group, order_by=deltas.c.delta).label("rn"),
+            func.count().over(partition_by=group).label("cnt"),
+        ).subquery()
+        medians = select(
+            ordered.c.diagnosis, ordered.c.skill_id,
+            func.avg(ordered.c.delta).label("median_delta"),
+        ).where(ordered.c.rn.in_([(ordered.c.cnt + 1) // 2, (ordered.c.cnt + 2) // 2]))\
+         .group_by(ordered.c.diagnosis, ordered.c.skill_id)\
+         .subquery()
+
+        stats = select(
+            deltas.c.diagnosis, deltas.c.skill_id,
+            func.count().label("students"),
+            func.avg(deltas.c.delta).label("avg_delta"),
+            func.min(deltas.c.delta).label("min_delta"),
+            func.max(deltas.c.delta).label("max_delta"),
+            func.avg(deltas.c.primary_score).label("avg_primary"),
+            func.avg(deltas.c.final_score).label("avg_final"),
+            func.avg(case((deltas.c.delta > 0, 1.0), else_=0.0)).label("improved_share"),
+        ).group_by(*group).subquery()
+
+        skill = aliased(SkillCategory)
+        sphere = aliased(SkillCategory)
+        stmt = select(
+            stats,
+            medians.c.median_delta,
+            skill.name.label("skill"),
+            func.coalesce(sphere.name, "Общее").label("sphere"),
+        ).join(medians, and_(medians.c.diagnosis == stats.c.diagnosis, medians.c.skill_id == stats.c.skill_id))\
+         .join(skill, skill.id == stats.c.skill_id)\
+         .outerjoin(sphere, sphere.id == skill.parent_id)\
+         .order_by(stats.c.diagnosis, sphere.name, skill.name)
+
+        return [dict(row._mapping) for row in self.db.execute(stmt)]
+
+    def _compute_distribution(self, active_only: bool) -> List[Dict]:
+        deltas = self._deltas(active_only)
+        bucket = cast(func.round(deltas.c.delta), Integer).label("bucket")
+        stmt = select(
+            deltas.c.diagnosis,
+            deltas.c.skill_id,
+            bucket,
+            func.count().label("students"),
+        ).group_by(deltas.c.diagnosis, deltas.c.skill_id, bucket)\
+         .order_by(deltas.c.diagnosis, deltas.c.skill_id, bucket)
+
+        return [dict(row._mapping) for row in self.db.execute(stmt)]
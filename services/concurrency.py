@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+
+class VersionConflictError(RuntimeError):
+    """
+    Запись изменил другой пользователь после того, как ее прочитали.
+    current — актуальное состояние записи (если известно), для показа в интерфейсе.
+    """
+
+    def __init__(self, message: str, current: Optional[dict] = None):
+        super().__init__(message)
+        self.current = current
+
+
+def check_version(obj, expected_version: Optional[int], what: str):
+    """Сравнение версии прочитанной строки с версией, на которой основано изменение."""
+    if obj.version != expected_version:
+        raise VersionConflictError(
+            f"{what} изменен другим пользователем (версия {obj.version}, ожидалась {expected_version})."
+        )
+
+
+@contextmanager
+def versioned_commit(db: Session, what: str):
+    """
+    Фиксация транзакции с проверкой версий. ORM добавляет к UPDATE условие
+    `version = <прочитанная>`; если строку успели изменить, транзакция откатывается.
+    """
+    try:
+        yield
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise VersionConflictError(f"{what} изменен другим пользователем во время сохранения.")
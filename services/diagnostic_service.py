@@ -1,19 +1,55 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import Session, aliased, selectinload
+from sqlalchemy import func, select
 from database.models import Diagnostic, DiagnosticResult, SkillCategory, DiagnosticType
+import services.change_journal  # noqa: F401  (записи через ORM попадают в журнал изменений)
+from services.read_cache import reference_cache
+from services.read_models import DiagnosticProfile, DiagnosticStage, SkillScore
 from datetime import date
-from typing import List, Dict
+from typing import List, Dict, Tuple
+
+# Порядок этапов на графике динамики
+STAGE_ORDER = [DiagnosticType.PRIMARY, DiagnosticType.INTERMEDIATE, DiagnosticType.FINAL]
+
+# Мемоизация профиля: {(student_id, id последней диагностики): DiagnosticProfile}
+PROFILE_CACHE_SIZE = 256
+_profile_lock = threading.Lock()
+_profile_cache: "OrderedDict[tuple, DiagnosticProfile]" = OrderedDict()
 
 class DiagnosticService:
     def __init__(self, db: Session):
         self.db = db
 
+    @staticmethod
+    def invalidate():
+        """Сбросить запомненные профили (после замены данных целиком, см. utils/snapshot.py)."""
+        with _profile_lock:
+            _profile_cache.clear()
+
     def get_assessment_skills(self) -> List[SkillCategory]:
         """
         Получает список навыков, которые нужно оценить.
         Берем только те категории, у которых есть parent_id (то есть это конкретные навыки, а не общие сферы).
+        Список из общего кэша — только для чтения.
+        """
+        return list(reference_cache.get(
+            self.db, SkillCategory.__tablename__, "skills",
+            lambda session: session.query(SkillCategory).filter(SkillCategory.parent_id.isnot(None)).all()
+        ).rows)
+
+    def get_assessment_skill_rows(self) -> List[Tuple[int, str, str]]:
+        """
+        Те же навыки в виде простых кортежей (id, название, сфера), одним запросом.
+        Их можно передавать во фрагменты и хранить между перезапусками без обращения к сессии БД.
         """
-        return self.db.query(SkillCategory).filter(SkillCategory.parent_id.isnot(None)).all()
+        sphere = aliased(SkillCategory)
+        return [
+            tuple(row) for row in self.db.query(SkillCategory.id, SkillCategory.name, sphere.name)
+            .join(sphere, sphere.id == SkillCategory.parent_id)
+            .order_by(sphere.id, SkillCategory.id)
+            .all()
+        ]
 
     def save_diagnostic(self, student_id: int, teacher_id: int, d_type: str, scores: Dict[int, int], summary: str = ""):
         """
@@ -47,6 +83,30 @@ class DiagnosticService:
         self.db.commit()
         return new_diagnostic
 
+    def save_diagnostics(self, items: List[Dict]) -> List[Diagnostic]:
+        """
+        Пакетное сохранение диагностик одной транзакцией.
+        items: [{student_id, teacher_id, type, scores: {skill_id: оценка}, summary, date}]
+        """
+        diagnostics = []
+        for item in items:
+            diagnostic = Diagnostic(
+                student_id=item["student_id"],
+                teacher_id=item["teacher_id"],
+                date=item.get("date") or date.today(),
+                type=DiagnosticType(item["type"]),
+                summary=item.get("summary", ""),
+                results=[
+                    DiagnosticResult(skill_id=int(skill_id), score=float(score), comment="")
+                    for skill_id, score in item["scores"].items()
+                ]
+            )
+            diagnostics.append(diagnostic)
+
+        self.db.add_all(diagnostics)
+        self.db.commit()
+        return diagnostics
+
     def get_latest_diagnostic(self, student_id: int):
         """Получить последнюю диагностику ребенка для построения графика"""
         return self.db.query(Diagnostic)\
@@ -58,8 +118,70 @@ class DiagnosticService:
         """
         Получает ВСЕ диагностики ученика, отсортированные по дате.
         Нужно для построения сравнительного графика.
+        Оценки всех диагностик загружаются вторым запросом, а не по одному на диагностику.
         """
         return self.db.query(Diagnostic)\
+            .options(selectinload(Diagnostic.results))\
             .filter(Diagnostic.student_id == student_id)\
             .order_by(Diagnostic.date.asc())\
-            .all()
\ No newline at end of file
+            .all()
+
+    def get_progress_profile(self, student_id: int) -> DiagnosticProfile:
+        """
+        Профиль для графика динамики: последняя диагностика КАЖДОГО типа
+        и оценки навыков в ней (таблица для графика — profile.frame()).
+        Выбор последних срезов и все соединения выполняются одним запросом.
+        Результат запоминается по (ученик, id последней диагностики).
+        """
+        latest_id = self.db.query(func.max(Diagnostic.id))\
+            .filter(Diagnostic.student_id == student_id)\
+            .scalar()
+        if latest_id is None:
+            return DiagnosticProfile((), ())
+
+        key = (student_id, latest_id)
+        with _profile_lock:
+            if key in _profile_cache:
+                _profile_cache.move_to_end(key)
+                return _profile_cache[key]
+
+        profile = self._load_progress_profile(student_id)
+        with _profile_lock:
+            _profile_cache[key] = profile
+            while len(_profile_cache) > PROFILE_CACHE_SIZE:
+                _profile_cache.popitem(last=False)
+        return profile
+
+    def _load_progress_profile(self, student_id: int) -> DiagnosticProfile:
+        ranked = select(
+            Diagnostic.id, Diagnostic.type, Diagnostic.date, Diagnostic.summary,
+            func.row_number().over(
+                partition_by=Diagnostic.type,
+                order_by=(Diagnostic.date.desc(), Diagnostic.id.desc())
+            ).label("rn"),
+        ).where(Diagnostic.student_id == student_id).subquery()
+
+        skill = aliased(SkillCategory)
+        sphere = aliased(SkillCategory)
+        stmt = select(
+            ranked.c.type, ranked.c.date, ranked.c.summary,
+            func.coalesce(sphere.name, "Общее").label("sphere"),
+            skill.name.label("skill"),
+            DiagnosticResult.score,
+        ).select_from(ranked)\
+            .outerjoin(DiagnosticResult, DiagnosticResult.diagnostic_id == ranked.c.id)\
+            .outerjoin(skill, skill.id == DiagnosticResult.skill_id)\
+            .outerjoin(sphere, sphere.id == skill.parent_id)\
+            .where(ranked.c.rn == 1)
+
+        rows = self.db.execute(stmt).all()
+
+        stages = {}
+        scores = []
+        for d_type, d_date, summary, sphere_name, skill_name, score in rows:
+            d_type = DiagnosticType(d_type)
+            stages.setdefault(d_type, DiagnosticStage(d_type.value, d_date, summary))
+            if skill_name is not None:
+                scores.append(SkillScore(sphere_name, skill_name, d_type.value, score))
+
+        return DiagnosticProfile(tuple(stages[t] for t in STAGE_ORDER if t in stages), tuple(scores))
@@ -1,12 +1,28 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from database.models import Exercise, SkillCategory
-from typing import List
+import services.change_journal  # noqa: F401  (записи через ORM попадают в журнал изменений)
+from services.read_cache import reference_cache
+from services.read_models import ExerciseCard, split_tags
+from typing import List, Optional
+
+
+def _load_exercise_cards(session: Session) -> List[ExerciseCard]:
+    """Карточки методик с названием навыка одним запросом, лучшие по рейтингу сверху."""
+    stmt = select(
+        Exercise.id, Exercise.title, Exercise.description, Exercise.skill_id, SkillCategory.name,
+        Exercise.difficulty_level, Exercise.materials, Exercise.duration_minutes,
+        Exercise.effectiveness_score, Exercise.contraindications,
+    ).outerjoin(SkillCategory, SkillCategory.id == Exercise.skill_id)\
+        .order_by(Exercise.effectiveness_score.desc(), Exercise.id)
+    return [ExerciseCard(*row[:-1], split_tags(row[-1])) for row in session.execute(stmt)]
+
 
 class ExerciseService:
     def __init__(self, db: Session):
         self.db = db
 
-    def create_exercise(self, title, description, skill_id, difficulty, materials, duration, score):
+    def create_exercise(self, title, description, skill_id, difficulty, materials, duration, score, contraindications_list=None):
         """Добавление новой методики в базу"""
         new_ex = Exercise(
             title=title,
@@ -15,10 +31,12 @@ class ExerciseService:
             difficulty_level=difficulty,
             materials=materials,
             duration_minutes=duration,
-            effectiveness_score=score # Педагог сам ставит начальный рейтинг
+            effectiveness_score=score, # Педагог сам ставит начальный рейтинг
+            contraindications=",".join(contraindications_list) if contraindications_list else ""
         )
         self.db.add(new_ex)
         self.db.commit()
+        reference_cache.invalidate(Exercise.__tablename__)
         return new_ex
     
 
@@ -37,14 +55,22 @@ class ExerciseService:
             ex.contraindications = ",".join(contraindications_list) if contraindications_list else ""
             
             self.db.commit()
+            reference_cache.invalidate(Exercise.__tablename__)
             self.db.refresh(ex)
             return ex
         return None
     
 
-    def get_all_exercises(self) -> List[Exercise]:
-        """Получить все, отсортированные по рейтингу (лучшие сверху)"""
-        return self.db.query(Exercise).order_by(Exercise.effectiveness_score.desc()).all()
+    def get_all_exercises(self) -> List[ExerciseCard]:
+        """Получить все, отсортированные по рейтингу (лучшие сверху). Карточки из общего кэша"""
+        return list(self._cached_exercises().rows)
+
+    def get_exercise_by_id(self, exercise_id: int) -> Optional[ExerciseCard]:
+        """Карточка методики по id из того же кэша"""
+        return self._cached_exercises().by_id.get(exercise_id)
+
+    def _cached_exercises(self):
+        return reference_cache.get(self.db, Exercise.__tablename__, "all", _load_exercise_cards)
 
     def delete_exercise(self, exercise_id: int):
         """Удаление методики"""
@@ -52,7 +78,11 @@ class ExerciseService:
         if ex:
             self.db.delete(ex)
             self.db.commit()
+            reference_cache.invalidate(Exercise.__tablename__)
 
     def get_all_skills(self):
-        """Список навыков для выпадающего списка"""
-        return self.db.query(SkillCategory).filter(SkillCategory.parent_id.isnot(None)).all()
\ No newline at end of file
+        """Список навыков для выпадающего списка (из общего кэша)"""
+        return list(reference_cache.get(
+            self.db, SkillCategory.__tablename__, "skills",
+            lambda session: session.query(SkillCategory).filter(SkillCategory.parent_id.isnot(None)).all()
+        ).rows)
\ No newline at end of file
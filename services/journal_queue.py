@@ -0,0 +1,333 @@
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+
+from config.settings import Config
+from database.connection import SessionLocal
+from services.log_service import LogService
+from utils.background import start_worker
+
+logger = logging.getLogger(__name__)
+
+PENDING_FILE = "pending.jsonl"
+FLUSHING_FILE = "flushing.jsonl"
+# Записи, которые не удалось сохранить в БД (ошибка в самих данных): для разбора администратором
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+# Неразрешенные конфликты версий (переписывается целиком при каждом изменении)
+CONFLICTS_FILE = "conflicts.jsonl"
+# Сколько последних примененных записей помнить для цепочки версий одного автора
+CHAIN_SIZE = 5000
+
+
+class JournalQueue:
+    """
+    Очередь записей журнала (write-behind).
+
+    Сохранение дня пишет записи в локальный файл очереди (дописывание + fsync)
+    и сразу возвращает управление — без ожидания блокировки основной БД.
+    Фоновый процесс периодически переносит накопленные записи в БД одной
+    транзакцией. Пока запись не перенесена, она видна через pending().
+
+    Перенос идемпотентен по (plan_item_id, date): если процесс упадет после
+    записи в БД, но до удаления файла, повторный перенос даст тот же результат.
+    Если пакет не сохраняется из-за отдельных записей (а не из-за занятой БД),
+    записи переносятся по одной, а ошибочные откладываются в dead_letter.jsonl
+    и не блокируют остальную очередь.
+
+    Каждая запись несет версию строки журнала, которую видел автор (author —
+    сессия пользователя). Если строку успел изменить другой специалист, запись
+    не применяется и попадает в conflicts(). Повторные сохранения одного автора
+    продолжают цепочку его собственных версий и конфликтом не считаются.
+    """
+
+    def __init__(self, spool_dir: str, session_factory=SessionLocal):
+        self.spool_dir = spool_dir
+        self.session_factory = session_factory
+        self._lock = threading.Lock()        # файл pending + _pending
+        self._flush_lock = threading.Lock()  # один перенос в момент времени
+        self._pending: Dict[Tuple[int, str], dict] = {}
+        # (item_id, date, author) -> {"entry", "current"}: записи, не примененные из-за конфликта версий
+        self._conflicts: Dict[Tuple[int, str, str], dict] = {}
+        # (item_id, date) -> (author, версия до записи, версия после): последние примененные записи
+        self._chain: Dict[Tuple[int, str], Tuple[str, Optional[int], int]] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self.worker = None
+        os.makedirs(spool_dir, exist_ok=True)
+        self._dead_count = len(self._read_entries(self._path(DEAD_LETTER_FILE)))
+        # Конфликты, которые автор еще не разобрал до перезапуска процесса
+        for conflict in self._read_lines(self._path(CONFLICTS_FILE)):
+            e = conflict["entry"]
+            self._conflicts[(e["item_id"], e["date"], e["author"])] = conflict
+        # Записи, не перенесенные до перезапуска процесса
+        for path in (self._path(FLUSHING_FILE), self._path(PENDING_FILE)):
+            for entry in self._read_entries(path):
+                self._pending[(entry["item_id"], entry["date"])] = entry
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.spool_dir, name)
+
+    @staticmethod
+    def _read_lines(path: str) -> List[dict]:
+        if not os.path.exists(path):
+            return []
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Оборванная последняя строка (сбой во время записи) — пропускаем
+                    continue
+        return rows
+
+    @classmethod
+    def _read_entries(cls, path: str) -> List[dict]:
+        entries = cls._read_lines(path)
+        for entry in entries:
+            # Записи, поставленные в очередь до появления версий
+            entry.setdefault("version", None)
+            entry.setdefault("author", "")
+        return entries
+
+    def _save_conflicts(self):
+        """Записать конфликты в файл (вызывается под self._lock)."""
+        path = self._path(CONFLICTS_FILE)
+        partial = f"{path}.partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            for conflict in self._conflicts.values():
+                f.write(json.dumps(conflict, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+
+    def add_listener(self, callback: Callable[[], None]):
+        """callback() вызывается после каждого успешного переноса в БД."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def enqueue(self, entries: List[dict]):
+        """
+        Поставить записи в очередь.
+        entries: [{item_id, date, status, score, notes, version, author}], date — datetime.date
+        """
+        rows = [
+            {
+                "item_id": int(e["item_id"]),
+                "date": e["date"].isoformat(),
+                "status": e["status"],
+                "score": e["score"],
+                "notes": e["notes"],
+                "version": e["version"],
+                "author": e["author"],
+            }
+            for e in entries
+        ]
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+        with self._lock:
+            with open(self._path(PENDING_FILE), "a", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            resolved = False
+            for r in rows:
+                key = (r["item_id"], r["date"])
+                self._pending[key] = r
+                # Повторное сохранение автором снимает его конфликт по этой записи
+                resolved |= self._conflicts.pop((*key, r["author"]), None) is not None
+            if resolved:
+                self._save_conflicts()
+        if self.worker is not None:
+            self.worker.wake()
+
+    def pending(self, item_ids, start: date, end: date) -> Dict[date, Dict[int, dict]]:
+        """Еще не перенесенные записи за период: {дата: {plan_item_id: запись}}"""
+        item_ids = set(item_ids)
+        start_s, end_s = start.isoformat(), end.isoformat()
+        result = {}
+        with self._lock:
+            for (item_id, day), entry in self._pending.items():
+                if item_id in item_ids and start_s <= day <= end_s:
+                    result.setdefault(date.fromisoformat(day), {})[item_id] = entry
+        return result
+
+    def conflicts(self, author: str, item_ids, start: date, end: date) -> Dict[date, Dict[int, dict]]:
+        """Конфликты автора за период: {дата: {plan_item_id: {"entry", "current"}}}"""
+        item_ids = set(item_ids)
+        start_s, end_s = start.isoformat(), end.isoformat()
+        result = {}
+        with self._lock:
+            for (item_id, day, owner), conflict in self._conflicts.items():
+                if owner == author and item_id in item_ids and start_s <= day <= end_s:
+                    result.setdefault(date.fromisoformat(day), {})[item_id] = conflict
+        return result
+
+    def discard_conflicts(self, author: str, keys):
+        """Убрать конфликты автора (пользователь принял значения из БД). keys: [(item_id, date)]"""
+        with self._lock:
+            for item_id, day in keys:
+                self._conflicts.pop((item_id, day.isoformat(), author), None)
+            self._save_conflicts()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def dead_letter_count(self) -> int:
+        """Сколько записей отложено в dead_letter.jsonl."""
+        with self._lock:
+            return self._dead_count
+
+    def dead_letters(self) -> List[dict]:
+        """Отложенные записи с текстом ошибки (поля error, failed_at)."""
+        with self._lock:
+            return self._read_entries(self._path(DEAD_LETTER_FILE))
+
+    def clear(self):
+        """
+        Отбросить очередь, конфликты и отложенные записи вместе с файлами
+        (все данные БД заменены, например, восстановлением снимка).
+        """
+        with self._flush_lock, self._lock:
+            for name in (PENDING_FILE, FLUSHING_FILE, CONFLICTS_FILE, DEAD_LETTER_FILE):
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+            self._pending.clear()
+            self._conflicts.clear()
+            self._chain.clear()
+            self._dead_count = 0
+
+    def _apply_one_by_one(self, db, batch: List[dict]):
+        """
+        Перенос по одной записи после ошибки пакета.
+        Возвращает (версии, конфликты, {номер записи: текст ошибки}).
+        Занятая БД (OperationalError) пробрасывается: это не ошибка записи.
+        """
+        service = LogService(db)
+        versions, conflicts, failed = [], [], {}
+        for index, entry in enumerate(batch):
+            try:
+                entry_versions, entry_conflicts = service.apply_daily_logs([entry])
+            except OperationalError:
+                db.rollback()
+                raise
+            except Exception as e:
+                db.rollback()
+                logger.exception("Запись журнала не сохранена: %s", entry)
+                versions.append(None)
+                failed[index] = f"{type(e).__name__}: {e}"
+                continue
+            versions += entry_versions
+            conflicts += entry_conflicts
+        return versions, conflicts, failed
+
+    def flush(self):
+        """
+        Перенести очередь в БД. Ошибки доступа к БД (например, database is locked)
+        пробрасываются: файл остается на месте, фоновый процесс повторит попытку
+        с задержкой. Записи, которые не сохраняются сами по себе, уходят в dead_letter.jsonl.
+        """
+        with self._flush_lock:
+            flushing = self._path(FLUSHING_FILE)
+            # 1. Незавершенный прошлый перенос — сначала он (порядок записей важен)
+            if not os.path.exists(flushing):
+                with self._lock:
+                    pending = self._path(PENDING_FILE)
+                    if not os.path.exists(pending):
+                        return
+                    os.replace(pending, flushing)
+
+            # 2. Последняя запись каждого автора для (упражнение, дата),
+            # в порядке первого сохранения
+            latest = {}
+            for entry in self._read_entries(flushing):
+                latest[(entry["item_id"], entry["date"], entry["author"])] = entry
+            entries = list(latest.values())
+
+            batch = []
+            for e in entries:
+                version = e["version"]
+                chain = self._chain.get((e["item_id"], e["date"]))
+                # Запись основана на версии, которую автор сам заменил предыдущим сохранением
+                if chain and chain[0] == e["author"] and chain[1] == version:
+                    version = chain[2]
+                batch.append(dict(e, date=date.fromisoformat(e["date"]), version=version))
+
+            # 3. Одна транзакция на пакет; если пакет не сохраняется — по одной записи
+            db = self.session_factory()
+            failed = {}
+            try:
+                versions, conflicts = LogService(db).apply_daily_logs(batch)
+            except OperationalError:
+                db.rollback()
+                raise
+            except Exception as e:
+                db.rollback()
+                logger.warning("Пакет журнала не сохранен (%s), перенос по одной записи", e)
+                versions, conflicts, failed = self._apply_one_by_one(db, batch)
+            finally:
+                db.close()
+
+            # 4. Пакет в БД — убираем файл и снимаем записи из видимой очереди,
+            # если их не перезаписали новыми значениями за время переноса.
+            # Ошибочные записи сохраняются до удаления файла переноса
+            with self._lock:
+                if failed:
+                    failed_at = datetime.now().isoformat(timespec="seconds")
+                    data = "".join(
+                        json.dumps(dict(entries[index], error=error, failed_at=failed_at), ensure_ascii=False) + "\n"
+                        for index, error in failed.items()
+                    )
+                    with open(self._path(DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._dead_count += len(failed)
+                os.remove(flushing)
+                for e, b, new_version in zip(entries, batch, versions):
+                    key = (e["item_id"], e["date"])
+                    if new_version is not None:
+                        self._chain.pop(key, None)
+                        self._chain[key] = (e["author"], b["version"], new_version)
+                    if self._pending.get(key) == e:
+                        del self._pending[key]
+                for conflict in conflicts:
+                    e = conflict["entry"]
+                    key = (e["item_id"], e["date"].isoformat(), e["author"])
+                    self._conflicts[key] = {"entry": dict(e, date=key[1]), "current": conflict["current"]}
+                    logger.info("Конфликт версий журнала: %s", key)
+                if conflicts:
+                    self._save_conflicts()
+                # Цепочка нужна только для недавних сохранений
+                while len(self._chain) > CHAIN_SIZE:
+                    self._chain.pop(next(iter(self._chain)))
+
+        for callback in self._listeners:
+            callback()
+
+
+_queue_lock = threading.Lock()
+_queue: Optional[JournalQueue] = None
+
+
+def clear_journal_queue():
+    """Сбросить очередь процесса; если она еще не создана (командная строка) — только файлы."""
+    with _queue_lock:
+        queue = _queue
+    (queue or JournalQueue(Config.JOURNAL_QUEUE_DIR)).clear()
+
+
+def get_journal_queue() -> JournalQueue:
+    """Очередь журнала процесса (создается и запускается при первом обращении)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JournalQueue(Config.JOURNAL_QUEUE_DIR)
+            _queue.worker = start_worker("journal_queue", _queue.flush, Config.JOURNAL_FLUSH_INTERVAL)
+        return _queue
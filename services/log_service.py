@@ -1,22 +1,76 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import date
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from database.models import (
-    EducationalPlan, PlanItem, ProgressLog, 
+    EducationalPlan, PlanItem, ProgressLog, Exercise, SkillCategory,
     LogStatus, PlanStatus
 )
+from database.archive import ARCHIVE_PLAN_ITEMS, ARCHIVE_PROGRESS_LOG
+from services.change_journal import INSERT, UPDATE, record_changes
+from services.concurrency import VersionConflictError, check_version, versioned_commit
+from services.read_models import PlanItemRecord, PlanRecord
+
+# Если история плана длиннее этих порогов (в днях), ряды оценок
+# укрупняются до недель / месяцев, чтобы число точек не росло вместе с планом.
+WEEKLY_BUCKET_AFTER_DAYS = 92
+MONTHLY_BUCKET_AFTER_DAYS = 730
+
+# Столбцы PlanRecord (без пунктов)
+_PLAN_COLUMNS = (
+    EducationalPlan.id, EducationalPlan.student_id, EducationalPlan.status, EducationalPlan.goal_description,
+    EducationalPlan.start_date, EducationalPlan.end_date, EducationalPlan.version, EducationalPlan.cold_archived_at,
+)
 
 class LogService:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_active_plan(self, student_id: int) -> EducationalPlan:
-        """Находит текущий активный план ребенка (самый свежий)"""
-        return self.db.query(EducationalPlan)\
-            .filter(EducationalPlan.student_id == student_id)\
-            .filter(EducationalPlan.status == PlanStatus.ACTIVE)\
-            .order_by(EducationalPlan.created_at.desc())\
-            .first()
+    def plan_entities(self, plan_id: int):
+        """
+        Откуда читать пункты и журнал плана: из основных таблиц или, если план
+        перенесен в холодный архив, из archive.db. Возвращает (PlanItem, ProgressLog)
+        или их псевдонимы на архивных таблицах — запросы отчетов одинаковы для обоих.
+        """
+        cold = self.db.query(EducationalPlan.cold_archived_at).filter(EducationalPlan.id == plan_id).scalar()
+        if cold is None:
+            return PlanItem, ProgressLog
+        return (
+            aliased(PlanItem, ARCHIVE_PLAN_ITEMS, adapt_on_names=True),
+            aliased(ProgressLog, ARCHIVE_PROGRESS_LOG, adapt_on_names=True),
+        )
+
+    def get_student_plans(self, student_id: int) -> List[PlanRecord]:
+        """Все планы ученика (без пунктов): сначала активный, затем архивные от новых к старым."""
+        stmt = select(*_PLAN_COLUMNS)\
+            .where(EducationalPlan.student_id == student_id)\
+            .order_by((EducationalPlan.status == PlanStatus.ACTIVE).desc(), EducationalPlan.created_at.desc())
+        return [PlanRecord(*row) for row in self.db.execute(stmt)]
+
+    def get_plan_items(self, plan_id: int) -> List[PlanItemRecord]:
+        """Пункты плана с упражнениями (в том числе из холодного архива), по порядку."""
+        item, _ = self.plan_entities(plan_id)
+        stmt = select(
+            item.id, item.exercise_id, Exercise.title, SkillCategory.name, Exercise.materials,
+            Exercise.effectiveness_score, item.frequency, item.target_score, item.order_index, item.version,
+        ).outerjoin(Exercise, Exercise.id == item.exercise_id)\
+            .outerjoin(SkillCategory, SkillCategory.id == Exercise.skill_id)\
+            .where(item.plan_id == plan_id)\
+            .order_by(item.order_index, item.id)
+        return [PlanItemRecord(*row) for row in self.db.execute(stmt)]
+
+    def get_active_plan(self, student_id: int) -> Optional[PlanRecord]:
+        """Находит текущий активный план ребенка (самый свежий) вместе с пунктами"""
+        row = self.db.execute(
+            select(*_PLAN_COLUMNS)
+            .where(EducationalPlan.student_id == student_id, EducationalPlan.status == PlanStatus.ACTIVE)
+            .order_by(EducationalPlan.created_at.desc())
+            .limit(1)
+        ).first()
+        if row is None:
+            return None
+        return PlanRecord(*row, items=tuple(self.get_plan_items(row.id)))
 
     def get_logs_for_date(self, plan_id: int, log_date: date) -> Dict[int, ProgressLog]:
         """
@@ -31,20 +85,127 @@ class LogService:
         
         return {log.plan_item_id: log for log in logs}
     
-    def get_all_logs_for_plan(self, plan_id: int):
+    def get_logs_for_range(self, plan_id: int, start: date, end: date) -> Dict[date, Dict[int, ProgressLog]]:
         """
-        Получает историю выполнения для отчета.
-        Сортируем по дате (сначала новые).
+        Журнал плана за период [start, end] одним запросом (индекс plan_item_id + date).
+        Возвращает {дата: {plan_item_id: ProgressLog}}.
         """
-        return self.db.query(ProgressLog)\
+        logs = self.db.query(ProgressLog)\
             .join(PlanItem)\
             .filter(PlanItem.plan_id == plan_id)\
-            .order_by(ProgressLog.date.desc())\
+            .filter(ProgressLog.date.between(start, end))\
             .all()
 
-    def save_daily_log(self, item_id: int, log_date: date, status: str, score: int, notes: str):
+        by_date: Dict[date, Dict[int, ProgressLog]] = {}
+        for log in logs:
+            by_date.setdefault(log.date, {})[log.plan_item_id] = log
+        return by_date
+
+    def get_all_logs_for_plan(self, plan_id: int):
+        """
+        Получает историю выполнения для отчета.
+        Сортируем по дате (сначала новые). Упражнение записи — по plan_item_id
+        из пунктов get_plan_items (связь log.item для архивных записей не загружается).
+        """
+        item, log = self.plan_entities(plan_id)
+        return self.db.query(log)\
+            .join(item, log.plan_item_id == item.id)\
+            .filter(item.plan_id == plan_id)\
+            .order_by(log.date.desc())\
+            .all()
+
+    def get_plan_metrics(self, plan_id: int) -> Dict:
+        """
+        Сводка по журналу плана одним агрегатным запросом (без загрузки записей).
+        Возвращает: {sessions, entries, avg_score, first_date, last_date}
+        """
+        item, log = self.plan_entities(plan_id)
+        sessions, entries, avg_score, first_date, last_date = self.db.query(
+            func.count(func.distinct(log.date)),
+            func.count(log.id),
+            func.avg(log.performance_score),
+            func.min(log.date),
+            func.max(log.date),
+        ).join(item, log.plan_item_id == item.id)\
+            .filter(item.plan_id == plan_id)\
+            .one()
+
+        return {
+            "sessions": sessions,
+            "entries": entries,
+            "avg_score": float(avg_score) if avg_score is not None else 0.0,
+            "first_date": first_date,
+            "last_date": last_date,
+        }
+
+    def get_exercise_score_series(self, plan_id: int) -> List[Dict]:
+        """
+        Динамика среднего балла по каждому упражнению плана (GROUP BY в БД).
+        Длинные периоды укрупняются до недель (и месяцев), поэтому размер
+        результата ограничен числом упражнений × числом интервалов.
+        Возвращает список {exercise_id, title, period, bucket, avg_score, entries}.
+        """
+        metrics = self.get_plan_metrics(plan_id)
+        if not metrics["entries"]:
+            return []
+
+        item, log = self.plan_entities(plan_id)
+        span_days = (metrics["last_date"] - metrics["first_date"]).days
+        if span_days > MONTHLY_BUCKET_AFTER_DAYS:
+            bucket_name = "month"
+            bucket = func.date(log.date, "start of month")
+        elif span_days > WEEKLY_BUCKET_AFTER_DAYS:
+            bucket_name = "week"
+            # Понедельник недели: отступаем на 6 дней и идем к ближайшему понедельнику
+            bucket = func.date(log.date, "-6 days", "weekday 1")
+        else:
+            bucket_name = "day"
+            bucket = func.date(log.date)
+
+        rows = self.db.query(
+            Exercise.id,
+            Exercise.title,
+            bucket.label("period"),
+            func.avg(log.performance_score),
+            func.count(log.id),
+        ).select_from(log)\
+            .join(item, log.plan_item_id == item.id)\
+            .join(Exercise, item.exercise_id == Exercise.id)\
+            .filter(item.plan_id == plan_id)\
+            .group_by(Exercise.id, Exercise.title, bucket)\
+            .order_by(Exercise.id, bucket)\
+            .all()
+
+        return [
+            {
+                "exercise_id": ex_id,
+                "title": title,
+                "period": date.fromisoformat(period),
+                "bucket": bucket_name,
+                "avg_score": float(avg) if avg is not None else None,
+                "entries": cnt,
+            }
+            for ex_id, title, period, avg, cnt in rows
+        ]
+
+    def get_recent_log_rows(self, plan_id: int, limit: int = 5) -> List[Dict]:
+        """Последние записи журнала (дата, упражнение, балл) для предпросмотра."""
+        item, log = self.plan_entities(plan_id)
+        rows = self.db.query(log.date, Exercise.title, log.performance_score)\
+            .join(item, log.plan_item_id == item.id)\
+            .join(Exercise, item.exercise_id == Exercise.id)\
+            .filter(item.plan_id == plan_id)\
+            .order_by(log.date.desc(), log.id.desc())\
+            .limit(limit)\
+            .all()
+        return [{"date": d, "title": t, "score": sc} for d, t, sc in rows]
+
+    def save_daily_log(self, item_id: int, log_date: date, status: str, score: int, notes: str,
+                       expected_version: Optional[int] = None):
         """
         Сохраняет или обновляет запись в дневнике.
+        expected_version — версия записи, которую видел пользователь (None — записи не было).
+        Если запись с тех пор изменилась, выбрасывается VersionConflictError.
         """
         # 1. Проверяем, есть ли уже запись за этот день для этого упражнения
         existing_log = self.db.query(ProgressLog)\
@@ -52,20 +213,97 @@ class LogService:
             .filter(ProgressLog.date == log_date)\
             .first()
 
-        if existing_log:
-            # Обновляем существующую
-            existing_log.status = LogStatus(status)
-            existing_log.performance_score = score
-            existing_log.teacher_notes = notes
-        else:
-            # Создаем новую
-            new_log = ProgressLog(
-                plan_item_id=item_id,
-                date=log_date,
-                status=LogStatus(status),
-                performance_score=score,
-                teacher_notes=notes
-            )
-            self.db.add(new_log)
-        
-        self.db.commit()
\ No newline at end of file
+        with versioned_commit(self.db, "Запись журнала"):
+            if existing_log:
+                check_version(existing_log, expected_version, "Запись журнала")
+                # Обновляем существующую
+                existing_log.status = LogStatus(status)
+                existing_log.performance_score = score
+                existing_log.teacher_notes = notes
+            else:
+                if expected_version is not None:
+                    raise VersionConflictError("Запись журнала удалена другим пользователем.")
+                # Создаем новую
+                new_log = ProgressLog(
+                    plan_item_id=item_id,
+                    date=log_date,
+                    status=LogStatus(status),
+                    performance_score=score,
+                    teacher_notes=notes
+                )
+                self.db.add(new_log)
+
+    def apply_daily_logs(self, entries: List[Dict]) -> Tuple[List[Optional[int]], List[Dict]]:
+        """
+        Пакетное сохранение записей журнала одной транзакцией с проверкой версий
+        (compare-and-swap): запись обновляется, только если ее версия в БД равна
+        entries[i]["version"] (None — записи еще нет).
+
+        Повтор уже примененного пакета безопасен: если версия не совпала, но в БД
+        лежат те же значения, запись считается сохраненной.
+        Новая запись вставляется, только если пункт плана еще существует (его могли
+        убрать из плана, пока запись ждала в очереди); иначе она возвращается конфликтом.
+
+        entries: [{item_id, date, status, score, notes, version}]
+        Возвращает ([новая версия или None для каждой записи], [{"entry", "current"}] — конфликты).
+        """
+        versions, conflicts = [], []
+        changed = {INSERT: [], UPDATE: []}  # id записей для журнала изменений
+        for e in entries:
+            values = {
+                "status": LogStatus(e["status"]),
+                "performance_score": e["score"],
+                "teacher_notes": e["notes"],
+            }
+            if e["version"] is None:
+                # INSERT ... SELECT из plan_items: для удаленного пункта не вставится ничего
+                columns = ProgressLog.__table__.c
+                stmt = sqlite_insert(ProgressLog)\
+                    .from_select(
+                        ["plan_item_id", "date", "version", *values],
+                        select(PlanItem.id, literal(e["date"], columns.date.type), literal(1),
+                               *[literal(value, columns[name].type) for name, value in values.items()])
+                        .where(PlanItem.id == e["item_id"])
+                    )\
+                    .on_conflict_do_nothing(index_elements=[ProgressLog.plan_item_id, ProgressLog.date])\
+                    .returning(ProgressLog.id)
+                op, new_version = INSERT, 1
+            else:
+                stmt = update(ProgressLog)\
+                    .where(ProgressLog.plan_item_id == e["item_id"],
+                           ProgressLog.date == e["date"],
+                           ProgressLog.version == e["version"])\
+                    .values(version=e["version"] + 1, **values)\
+                    .returning(ProgressLog.id)\
+                    .execution_options(synchronize_session=False)
+                op, new_version = UPDATE, e["version"] + 1
+
+            log_id = self.db.execute(stmt).scalar()
+            if log_id is not None:
+                versions.append(new_version)
+                changed[op].append(log_id)
+                continue
+
+            current = self.db.execute(
+                select(ProgressLog.status, ProgressLog.performance_score, ProgressLog.teacher_notes, ProgressLog.version)
+                .where(ProgressLog.plan_item_id == e["item_id"], ProgressLog.date == e["date"])
+            ).first()
+            if current is not None and (current.status, current.performance_score, current.teacher_notes) == \
+                    (values["status"], values["performance_score"], values["teacher_notes"]):
+                versions.append(current.version)
+            else:
+                versions.append(None)
+                conflicts.append({
+                    "entry": e,
+                    "current": None if current is None else {
+                        "status": current.status.value,
+                        "score": current.performance_score,
+                        "notes": current.teacher_notes,
+                        "version": current.version,
+                    },
+                })
+
+        for op, ids in changed.items():
+            record_changes(self.db, ProgressLog.__tablename__, ids, op)
+        self.db.commit()
+        return versions, conflicts
\ No newline at end of file
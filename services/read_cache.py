@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from sqlalchemy.orm import Session
+from config.settings import Config
+
+# Общий кэш справочных списков (ученики, методики, навыки), которые читаются
+# почти при каждом перезапуске почти каждой страницы.
+#
+# Списки загружаются отдельной короткой сессией и общие для всех сессий и потоков:
+# ученики и методики хранятся неизменяемыми записями (services/read_models.py),
+# навыки — отсоединенными объектами ORM, которые можно только читать.
+# Изменять данные нужно через методы сервисов: после фиксации они сбрасывают
+# записи своей таблицы (invalidate). Изменения из других процессов (API, импорт)
+# становятся видны не позже чем через Config.READ_CACHE_TTL секунд.
+
+
+class CachedRows:
+    """Загруженный список объектов и индекс по id."""
+
+    __slots__ = ("rows", "by_id", "loaded_at")
+
+    def __init__(self, rows: List, loaded_at: float):
+        self.rows = tuple(rows)
+        self.by_id = {obj.id: obj for obj in self.rows}
+        self.loaded_at = loaded_at
+
+
+class ReadCache:
+    """
+    Кэш со сроком жизни (ttl, сек) и ограничением числа записей (LRU).
+    Ключ записи — (таблица, параметры запроса); invalidate(таблица) сбрасывает
+    все записи таблицы.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], CachedRows]" = OrderedDict()
+        # Поколение таблицы (и всего кэша): загрузка, начатая до invalidate / clear, не попадает в кэш
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, db: Session, entity: str, params: Hashable, load: Callable[[Session], List]) -> CachedRows:
+        """
+        Список из кэша или загрузка load(session) отдельной сессией на том же
+        подключении, что и db.
+        """
+        key = (entity, params)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now - cached.loaded_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            generation = self._generation(entity)
+
+        with Session(db.get_bind()) as session:
+            cached = CachedRows(load(session), now)
+
+        with self._lock:
+            if self._generation(entity) == generation:
+                self._entries[key] = cached
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return cached
+
+    def _generation(self, entity: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(entity, 0)
+
+    def invalidate(self, entity: str):
+        """Сбросить все записи таблицы entity (вызывается после фиксации изменений)."""
+        with self._lock:
+            self._generations[entity] = self._generations.get(entity, 0) + 1
+            for key in [key for key in self._entries if key[0] == entity]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики для панели администратора: попадания, промахи, вытеснения, записей в кэше."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+
+reference_cache = ReadCache(ttl=Config.READ_CACHE_TTL, max_entries=Config.READ_CACHE_SIZE)
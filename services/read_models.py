@@ -0,0 +1,100 @@
+from typing import NamedTuple, Optional, Tuple
+from datetime import date, datetime
+
+from database.models import PlanStatus
+
+# Модели чтения для страниц: неизменяемые записи (NamedTuple — без __dict__,
+# хэшируются и сериализуются pickle), которые сервисы собирают Core-запросами
+# только из нужных страницам столбцов. В отличие от объектов ORM они не
+# привязаны к сессии: их можно хранить в кэше и между перезапусками,
+# обращение к полю никогда не идет в БД.
+#
+# Изменяются данные по-прежнему через методы сервисов (по id записи).
+
+
+def split_tags(value: Optional[str]) -> Tuple[str, ...]:
+    """Строка "тег1,тег2" из БД -> кортеж тегов без пустых."""
+    return tuple(tag for tag in (value or "").split(",") if tag)
+
+
+class StudentSummary(NamedTuple):
+    id: int
+    full_name: str
+    birth_date: Optional[date]
+    diagnosis_code: Optional[str]
+    parent_contact: Optional[str]
+    medical_tags: Tuple[str, ...]
+    active: bool
+
+
+class ExerciseCard(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    skill_id: Optional[int]
+    skill_name: Optional[str]
+    difficulty_level: Optional[int]
+    materials: Optional[str]
+    duration_minutes: Optional[int]
+    effectiveness_score: Optional[float]
+    contraindications: Tuple[str, ...]
+
+
+class PlanItemRecord(NamedTuple):
+    """Пункт плана; поля упражнения — None, если методику удалили из базы."""
+    id: int
+    exercise_id: Optional[int]
+    exercise_title: Optional[str]
+    skill_name: Optional[str]
+    materials: Optional[str]
+    effectiveness_score: Optional[float]
+    frequency: Optional[str]
+    target_score: Optional[int]
+    order_index: int
+    version: int
+
+
+class PlanRecord(NamedTuple):
+    """План ученика; items — пункты по порядку (пустой кортеж, если план загружен без пунктов)."""
+    id: int
+    student_id: int
+    status: PlanStatus
+    goal_description: Optional[str]
+    start_date: Optional[date]
+    end_date: Optional[date]
+    version: int
+    cold_archived_at: Optional[datetime]
+    items: Tuple[PlanItemRecord, ...] = ()
+
+
+class DiagnosticStage(NamedTuple):
+    """Последний срез одного типа: type — значение DiagnosticType."""
+    type: str
+    date: date
+    summary: Optional[str]
+
+
+class SkillScore(NamedTuple):
+    sphere: str
+    skill: str
+    type: str
+    score: Optional[int]
+
+
+class DiagnosticProfile(NamedTuple):
+    """
+    Профиль динамики: последние срезы каждого типа (в порядке этапов)
+    и оценки навыков в этих срезах.
+    """
+    stages: Tuple[DiagnosticStage, ...]
+    scores: Tuple[SkillScore, ...]
+
+    def frame(self) -> "pd.DataFrame":
+        """Таблица (Группа, Навык) × этап (primary / intermediate / final) для графика."""
+        # pandas нужен только страницам с графиками: модуль импортируется при старте приложения
+        import pandas as pd
+        frame = pd.DataFrame(self.scores, columns=["Группа", "Навык", "type", "score"])\
+            .pivot_table(index=["Группа", "Навык"], columns="type", values="score", aggfunc="last")\
+            .reindex(columns=[stage.type for stage in self.stages])
+        frame.columns.name = None
+        return frame
@@ -1,7 +1,58 @@
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
-from database.models import Student
-from datetime import date
-from typing import List, Optional
+from config.settings import Config
+from database.archive import ARCHIVE_PLAN_ITEMS, ARCHIVE_PROGRESS_LOG
+from database.connection import SessionLocal, foreign_keys_enforced
+from database.models import EducationalPlan, Student, StudentTag
+from services.change_journal import DELETE, UPDATE, record_changes
+from services.read_cache import reference_cache
+from services.read_models import StudentSummary, split_tags
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+# Сколько учеников удалять окончательно одной транзакцией
+PURGE_BATCH_STUDENTS = 100
+
+# Столбцы StudentSummary
+_SUMMARY_COLUMNS = (
+    Student.id, Student.full_name, Student.birth_date, Student.diagnosis_code,
+    Student.parent_contact, Student.medical_tags, Student.active,
+)
+
+
+def _summaries(executor: Union[Session, Connection], stmt) -> List[StudentSummary]:
+    return [
+        StudentSummary(sid, name, birth, diagnosis, parent, split_tags(tags), bool(active))
+        for sid, name, birth, diagnosis, parent, tags, active in executor.execute(stmt)
+    ]
+
+
+def replace_student_tags(executor: Union[Session, Connection], tags_by_student: Dict[int, Iterable[str]]):
+    """
+    Синхронизация student_tags с тегами учеников (в текущей транзакции executor):
+    строки этих учеников заменяются переданными тегами.
+    """
+    if not tags_by_student:
+        return
+    executor.execute(delete(StudentTag.__table__).where(StudentTag.student_id.in_(list(tags_by_student))))
+    rows = [
+        {"student_id": student_id, "tag": tag}
+        for student_id, tags in tags_by_student.items()
+        for tag in dict.fromkeys(t.strip() for t in tags or [] if t and t.strip())
+    ]
+    if rows:
+        executor.execute(insert(StudentTag.__table__), rows)
+
+
+def run_purge_job() -> int:
+    """Задача фонового процесса: окончательное удаление давно скрытых учеников."""
+    db = SessionLocal()
+    try:
+        return StudentService(db).purge_students()
+    finally:
+        db.close()
+
 
 class StudentService:
     def __init__(self, db: Session):
@@ -23,9 +74,36 @@ class StudentService:
             medical_tags=tags_str # Сохраняем строку
         )
         self.db.add(new_student)
+        self.db.flush()
+        replace_student_tags(self.db, {new_student.id: medical_tags})
         self.db.commit()
+        reference_cache.invalidate(Student.__tablename__)
         self.db.refresh(new_student)
         return new_student
+
+    def create_students(self, rows: List[dict]) -> List[Student]:
+        """
+        Пакетное создание учеников одной транзакцией.
+        rows: [{full_name, birth_date, diagnosis_code, parent_contact, medical_tags: list}]
+        """
+        students = [
+            Student(
+                full_name=row["full_name"],
+                birth_date=row["birth_date"],
+                diagnosis_code=row.get("diagnosis_code"),
+                parent_contact=row.get("parent_contact"),
+                enrollment_date=date.today(),
+                active=True,
+                medical_tags=",".join(row.get("medical_tags") or [])
+            )
+            for row in rows
+        ]
+        self.db.add_all(students)
+        self.db.flush()
+        replace_student_tags(self.db, {s.id: row.get("medical_tags") for s, row in zip(students, rows)})
+        self.db.commit()
+        reference_cache.invalidate(Student.__tablename__)
+        return students
     
 
     def update_student(self, student_id: int, full_name: str, birth_date, diagnosis: str, parent: str, medical_tags: list):
@@ -38,38 +116,148 @@ class StudentService:
             student.parent_contact = parent
             # Превращаем список обратно в строку
             student.medical_tags = ",".join(medical_tags) if medical_tags else ""
+            replace_student_tags(self.db, {student.id: medical_tags})
             
             self.db.commit()
+            reference_cache.invalidate(Student.__tablename__)
             self.db.refresh(student)
             return student
         return None
     
 
-    def delete_student(self, student_id: int):
-        """Удаление ученика и всех связанных с ним данных"""
-        student = self.db.query(Student).filter(Student.id == student_id).first()
-        if student:
-            # SQLAlchemy автоматически удалит каскадные данные (диагностики, планы),
-            # если в моделях настроено cascade="all, delete-orphan".
-            # Если нет, удалит только ученика (или выдаст ошибку, если есть связи).
-            # Для диплома пока просто удаляем объект.
-            self.db.delete(student)
-            self.db.commit()
-            return True
-        return False
+    def delete_student(self, student_id: int, hard: bool = False) -> bool:
+        """
+        Удаление ученика. По умолчанию мягкое: ученик скрывается из списков (active = False)
+        и окончательно удаляется фоновой очисткой через Config.STUDENT_PURGE_AFTER_DAYS дней.
+        hard=True — сразу удалить ученика со всеми данными (см. purge_students).
+        """
+        if hard:
+            return self.purge_students([student_id]) > 0
 
+        updated = self.db.execute(
+            update(Student)
+            .where(Student.id == student_id, Student.deleted_at.is_(None))
+            .values(active=False, deleted_at=datetime.now())
+        ).rowcount
+        if updated:
+            record_changes(self.db, Student.__tablename__, [student_id], UPDATE)
+        self.db.commit()
+        reference_cache.invalidate(Student.__tablename__)
+        return updated > 0
 
-    def get_all_students(self, active_only: bool = True) -> List[Student]:
-        """Получение списка всех учеников"""
-        query = self.db.query(Student)
-        if active_only:
-            query = query.filter(Student.active == True)
-        return query.all()
+    def restore_student(self, student_id: int) -> bool:
+        """Возврат мягко удаленного ученика (пока он не удален окончательно)"""
+        updated = self.db.execute(
+            update(Student)
+            .where(Student.id == student_id, Student.deleted_at.is_not(None))
+            .values(active=True, deleted_at=None)
+        ).rowcount
+        if updated:
+            record_changes(self.db, Student.__tablename__, [student_id], UPDATE)
+        self.db.commit()
+        reference_cache.invalidate(Student.__tablename__)
+        return updated > 0
+
+    def get_deleted_students(self) -> List[Student]:
+        """Мягко удаленные ученики, последние удаленные первыми"""
+        return self.db.query(Student).filter(Student.deleted_at.is_not(None))\
+            .order_by(Student.deleted_at.desc()).all()
+
+    def purge_students(self, student_ids: Optional[Iterable[int]] = None,
+                       older_than_days: int = None, now: Optional[datetime] = None) -> int:
+        """
+        Окончательное удаление учеников со всеми данными.
+        student_ids — кого удалить; по умолчанию — мягко удаленные больше older_than_days
+        (Config.STUDENT_PURGE_AFTER_DAYS) дней назад.
+
+        Удаление выполняется на стороне БД: одно DELETE по ученикам, а диагностики,
+        результаты, планы, пункты и журнал удаляет ON DELETE CASCADE. Строки в память
+        не загружаются, поэтому время и память не зависят от объема истории ученика.
+        Архивные таблицы (archive.db) не связаны внешними ключами и чистятся явно.
+        Возвращает число удаленных учеников.
+        """
+        pending = list(student_ids) if student_ids is not None else None
+        days = Config.STUDENT_PURGE_AFTER_DAYS if older_than_days is None else older_than_days
+        cutoff = (now or datetime.now()) - timedelta(days=days)
+
+        def next_batch(conn) -> List[int]:
+            if pending is not None:
+                batch = pending[:PURGE_BATCH_STUDENTS]
+                del pending[:PURGE_BATCH_STUDENTS]
+                return batch
+            return conn.execute(
+                select(Student.id).where(Student.deleted_at <= cutoff).limit(PURGE_BATCH_STUDENTS)
+            ).scalars().all()
+
+        # Своя транзакция сессии могла держать блокировку записи — завершаем ее до удаления
+        self.db.commit()
+        purged = 0
+        with foreign_keys_enforced(self.db.get_bind()) as conn:
+            while True:
+                ids = next_batch(conn)
+                if not ids:
+                    break
+
+                # 1. Холодный архив: пункты и журнал планов, перенесенных в archive.db
+                cold_plans = select(EducationalPlan.id).where(
+                    EducationalPlan.student_id.in_(ids), EducationalPlan.cold_archived_at.is_not(None)
+                )
+                cold_items = select(ARCHIVE_PLAN_ITEMS.c.id).where(ARCHIVE_PLAN_ITEMS.c.plan_id.in_(cold_plans))
+                conn.execute(delete(ARCHIVE_PROGRESS_LOG).where(ARCHIVE_PROGRESS_LOG.c.plan_item_id.in_(cold_items)))
+                conn.execute(delete(ARCHIVE_PLAN_ITEMS).where(ARCHIVE_PLAN_ITEMS.c.plan_id.in_(cold_plans)))
+                # Отдельная транзакция: по двум файлам SQLite она не атомарна. Сбой после нее
+                # оставит учеников без архивного журнала, и следующий запуск удалит их самих
+                conn.commit()
+
+                # 2. Ученики; остальное удаляет каскад
+                deleted = conn.execute(
+                    delete(Student.__table__).where(Student.id.in_(ids)).returning(Student.id)
+                ).scalars().all()
+                record_changes(conn, Student.__tablename__, deleted, DELETE)
+                purged += len(deleted)
+                conn.commit()
+
+        # Объекты удаленных учеников в сессии больше не актуальны
+        self.db.expire_all()
+        if purged:
+            reference_cache.invalidate(Student.__tablename__)
+        return purged
+
+
+    def get_all_students(self, active_only: bool = True) -> List[StudentSummary]:
+        """Получение списка всех учеников (записи StudentSummary из общего кэша)"""
+        def load(session: Session) -> List[StudentSummary]:
+            stmt = select(*_SUMMARY_COLUMNS).order_by(Student.id)
+            if active_only:
+                stmt = stmt.where(Student.active == True)
+            return _summaries(session, stmt)
+
+        return list(reference_cache.get(self.db, Student.__tablename__, active_only, load).rows)
 
     def get_student_by_id(self, student_id: int) -> Optional[Student]:
         """Поиск ученика по ID"""
         return self.db.query(Student).filter(Student.id == student_id).first()
 
+    def get_student_tags(self, student_id: int) -> Set[str]:
+        """Медицинские теги ученика"""
+        return set(self.db.execute(select(StudentTag.tag).where(StudentTag.student_id == student_id)).scalars())
+
+    def get_tag_counts(self, active_only: bool = True) -> Dict[str, int]:
+        """Сколько учеников с каждым медицинским тегом (по убыванию)"""
+        count = func.count(StudentTag.student_id)
+        stmt = select(StudentTag.tag, count).group_by(StudentTag.tag).order_by(count.desc(), StudentTag.tag)
+        if active_only:
+            stmt = stmt.join(Student, Student.id == StudentTag.student_id).where(Student.active == True)
+        return dict(self.db.execute(stmt).all())
+
+    def get_students_with_tag(self, tag: str, active_only: bool = True) -> List[StudentSummary]:
+        """Ученики с медицинским тегом (поиск по индексу тега)"""
+        stmt = select(*_SUMMARY_COLUMNS).join(StudentTag, StudentTag.student_id == Student.id)\
+            .where(StudentTag.tag == tag)
+        if active_only:
+            stmt = stmt.where(Student.active == True)
+        return _summaries(self.db, stmt.order_by(Student.full_name))
+
     def get_total_count(self) -> int:
         """Статистика: всего активных учеников"""
         return self.db.query(Student).filter(Student.active == True).count()
\ No newline at end of file
@@ -1,10 +1,27 @@
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.orm import Session
-from datetime import date
-from typing import List, Dict
+from datetime import date, datetime
+from typing import List, Dict, Optional, Tuple
 from database.models import (
     Diagnostic, DiagnosticResult, Exercise, 
-    EducationalPlan, PlanItem, PlanStatus, Student
+    EducationalPlan, PlanItem, PlanStatus, ProgressLog, Student, StudentTag
 )
+from services.change_journal import DELETE, INSERT, UPDATE, record_changes
+from services.concurrency import VersionConflictError, versioned_commit
+from services.exercise_service import ExerciseService
+from services.read_models import ExerciseCard
+
+
+class PlanHistoryError(RuntimeError):
+    """
+    Из плана убираются упражнения, по которым уже есть записи дневника.
+    log_counts — {id упражнения: число записей}, для подтверждения в интерфейсе.
+    """
+
+    def __init__(self, message: str, log_counts: Dict[int, int]):
+        super().__init__(message)
+        self.log_counts = log_counts
+
 
 class TrajectoryService:
     def __init__(self, db: Session):
@@ -33,7 +50,7 @@ class TrajectoryService:
         
         return weak_skills
 
-    def get_recommendations(self, student_id: int, weak_skills_ids: List[int]) -> List[Exercise]:
+    def get_recommendations(self, student_id: int, weak_skills_ids: List[int]) -> List[ExerciseCard]:
         """
         АЛГОРИТМ: Подбор с учетом РЕЙТИНГА и БЕЗОПАСНОСТИ.
         """
@@ -41,32 +58,25 @@ class TrajectoryService:
             return []
 
         # 1. Получаем данные ребенка, чтобы узнать его болезни
-        student = self.db.query(Student).filter(Student.id == student_id).first()
-        if not student:
+        if self.db.execute(select(Student.id).where(Student.id == student_id)).first() is None:
             return []
             
-        # Превращаем строку из БД ("Астма,Эпилепсия") в множество Python {"Астма", "Эпилепсия"}
-        student_contraindications = set(student.medical_tags.split(",")) if student.medical_tags else set()
-
-        # 2. Запрос всех подходящих упражнений
-        candidates = self.db.query(Exercise)\
-            .filter(Exercise.skill_id.in_(weak_skills_ids))\
-            .order_by(Exercise.effectiveness_score.desc())\
-            .all()
+        # Теги ученика построчно из student_tags: {"Астма", "Эпилепсия"}
+        student_contraindications = set(
+            self.db.execute(select(StudentTag.tag).where(StudentTag.student_id == student_id)).scalars()
+        )
+
+        # 2. Все подходящие упражнения: карточки из общего кэша уже отсортированы по рейтингу
+        weak_skills = set(weak_skills_ids)
+        candidates = [card for card in ExerciseService(self.db).get_all_exercises() if card.skill_id in weak_skills]
         
         safe_recommendations = []
         
         # 3. ФИЛЬТРАЦИЯ (Safety Filter)
         for ex in candidates:
-            # Получаем противопоказания упражнения
-            ex_contraindications = set(ex.contraindications.split(",")) if ex.contraindications else set()
-            
             # Проверяем пересечение множеств (есть ли общие элементы)
             # Если пересечение НЕ пустое -> значит есть конфликт -> упражнение ОПАСНО
-            intersection = student_contraindications.intersection(ex_contraindications)
-            
-            # Удаляем пустые строки из пересечения (бывают из-за split)
-            intersection.discard("") 
+            intersection = student_contraindications.intersection(ex.contraindications)
 
             if intersection:
                 # Упражнение опасно! Пропускаем его.
@@ -77,51 +87,158 @@ class TrajectoryService:
 
         return safe_recommendations
 
+    def get_active_plan_version(self, student_id: int) -> Optional[Tuple[int, int]]:
+        """(id, версия) текущего активного плана ученика — основа для последующего сохранения."""
+        plan = self.db.query(EducationalPlan.id, EducationalPlan.version).filter(
+            EducationalPlan.student_id == student_id,
+            EducationalPlan.status == PlanStatus.ACTIVE
+        ).order_by(EducationalPlan.created_at.desc()).first()
+        return (plan.id, plan.version) if plan else None
+
     def create_educational_plan(self, student_id: int, creator_id: int, 
                               goal: str, start_date: date, end_date: date, 
-                              exercises: List[Exercise]) -> EducationalPlan:
+                              exercises: List[Exercise],
+                              base_plan: Optional[Tuple[int, int]] = None) -> EducationalPlan:
         """
         Сохранение плана с ЖЕСТКОЙ АВТО-АРХИВАЦИЕЙ.
         Гарантирует, что у ученика будет только 1 активный план.
+
+        base_plan — (id, версия) активного плана, который видел специалист
+        (None — активного плана не было). Если с тех пор активный план создал
+        или изменил кто-то другой, выбрасывается VersionConflictError.
         """
         # 1. Находим ВСЕ планы (даже если их случайно стало несколько) и архивируем
         old_plans = self.db.query(EducationalPlan).filter(
             EducationalPlan.student_id == student_id,
             EducationalPlan.status == PlanStatus.ACTIVE
         ).all()
-        
-        for plan in old_plans:
-            plan.status = PlanStatus.ARCHIVED
-        
-        # Применяем изменения (архивацию)
-        self.db.commit()
-
-        # 2. Создаем новый план
-        new_plan = EducationalPlan(
-            student_id=student_id,
-            creator_id=creator_id,
-            status=PlanStatus.ACTIVE, # Только этот будет активным
-            goal_description=goal,
-            start_date=start_date,
-            end_date=end_date
-        )
-        self.db.add(new_plan)
-        self.db.commit()
-        self.db.refresh(new_plan)
-
-        # 3. Привязываем упражнения
-        plan_items = []
-        for index, ex in enumerate(exercises):
-            item = PlanItem(
-                plan_id=new_plan.id,
-                exercise_id=ex.id,
-                frequency="2 раза в неделю",
-                target_score=5,
-                order_index=index + 1
+
+        current = {(plan.id, plan.version) for plan in old_plans}
+        if current != ({base_plan} if base_plan else set()):
+            raise VersionConflictError("План ученика изменен другим специалистом после открытия конструктора.")
+
+        with versioned_commit(self.db, "План"):
+            # UPDATE ... WHERE version = <прочитанная>: архивация не пройдет,
+            # если план изменили между чтением и сохранением
+            for plan in old_plans:
+                plan.status = PlanStatus.ARCHIVED
+                plan.archived_at = datetime.now()
+
+            # 2. Создаем новый план
+            new_plan = EducationalPlan(
+                student_id=student_id,
+                creator_id=creator_id,
+                status=PlanStatus.ACTIVE, # Только этот будет активным
+                goal_description=goal,
+                start_date=start_date,
+                end_date=end_date
             )
-            plan_items.append(item)
+            self.db.add(new_plan)
+            self.db.flush()
+
+            # 3. Привязываем упражнения
+            plan_items = []
+            for index, ex in enumerate(exercises):
+                item = PlanItem(
+                    plan_id=new_plan.id,
+                    exercise_id=ex.id,
+                    frequency="2 раза в неделю",
+                    target_score=5,
+                    order_index=index + 1
+                )
+                plan_items.append(item)
 
-        self.db.add_all(plan_items)
-        self.db.commit()
+            self.db.add_all(plan_items)
         
-        return new_plan
\ No newline at end of file
+        return new_plan
+
+    def update_plan_items(self, base_plan: Tuple[int, int], exercise_ids: List[int],
+                          goal: str, start_date: date, end_date: date,
+                          drop_history: bool = False) -> Dict[str, int]:
+        """
+        Редактирование активного плана на месте: выбранный список упражнений сравнивается
+        с текущими пунктами, и одной транзакцией добавляются новые, удаляются убранные
+        и перенумеровываются переставленные. Остальные пункты (и их журнал) не меняются.
+
+        base_plan — (id, версия) плана, который видел специалист; если план с тех пор
+        изменили, выбрасывается VersionConflictError.
+        Если у убираемых пунктов есть записи дневника, выбрасывается PlanHistoryError,
+        пока не передан drop_history=True (записи удаляются вместе с пунктами).
+        Возвращает {added, removed, moved, version}.
+        """
+        plan_id, version = base_plan
+        items = self.db.execute(
+            select(PlanItem.id, PlanItem.exercise_id, PlanItem.order_index)
+            .where(PlanItem.plan_id == plan_id)
+            .order_by(PlanItem.order_index, PlanItem.id)
+        ).all()
+
+        # 1. Разница: упражнение -> существующий пункт (повторы упражнения считаем лишними)
+        kept = {}
+        for item in items:
+            kept.setdefault(item.exercise_id, item)
+        wanted = list(dict.fromkeys(exercise_ids))
+        removed = [item.id for item in items if item.exercise_id not in wanted or kept[item.exercise_id] is not item]
+        added = [ex_id for ex_id in wanted if ex_id not in kept]
+        moved = [
+            (kept[ex_id].id, index + 1) for index, ex_id in enumerate(wanted)
+            if ex_id in kept and kept[ex_id].order_index != index + 1
+        ]
+
+        try:
+            # 2. План: compare-and-swap по версии; версия растет при любом изменении состава
+            updated = self.db.execute(
+                update(EducationalPlan.__table__)
+                .where(EducationalPlan.id == plan_id,
+                       EducationalPlan.version == version,
+                       EducationalPlan.status == PlanStatus.ACTIVE)
+                .values(version=version + 1, goal_description=goal, start_date=start_date, end_date=end_date)
+            ).rowcount
+            if updated != 1:
+                raise VersionConflictError("План ученика изменен другим специалистом после открытия конструктора.")
+            record_changes(self.db, EducationalPlan.__tablename__, [plan_id], UPDATE)
+
+            # 3. История убираемых пунктов удаляется только с подтверждением. Считаем после
+            # compare-and-swap: транзакция уже держит блокировку записи, и запись дневника,
+            # сохраненная после открытия конструктора, не удалится без подтверждения
+            if removed and not drop_history:
+                log_counts = dict(self.db.execute(
+                    select(PlanItem.exercise_id, func.count(ProgressLog.id))
+                    .join(ProgressLog, ProgressLog.plan_item_id == PlanItem.id)
+                    .where(PlanItem.id.in_(removed))
+                    .group_by(PlanItem.exercise_id)
+                ).all())
+                if log_counts:
+                    raise PlanHistoryError(
+                        f"По убираемым упражнениям есть записи дневника: {sum(log_counts.values())}.", log_counts
+                    )
+
+            # 4. Только изменившиеся пункты
+            if removed:
+                # Проверка внешних ключей в сессии выключена — журнал удаляем явно
+                self.db.execute(delete(ProgressLog.__table__).where(ProgressLog.plan_item_id.in_(removed)))
+                self.db.execute(delete(PlanItem.__table__).where(PlanItem.id.in_(removed)))
+                record_changes(self.db, PlanItem.__tablename__, removed, DELETE)
+            if moved:
+                for item_id, order_index in moved:
+                    self.db.execute(
+                        update(PlanItem.__table__).where(PlanItem.id == item_id)
+                        .values(order_index=order_index, version=PlanItem.version + 1)
+                    )
+                record_changes(self.db, PlanItem.__tablename__, [item_id for item_id, _ in moved], UPDATE)
+            if added:
+                new_ids = self.db.execute(
+                    insert(PlanItem.__table__).returning(PlanItem.id),
+                    [{"plan_id": plan_id, "exercise_id": ex_id, "frequency": "2 раза в неделю",
+                      "target_score": 5, "order_index": wanted.index(ex_id) + 1, "version": 1}
+                     for ex_id in added]
+                ).scalars().all()
+                record_changes(self.db, PlanItem.__tablename__, new_ids, INSERT)
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+
+        # ORM-объекты плана в сессии (если загружались) больше не актуальны
+        self.db.expire_all()
+        return {"added": len(added), "removed": len(removed), "moved": len(moved), "version": version + 1}
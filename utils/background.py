@@ -0,0 +1,97 @@
+import logging
+import random
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_workers_lock = threading.Lock()
+_workers: Dict[str, "BackgroundWorker"] = {}
+
+
+class BackgroundWorker(threading.Thread):
+    """
+    Фоновая задача процесса: вызывает task() каждые `interval` секунд
+    или сразу после wake(). Если задача падает с ошибкой, следующий запуск
+    откладывается с экспоненциальной задержкой (до max_backoff) и случайным разбросом.
+    """
+
+    def __init__(self, name: str, task: Callable[[], None], interval: float,
+                 min_backoff: float = 0.5, max_backoff: float = 30.0):
+        super().__init__(name=name, daemon=True)
+        self.task = task
+        self.interval = interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._task_lock = threading.Lock()  # занят, пока выполняется task() (см. workers_paused)
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+
+    def wake(self):
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def _next_delay(self) -> float:
+        if not self.failures:
+            return self.interval
+        backoff = min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+        return backoff * random.uniform(0.8, 1.2)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            try:
+                with self._task_lock:
+                    self.task()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning("%s: ошибка (попытка %s): %s", self.name, self.failures, e)
+            else:
+                self.failures = 0
+                self.last_error = None
+
+            # Во время backoff пробуждение не ускоряет повтор
+            if self.failures:
+                self._stop_event.wait(self._next_delay())
+            else:
+                self._wake_event.wait(self._next_delay())
+
+
+def start_worker(name: str, task: Callable[[], None], interval: float, **kwargs) -> BackgroundWorker:
+    """Запускает фоновую задачу один раз на процесс; повторный вызов вернет уже запущенную."""
+    with _workers_lock:
+        worker = _workers.get(name)
+        if worker is None or not worker.is_alive():
+            worker = BackgroundWorker(name, task, interval, **kwargs)
+            worker.start()
+            _workers[name] = worker
+        return worker
+
+
+def get_workers() -> Dict[str, BackgroundWorker]:
+    with _workers_lock:
+        return dict(_workers)
+
+
+@contextmanager
+def workers_paused():
+    """
+    Дождаться окончания текущих запусков фоновых задач и не начинать новые
+    до выхода из блока (например, пока данные заменяются снимком).
+    """
+    paused = []
+    try:
+        for _, worker in sorted(get_workers().items()):
+            worker._task_lock.acquire()
+            paused.append(worker)
+        yield
+    finally:
+        for worker in reversed(paused):
+            worker._task_lock.release()
@@ -0,0 +1,418 @@
+"""
+Резервное копирование базы (app.db и холодного архива archive.db) без остановки приложения.
+
+Запуск из корня проекта:
+    python -m utils.backup create              # новая копия (с проверкой целостности)
+    python -m utils.backup list                # список копий
+    python -m utils.backup verify [имя]        # повторная проверка копии (по умолчанию последней)
+    python -m utils.backup restore имя         # восстановление (приложение должно быть остановлено)
+    python -m utils.backup bench --seconds 5   # задержки записи во время копирования
+
+Копия снимается через online backup API SQLite: страницы файла переносятся
+небольшими шагами, и блокировка чтения держится только на время шага, поэтому
+учителя, сохраняющие журнал, ждут не дольше одного шага. Если во время копирования
+база изменилась, SQLite начинает копирование заново — тогда шаг увеличивается,
+и копия гарантированно завершается (в худшем случае одним шагом).
+
+Каждая копия — каталог backups/<время>/ с файлами БД и manifest.json. Копия
+считается готовой только после PRAGMA integrity_check; незавершенные копии
+лежат во временном каталоге и в список не попадают. Старые копии удаляются
+по Config.BACKUP_KEEP и Config.BACKUP_RETENTION_DAYS (последняя не удаляется никогда).
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config.settings import Config
+from database.connection import ARCHIVE_DB_PATH, engine
+
+MAIN_DB_PATH = os.path.abspath(engine.url.database)
+MANIFEST = "manifest.json"
+# Сколько раз увеличивать шаг после перезапусков, прежде чем копировать одним шагом
+MAX_RESTARTS = 4
+
+# Список копий читается с диска (манифест каждой копии) только после изменений:
+# каталог копий -> (время изменения каталога, список). Панель администратора
+# показывает последнюю копию при каждом перезапуске страницы.
+_listing_lock = threading.Lock()
+_listing: Dict[str, tuple] = {}
+
+
+class BackupError(RuntimeError):
+    """Копия не снята или не прошла проверку целостности."""
+
+
+class _Restarted(Exception):
+    """База изменилась во время копирования, SQLite начал копирование заново."""
+
+
+def _database_files() -> Dict[str, str]:
+    # Порядок важен: основная база копируется первой. Перенос в архив сначала пишет
+    # в archive.db и только потом удаляет из app.db, поэтому копия, снятая между
+    # файлами, может содержать запись в обоих местах, но не потеряет ее.
+    files = {"app.db": MAIN_DB_PATH}
+    if os.path.exists(ARCHIVE_DB_PATH):
+        files["archive.db"] = ARCHIVE_DB_PATH
+    return files
+
+
+def copy_database(source_path: str, target_path: str, pages: int = None, sleep: float = None) -> Dict:
+    """
+    Копирование одного файла БД через online backup API шагами по `pages` страниц
+    с паузой `sleep` секунд между шагами. Возвращает {seconds, pages, restarts}.
+    """
+    pages = Config.BACKUP_PAGES_PER_STEP if pages is None else pages
+    sleep = Config.BACKUP_STEP_SLEEP if sleep is None else sleep
+    started = time.perf_counter()
+    restarts = 0
+
+    source = sqlite3.connect(source_path, timeout=15)
+    try:
+        while True:
+            target = sqlite3.connect(target_path)
+            last = {"remaining": None, "total": 0}
+
+            def progress(status, remaining, total):
+                # Оставшихся страниц стало больше — копирование началось сначала
+                if last["remaining"] is not None and remaining > last["remaining"]:
+                    raise _Restarted()
+                last["remaining"], last["total"] = remaining, total
+                # Между шагами блокировка снята — даем писателям пройти
+                if remaining and sleep:
+                    time.sleep(sleep)
+
+            try:
+                source.backup(target, pages=pages, progress=progress)
+                break
+            except _Restarted:
+                restarts += 1
+                pages = -1 if restarts >= MAX_RESTARTS or pages <= 0 else pages * 4
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+    return {"seconds": time.perf_counter() - started, "pages": last["total"], "restarts": restarts}
+
+
+def check_integrity(path: str) -> str:
+    """PRAGMA integrity_check файла (только чтение): "ok" или текст первых ошибок."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check(10)")]
+    finally:
+        conn.close()
+    return "ok" if rows == ["ok"] else "; ".join(rows)
+
+
+def _schema_version(path: str) -> int:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def create_backup(backup_dir: str = None, pages: int = None, now: Optional[datetime] = None) -> Dict:
+    """
+    Новая копия всех файлов БД с проверкой целостности и ротацией старых копий.
+    Возвращает манифест копии.
+    """
+    backup_dir = backup_dir or Config.BACKUP_DIR
+    now = now or datetime.now()
+    name = now.strftime("%Y%m%d-%H%M%S")
+    os.makedirs(backup_dir, exist_ok=True)
+
+    # 1. Копируем во временный каталог рядом с копиями (переименование будет атомарным)
+    partial = tempfile.mkdtemp(prefix=".partial-", dir=backup_dir)
+    try:
+        manifest = {"name": name, "created_at": now.isoformat(timespec="seconds"), "files": {}}
+        for file_name, source_path in _database_files().items():
+            target_path = os.path.join(partial, file_name)
+            stats = copy_database(source_path, target_path, pages)
+
+            # 2. Проверяем копию, а не исходный файл
+            integrity = check_integrity(target_path)
+            if integrity != "ok":
+                raise BackupError(f"{file_name}: копия не прошла проверку целостности: {integrity}")
+            manifest["files"][file_name] = dict(
+                stats, size=os.path.getsize(target_path), schema_version=_schema_version(target_path)
+            )
+
+        with open(os.path.join(partial, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # 3. Публикуем копию
+        final = os.path.join(backup_dir, name)
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.rename(partial, final)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    finally:
+        _forget_listing(backup_dir)
+
+    manifest["removed"] = rotate_backups(backup_dir, now=now)
+    return manifest
+
+
+def _forget_listing(backup_dir: str):
+    with _listing_lock:
+        _listing.pop(os.path.abspath(backup_dir), None)
+
+
+def list_backups(backup_dir: str = None) -> List[Dict]:
+    """
+    Готовые копии (с манифестом), новые первыми. Повторный вызов берет список из памяти,
+    пока не изменился каталог копий (копию создали или удалили, в том числе другим процессом).
+    """
+    backup_dir = os.path.abspath(backup_dir or Config.BACKUP_DIR)
+    try:
+        mtime = os.stat(backup_dir).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    with _listing_lock:
+        cached = _listing.get(backup_dir)
+        if cached is not None and cached[0] == mtime:
+            return list(cached[1])
+
+    backups = []
+    for name in os.listdir(backup_dir):
+        manifest_path = os.path.join(backup_dir, name, MANIFEST)
+        if name.startswith(".") or not os.path.exists(manifest_path):
+            continue
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["path"] = os.path.join(backup_dir, name)
+        backups.append(manifest)
+    backups.sort(key=lambda b: b["created_at"], reverse=True)
+    with _listing_lock:
+        _listing[backup_dir] = (mtime, backups)
+    return list(backups)
+
+
+def rotate_backups(backup_dir: str = None, keep: int = None, retention_days: int = None,
+                   now: Optional[datetime] = None) -> List[str]:
+    """
+    Удаление старых копий: остаются не больше `keep` последних и не старше
+    `retention_days` дней. Самая свежая копия остается всегда. Возвращает имена удаленных.
+    """
+    keep = Config.BACKUP_KEEP if keep is None else keep
+    retention_days = Config.BACKUP_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+
+    removed = []
+    for index, backup in enumerate(list_backups(backup_dir)):
+        if index == 0:
+            continue
+        if index >= keep or datetime.fromisoformat(backup["created_at"]) < cutoff:
+            shutil.rmtree(backup["path"])
+            removed.append(backup["name"])
+    if removed:
+        _forget_listing(backup_dir or Config.BACKUP_DIR)
+    return removed
+
+
+def _find_backup(name: Optional[str], backup_dir: str = None) -> Dict:
+    backups = list_backups(backup_dir)
+    if not backups:
+        raise BackupError("Резервных копий нет")
+    if name is None:
+        return backups[0]
+    for backup in backups:
+        if backup["name"] == name:
+            return backup
+    raise BackupError(f"Копия {name} не найдена")
+
+
+def verify_backup(name: str = None, backup_dir: str = None) -> Dict[str, str]:
+    """
+    Проверка, что копию можно восстановить: файлы на месте, размер совпадает
+    с манифестом и integrity_check проходит. Возвращает {файл: "ok" | ошибка}.
+    """
+    backup = _find_backup(name, backup_dir)
+    result = {}
+    for file_name, info in backup["files"].items():
+        path = os.path.join(backup["path"], file_name)
+        if not os.path.exists(path):
+            result[file_name] = "файл отсутствует"
+        elif os.path.getsize(path) != info["size"]:
+            result[file_name] = "размер не совпадает с манифестом"
+        else:
+            result[file_name] = check_integrity(path)
+    return result
+
+
+def restore_backup(name: str, backup_dir: str = None) -> Dict:
+    """
+    Восстановление копии поверх рабочих файлов (тем же backup API, в обратную сторону).
+    Копия предварительно проверяется. Приложение и API должны быть остановлены:
+    очередь журнала и открытые страницы иначе продолжат писать в восстановленную базу.
+    """
+    backup = _find_backup(name, backup_dir)
+    problems = {f: r for f, r in verify_backup(backup["name"], backup_dir).items() if r != "ok"}
+    if problems:
+        raise BackupError(f"Копия {backup['name']} повреждена: {problems}")
+
+    targets = {"app.db": MAIN_DB_PATH, "archive.db": ARCHIVE_DB_PATH}
+    for file_name in backup["files"]:
+        copy_database(os.path.join(backup["path"], file_name), targets[file_name], pages=-1, sleep=0)
+    return backup
+
+
+def run_backup_job() -> Optional[Dict]:
+    """
+    Задача фонового процесса: новая копия, если последней больше Config.BACKUP_INTERVAL секунд.
+    Проверка выполняется часто, поэтому перезапуск приложения не сдвигает расписание.
+    """
+    backups = list_backups()
+    if backups:
+        age = datetime.now() - datetime.fromisoformat(backups[0]["created_at"])
+        if age.total_seconds() < Config.BACKUP_INTERVAL:
+            return None
+    return create_backup()
+
+
+# --- Замер задержек записи во время копирования ---
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def _writer(path: str, stop: threading.Event, latencies: list):
+    # Как сохранение журнала учителем: маленькая транзакция каждые несколько миллисекунд
+    conn = sqlite3.connect(path, timeout=15)
+    try:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            conn.execute("INSERT INTO _bench_writes (created) VALUES (?)", (time.time(),))
+            conn.commit()
+            latencies.append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.002)
+    finally:
+        conn.close()
+
+
+def benchmark(seconds: float = 5, pad_mb: int = 50, steps: List[int] = None) -> List[Dict]:
+    """
+    Задержки записи (мс) без копирования, при копировании одним шагом и шагами по N страниц.
+    Работает на временной копии app.db, дополненной до ~pad_mb МБ; рабочая база не меняется.
+    """
+    steps = steps or [Config.BACKUP_PAGES_PER_STEP]
+    workdir = tempfile.mkdtemp(prefix="backup-bench-")
+    try:
+        db_path = os.path.join(workdir, "app.db")
+        copy_database(MAIN_DB_PATH, db_path, pages=-1, sleep=0)
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE _bench_pad (data BLOB)")
+        conn.execute(
+            "INSERT INTO _bench_pad SELECT randomblob(4000) FROM "
+            "(WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < ?) SELECT x FROM c)",
+            (pad_mb * 256,)
+        )
+        conn.execute("CREATE TABLE _bench_writes (id INTEGER PRIMARY KEY, created REAL)")
+        conn.commit()
+        conn.close()
+
+        scenarios = [("без копирования", None), ("одним шагом", -1)] + [(f"шагами по {p} стр.", p) for p in steps]
+        results = []
+        for label, pages in scenarios:
+            latencies, runs = [], []
+            stop = threading.Event()
+            writer = threading.Thread(target=_writer, args=(db_path, stop, latencies))
+            writer.start()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                if pages is None:
+                    time.sleep(0.05)
+                else:
+                    runs.append(copy_database(db_path, os.path.join(workdir, "copy.db"), pages=pages))
+            stop.set()
+            writer.join()
+
+            latencies.sort()
+            results.append({
+                "scenario": label,
+                "writes": len(latencies),
+                "p50_ms": _percentile(latencies, 50),
+                "p95_ms": _percentile(latencies, 95),
+                "p99_ms": _percentile(latencies, 99),
+                "max_ms": latencies[-1] if latencies else 0.0,
+                "backups": len(runs),
+                "backup_s": sum(r["seconds"] for r in runs) / len(runs) if runs else 0.0,
+                "restarts": sum(r["restarts"] for r in runs),
+            })
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервные копии базы данных")
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="снять новую копию")
+    create.add_argument("--pages", type=int, help="страниц за шаг (-1 — одним шагом)")
+    sub.add_parser("list", help="список копий")
+    verify = sub.add_parser("verify", help="проверить копию")
+    verify.add_argument("name", nargs="?", help="имя копии (по умолчанию последняя)")
+    restore = sub.add_parser("restore", help="восстановить копию (приложение должно быть остановлено)")
+    restore.add_argument("name", help="имя копии")
+    bench = sub.add_parser("bench", help="задержки записи во время копирования")
+    bench.add_argument("--seconds", type=float, default=5, help="длительность каждого сценария, сек")
+    bench.add_argument("--pad-mb", type=int, default=50, help="размер тестовой базы, МБ")
+    bench.add_argument("--pages", type=int, nargs="+", help="размеры шага для сравнения")
+    bench.add_argument("--output", help="дописать результат (JSON-строка) в файл")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "create":
+            manifest = create_backup(pages=args.pages)
+            for file_name, info in manifest["files"].items():
+                print(f"{file_name}: {info['size'] / 1e6:.1f} МБ за {info['seconds']:.2f} с, "
+                      f"перезапусков {info['restarts']}, целостность ok")
+            print(f"Копия {manifest['name']} готова" +
+                  (f", удалены старые: {', '.join(manifest['removed'])}" if manifest["removed"] else ""))
+
+        elif args.command == "list":
+            for backup in list_backups():
+                size = sum(info["size"] for info in backup["files"].values())
+                print(f"{backup['name']}  {size / 1e6:8.1f} МБ  {', '.join(backup['files'])}")
+
+        elif args.command == "verify":
+            result = verify_backup(args.name)
+            for file_name, status in result.items():
+                print(f"{file_name}: {status}")
+            sys.exit(0 if all(status == "ok" for status in result.values()) else 1)
+
+        elif args.command == "restore":
+            backup = restore_backup(args.name)
+            print(f"Восстановлена копия {backup['name']} от {backup['created_at']}")
+
+        elif args.command == "bench":
+            results = benchmark(args.seconds, args.pad_mb, args.pages)
+            print(f"{'сценарий':<22} {'записей':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  копий  перезапусков")
+            for r in results:
+                print(f"{r['scenario']:<22} {r['writes']:>8} {r['p50_ms']:>6.1f}мс {r['p95_ms']:>6.1f}мс "
+                      f"{r['p99_ms']:>6.1f}мс {r['max_ms']:>6.1f}мс  {r['backups']:>5}  {r['restarts']:>5}")
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"timestamp": datetime.now().isoformat(timespec="seconds"),
+                                        "results": results}, ensure_ascii=False) + "\n")
+    except BackupError as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
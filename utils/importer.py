@@ -0,0 +1,388 @@
+"""
+Пакетный импорт учеников, методик и истории журнала из CSV / JSON Lines.
+
+Запуск из корня проекта:
+    python -m utils.importer students students.csv
+    python -m utils.importer exercises exercises.jsonl --chunk 5000
+    python -m utils.importer logs journal.csv
+    python -m utils.importer logs journal.csv --restart   # начать заново, игнорируя прогресс
+
+Файл читается потоком и обрабатывается порциями: каждая порция проверяется
+целиком (включая ссылки на навыки и пункты планов одним запросом) и
+вставляется одной транзакцией вместе с отметкой прогресса в import_checkpoints.
+После сбоя повторный запуск с тем же файлом продолжает с первой
+незафиксированной порции. Строки с ошибками пропускаются и записываются
+в <файл>.rejected.jsonl с указанием причины.
+
+Колонки (CSV — заголовок, JSONL — ключи объекта):
+  students:  full_name, birth_date, diagnosis_code, parent_contact, medical_tags,
+             enrollment_date, active
+  exercises: title, description, skill (id или название навыка), difficulty_level,
+             materials, duration_minutes, effectiveness_score, contraindications
+  logs:      plan_item_id, date, status, score, notes
+Списки тегов в CSV разделяются ";" (в JSONL — массив или строка через ";").
+Даты — ГГГГ-ММ-ДД или ДД.ММ.ГГГГ.
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+
+from config.constants import DIAGNOSIS_MAPPING, MEDICAL_TAGS
+from database.connection import engine as default_engine
+from database.models import Exercise, ImportCheckpoint, LogStatus, PlanItem, ProgressLog, SkillCategory, Student
+from database.schema import bootstrap_schema
+from services.change_journal import INSERT, record_changes
+from services.student_service import replace_student_tags
+
+DEFAULT_CHUNK = 5000
+
+# Русские подписи статусов, как на странице журнала
+STATUS_ALIASES = {"выполнено": "completed", "не справился": "failed", "пропущено": "skipped"}
+
+
+# --- Чтение файла ---
+
+def read_records(path: str) -> Iterator[Tuple[int, dict]]:
+    """Записи файла по одной: (номер строки, словарь). Формат — по расширению."""
+    if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    record = {"__error__": f"некорректный JSON: {e.msg}"}
+                yield line_no, record if isinstance(record, dict) else {"__error__": "ожидается объект"}
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+
+
+def _fingerprint(kind: str, path: str) -> str:
+    """Отпечаток файла: размер + хэш начала и конца (без чтения всего файла)."""
+    size = os.path.getsize(path)
+    h = hashlib.sha256(f"{kind}:{size}".encode())
+    with open(path, "rb") as f:
+        h.update(f.read(1 << 16))
+        if size > 1 << 16:
+            f.seek(max(size - (1 << 16), 1 << 16))
+            h.update(f.read())
+    return f"{kind}:{h.hexdigest()[:32]}"
+
+
+# --- Разбор полей ---
+
+def _text(record: dict, field: str, required: bool = False):
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ""
+    if required and not value:
+        raise ValueError(f"{field}: обязательное поле")
+    return value or None
+
+
+def _date(record: dict, field: str, required: bool = True):
+    value = _text(record, field, required)
+    if value is None:
+        return None
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"{field}: некорректная дата '{value}'")
+
+
+def _number(record: dict, field: str, cast, low, high, default=None):
+    value = _text(record, field)
+    if value is None:
+        if default is None:
+            raise ValueError(f"{field}: обязательное поле")
+        return default
+    try:
+        number = cast(value.replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{field}: ожидается число, получено '{value}'")
+    if not low <= number <= high:
+        raise ValueError(f"{field}: допустимо от {low} до {high}")
+    return number
+
+
+def _tags(record: dict, field: str):
+    value = record.get(field)
+    if value is None or value == "":
+        return None
+    tags = value if isinstance(value, list) else str(value).split(";")
+    tags = [str(t).strip() for t in tags if str(t).strip()]
+    unknown = [t for t in tags if t not in MEDICAL_TAGS]
+    if unknown:
+        raise ValueError(f"{field}: неизвестные теги {unknown}")
+    return tags
+
+
+# --- Виды импорта ---
+# parse(record, context) -> строка для вставки (или ValueError)
+# check(conn, rows) -> {индекс: причина} — проверки, требующие БД, одним запросом на порцию
+
+def _parse_student(record: dict, context: dict) -> dict:
+    diagnosis = _text(record, "diagnosis_code")
+    tags = _tags(record, "medical_tags")
+    if tags is None:
+        # Как в форме ученика: противопоказания по умолчанию берутся из диагноза
+        tags = DIAGNOSIS_MAPPING.get(diagnosis, [])
+    active = _text(record, "active")
+    return {
+        "full_name": _text(record, "full_name", required=True),
+        "birth_date": _date(record, "birth_date"),
+        "diagnosis_code": diagnosis,
+        "parent_contact": _text(record, "parent_contact"),
+        "enrollment_date": _date(record, "enrollment_date", required=False) or context["today"],
+        "active": active is None or active.lower() not in ("0", "false", "нет"),
+        "medical_tags": ",".join(tags),
+    }
+
+
+def _load_skills(conn: Connection) -> dict:
+    rows = conn.execute(select(SkillCategory.id, SkillCategory.name).where(SkillCategory.parent_id.isnot(None))).all()
+    return {
+        "skill_ids": {r.id for r in rows},
+        "skill_names": {r.name.strip().lower(): r.id for r in rows},
+    }
+
+
+def _parse_exercise(record: dict, context: dict) -> dict:
+    skill = _text(record, "skill", required=True)
+    skill_id = int(skill) if skill.isdigit() else context["skill_names"].get(skill.lower())
+    if skill_id not in context["skill_ids"]:
+        raise ValueError(f"skill: навык '{skill}' не найден")
+    return {
+        "title": _text(record, "title", required=True),
+        "description": _text(record, "description"),
+        "skill_id": skill_id,
+        "difficulty_level": _number(record, "difficulty_level", int, 1, 5, default=1),
+        "materials": _text(record, "materials"),
+        "duration_minutes": _number(record, "duration_minutes", int, 1, 240, default=15),
+        "effectiveness_score": _number(record, "effectiveness_score", float, 0, 10, default=5.0),
+        "contraindications": ",".join(_tags(record, "contraindications") or []),
+    }
+
+
+def _parse_log(record: dict, context: dict) -> dict:
+    status = (_text(record, "status") or "completed").lower()
+    status = STATUS_ALIASES.get(status, status)
+    try:
+        status = LogStatus(status)
+    except ValueError:
+        raise ValueError(f"status: одно из {[s.value for s in LogStatus]}")
+    score = _text(record, "score")
+    return {
+        "plan_item_id": _number(record, "plan_item_id", int, 1, sys.maxsize),
+        "date": _date(record, "date"),
+        "status": status,
+        "performance_score": None if score is None else _number(record, "score", int, 1, 5),
+        "teacher_notes": _text(record, "notes"),
+    }
+
+
+def _check_logs(conn: Connection, rows: List[dict]) -> Dict[int, str]:
+    ids = {row["plan_item_id"] for row in rows}
+    known = set(conn.execute(select(PlanItem.id).where(PlanItem.id.in_(ids))).scalars())
+    return {i: f"plan_item_id: пункт плана {row['plan_item_id']} не найден"
+            for i, row in enumerate(rows) if row["plan_item_id"] not in known}
+
+
+def _insert_logs(conn: Connection, rows: List[dict]):
+    # Повторный импорт того же дня обновляет запись, а не дублирует ее
+    stmt = sqlite_insert(ProgressLog.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["plan_item_id", "date"],
+        set_={
+            "status": stmt.excluded.status,
+            "performance_score": stmt.excluded.performance_score,
+            "teacher_notes": stmt.excluded.teacher_notes,
+            "version": ProgressLog.__table__.c.version + 1,
+        },
+    )
+    conn.execute(stmt, rows)
+
+
+def _insert_students(conn: Connection, rows: List[dict]):
+    ids = conn.execute(
+        insert(Student.__table__).returning(Student.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    # Теги построчно для запросов по тегу (student_tags)
+    replace_student_tags(conn, {student_id: row["medical_tags"].split(",") for student_id, row in zip(ids, rows)})
+
+
+def _plain_insert(table):
+    return lambda conn, rows: conn.execute(insert(table), rows)
+
+
+KINDS = {
+    "students": {"table": Student.__table__, "parse": _parse_student, "insert": _insert_students},
+    "exercises": {"table": Exercise.__table__, "parse": _parse_exercise,
+                  "insert": _plain_insert(Exercise.__table__), "context": _load_skills},
+    "logs": {"table": ProgressLog.__table__, "parse": _parse_log, "insert": _insert_logs, "check": _check_logs},
+}
+
+
+# --- Импорт ---
+
+def _chunks(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _append_rejected(path: str, rejected: List[dict]):
+    with open(path, "a", encoding="utf-8") as f:
+        for item in sorted(rejected, key=lambda r: r["line"]):
+            f.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _truncate_rejected(path: str, keep: int):
+    """Оставить в файле отклоненных первые keep строк (остальные — от незафиксированной порции)."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as f:
+        for _ in range(keep):
+            if not f.readline():
+                return
+        f.truncate(f.tell())
+
+
+def import_file(kind: str, path: str, chunk_size: int = DEFAULT_CHUNK, restart: bool = False,
+                engine: Engine = default_engine, progress: Callable[[dict], None] = None) -> dict:
+    """
+    Импорт файла. Возвращает итог: {rows_done, rows_inserted, rows_rejected, resumed_from, seconds}.
+    progress(итог) вызывается после каждой порции.
+    """
+    spec = KINDS[kind]
+    bootstrap_schema(engine)
+    source = _fingerprint(kind, path)
+    rejected_path = path + ".rejected.jsonl"
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        checkpoint = conn.execute(select(ImportCheckpoint).where(ImportCheckpoint.source == source)).first()
+        if checkpoint is not None and restart:
+            conn.execute(ImportCheckpoint.__table__.delete().where(ImportCheckpoint.source == source))
+            checkpoint = None
+        if checkpoint is None:
+            conn.execute(insert(ImportCheckpoint), {"source": source, "kind": kind, "path": os.path.abspath(path)})
+            if os.path.exists(rejected_path):
+                os.remove(rejected_path)
+        elif not checkpoint.finished:
+            _truncate_rejected(rejected_path, checkpoint.rows_rejected)
+        context = {"today": date.today()}
+        if "context" in spec:
+            context.update(spec["context"](conn))
+
+    state = {
+        "rows_done": checkpoint.rows_done if checkpoint else 0,
+        "rows_inserted": checkpoint.rows_inserted if checkpoint else 0,
+        "rows_rejected": checkpoint.rows_rejected if checkpoint else 0,
+        "resumed_from": checkpoint.rows_done if checkpoint else 0,
+        "finished": bool(checkpoint and checkpoint.finished),
+    }
+    if state["finished"]:
+        state["seconds"] = 0.0
+        return state
+
+    # Уже зафиксированные записи пропускаем без разбора
+    records = itertools.islice(read_records(path), state["rows_done"], None)
+    for chunk in _chunks(records, chunk_size):
+        rows, row_lines, rejected = [], [], []
+        for line_no, record in chunk:
+            try:
+                if "__error__" in record:
+                    raise ValueError(record["__error__"])
+                rows.append(spec["parse"](record, context))
+                row_lines.append((line_no, record))
+            except ValueError as e:
+                rejected.append({"line": line_no, "error": str(e), "record": record})
+
+        with engine.begin() as conn:
+            if rows and "check" in spec:
+                failed = spec["check"](conn, rows)
+                if failed:
+                    rejected += [{"line": row_lines[i][0], "error": msg, "record": row_lines[i][1]}
+                                 for i, msg in failed.items()]
+                    rows = [row for i, row in enumerate(rows) if i not in failed]
+            if rows:
+                spec["insert"](conn, rows)
+                # Одна запись "изменено много строк" на порцию вместо записи на каждую строку
+                record_changes(conn, spec["table"].name, None, INSERT)
+            # Прогресс фиксируется той же транзакцией, что и данные порции
+            state["rows_done"] += len(chunk)
+            state["rows_inserted"] += len(rows)
+            state["rows_rejected"] += len(rejected)
+            conn.execute(
+                update(ImportCheckpoint).where(ImportCheckpoint.source == source).values(
+                    rows_done=state["rows_done"],
+                    rows_inserted=state["rows_inserted"],
+                    rows_rejected=state["rows_rejected"],
+                )
+            )
+            # Отклоненные строки записываются на диск до фиксации порции: после сбоя
+            # продолжение обрежет файл до rows_rejected из отметки прогресса
+            if rejected:
+                _append_rejected(rejected_path, rejected)
+
+        if progress:
+            progress(state)
+
+    with engine.begin() as conn:
+        conn.execute(update(ImportCheckpoint).where(ImportCheckpoint.source == source).values(finished=True))
+    state["finished"] = True
+    state["seconds"] = time.perf_counter() - started
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный импорт данных из CSV / JSON Lines")
+    parser.add_argument("kind", choices=list(KINDS), help="что импортируем")
+    parser.add_argument("path", help="файл .csv или .jsonl")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="записей в одной транзакции")
+    parser.add_argument("--restart", action="store_true", help="начать заново, игнорируя сохраненный прогресс")
+    args = parser.parse_args()
+
+    def progress(state):
+        print(f"\r  обработано {state['rows_done']}, добавлено {state['rows_inserted']}, "
+              f"отклонено {state['rows_rejected']}", end="", flush=True)
+
+    result = import_file(args.kind, args.path, args.chunk, args.restart, progress=progress)
+    print()
+    if result["finished"] and not result.get("seconds"):
+        print(f"Файл уже импортирован ({result['rows_inserted']} записей). Для повтора: --restart")
+    else:
+        if result["resumed_from"]:
+            print(f"Продолжено с записи {result['resumed_from']}")
+        rate = (result["rows_done"] - result["resumed_from"]) / result["seconds"] if result["seconds"] else 0
+        print(f"Готово за {result['seconds']:.1f} с ({rate:.0f} записей/с): "
+              f"добавлено {result['rows_inserted']}, отклонено {result['rows_rejected']}")
+    if result["rows_rejected"]:
+        print(f"Отклоненные строки: {args.path}.rejected.jsonl")
+    sys.exit(1 if result["rows_rejected"] else 0)
+
+
+if __name__ == "__main__":
+    main()
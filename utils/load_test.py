@@ -0,0 +1,475 @@
+"""
+Нагрузочный тест страниц Streamlit: много одновременных пользователей в одном
+процессе (как сессии на сервере Streamlit), каждый — отдельный AppTest,
+который переключает страницы и выбирает учеников в случайном порядке.
+
+Запуск из корня проекта:
+    python -m utils.load_test
+    python -m utils.load_test --users 50 --duration 60 --students 300 --write --output bench_output.txt
+    python -m utils.load_test --snapshot big.iomsnap    # данные из снимка (python -m utils.snapshot generate)
+
+Данные генерируются заново (или восстанавливаются из снимка) во временном каталоге:
+рабочая база проекта, очередь журнала и резервные копии не затрагиваются.
+
+Для каждой страницы выводятся перцентили времени перезапуска (p50/p95/p99)
+и на один перезапуск: время в запросах к БД, ожидание БД и ожидание
+соединения в пуле. Ожидание БД — время в запросах и COMMIT, когда поток
+не занят процессором: блокировки SQLite (busy timeout), диск, а при числе
+пользователей больше числа ядер — и очередь за процессором (GIL).
+Запросы фоновых процессов (перенос журнала и т.п.) собраны в строку "фон".
+
+Код выхода 1 при исключениях на страницах или если p95 превышает --max-p95-ms.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Страницы под нагрузкой: пункт меню -> вес в смеси переходов
+PAGE_MIX = {
+    "🏠 Главная": 20,
+    "👶 Ученики": 15,
+    "🩺 Диагностика": 10,
+    "🚀 Конструктор ИОМ": 10,
+    "📚 Библиотека методик": 10,
+    "📅 Дневник занятий": 25,
+    "🖨️ Отчеты": 10,
+}
+
+# Кнопки записи по страницам (включаются флагом --write)
+WRITE_BUTTONS = {
+    "📅 Дневник занятий": "💾 Сохранить за",
+    "🩺 Диагностика": "💾 Сохранить результаты",
+}
+
+# Сколько выборов ученика после перехода на страницу
+ACTIONS_PER_PAGE = 3
+
+BACKGROUND = "фон"
+
+
+def allow_concurrent_app_tests():
+    """
+    AppTest рассчитан на один тест за раз: каждый запуск подставляет заглушку
+    Runtime._instance и по окончании сбрасывает ее в None, ломая скрипты,
+    которые в это время выполняются в других потоках. Подменяем класс Runtime
+    внутри модуля AppTest: сброс в None игнорируется, остается последняя
+    заглушка (общая для сессий, как и настоящий Runtime сервера).
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test
+
+    class _SharedRuntimeMeta(type):
+        def __setattr__(cls, name, value):
+            if name == "_instance":
+                if value is not None:
+                    Runtime._instance = value
+                return
+            super().__setattr__(name, value)
+
+    class _SharedRuntime(Runtime, metaclass=_SharedRuntimeMeta):
+        pass
+
+    app_test.Runtime = _SharedRuntime
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Перцентиль по ближайшему рангу (values отсортированы)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def prepare_environment(workdir: str):
+    """
+    Временный каталог вместо каталога проекта: база (путь в database/connection.py
+    относительный), холодный архив, очередь журнала, копии и профили.
+    Вызывается до первого импорта модулей приложения.
+    """
+    os.chdir(workdir)
+    sys.path.insert(0, PROJECT_DIR)
+    from config.settings import Config
+    Config.JOURNAL_QUEUE_DIR = os.path.join(workdir, "journal_queue")
+    Config.BACKUP_DIR = os.path.join(workdir, "backups")
+    Config.PROFILE_DIR = os.path.join(workdir, "profiles")
+
+
+def build_dataset(students: int, days: int, seed: int = 1) -> dict:
+    """
+    Демо-данные плюс `students` учеников: первичная и итоговая диагностика,
+    активный план из 4-6 методик и журнал за последние `days` дней.
+    """
+    from sqlalchemy import insert
+    from config.constants import DIAGNOSIS_MAPPING, MEDICAL_TAGS
+    from database.connection import SessionLocal, engine
+    from database.models import LogStatus, PlanItem, ProgressLog
+    from database.schema import bootstrap_schema
+    from services.change_journal import INSERT, record_changes
+    from services.diagnostic_service import DiagnosticService
+    from services.exercise_service import ExerciseService
+    from services.student_service import StudentService
+    from services.trajectory_service import TrajectoryService
+    from utils.seed_data import seed_database
+
+    rnd = random.Random(seed)
+    bootstrap_schema(engine)
+    db = SessionLocal()
+    try:
+        seed_database(db)
+        skills = [s.id for s in DiagnosticService(db).get_assessment_skills()]
+        exercises = ExerciseService(db).get_all_exercises()
+        today = date.today()
+        start = today - timedelta(days=days)
+
+        created = StudentService(db).create_students([
+            {
+                "full_name": f"Ученик {i + 1:04d}",
+                "birth_date": date(2012 + i % 8, 1 + i % 12, 1 + i % 28),
+                "diagnosis_code": rnd.choice(list(DIAGNOSIS_MAPPING)),
+                "parent_contact": f"+7 900 {i:07d}",
+                "medical_tags": rnd.sample(MEDICAL_TAGS, rnd.choice([0, 0, 1, 2])),
+            }
+            for i in range(students)
+        ])
+        DiagnosticService(db).save_diagnostics([
+            {
+                "student_id": student.id, "teacher_id": 1, "type": d_type, "date": d_date,
+                "scores": {skill_id: rnd.randint(1, 5) for skill_id in skills},
+            }
+            for student in created
+            for d_type, d_date in (("primary", start), ("final", today))
+        ])
+
+        trajectory = TrajectoryService(db)
+        for student in created:
+            trajectory.create_educational_plan(
+                student.id, 1, "Развитие навыков", start, today + timedelta(days=90),
+                rnd.sample(exercises, rnd.randint(4, 6))
+            )
+        db.commit()
+
+        item_ids = [item_id for (item_id,) in db.query(PlanItem.id)]
+        statuses = [LogStatus.COMPLETED] * 8 + [LogStatus.FAILED, LogStatus.SKIPPED]
+        logs = [
+            {
+                "plan_item_id": item_id, "date": start + timedelta(days=d),
+                "status": rnd.choice(statuses), "performance_score": rnd.randint(1, 5), "teacher_notes": "",
+            }
+            for item_id in item_ids
+            for d in range(days)
+            if rnd.random() < 0.3
+        ]
+        with engine.begin() as conn:
+            for i in range(0, len(logs), 5000):
+                conn.execute(insert(ProgressLog.__table__), logs[i:i + 5000])
+            record_changes(conn, ProgressLog.__tablename__, None, INSERT)
+        return {"students": len(created), "plan_items": len(item_ids), "logs": len(logs)}
+    finally:
+        db.close()
+
+
+def restore_dataset(path: str) -> dict:
+    """Данные из снимка (utils/snapshot.py) вместо build_dataset: восстановление постранично."""
+    from database.connection import engine
+    from database.schema import bootstrap_schema
+    from utils.snapshot import restore_snapshot
+
+    bootstrap_schema(engine)
+    tables = restore_snapshot(path)["files"]["app.db"]["tables"]
+    return {"students": tables.get("students", 0), "plan_items": tables.get("plan_items", 0),
+            "logs": tables.get("progress_log", 0)}
+
+
+def _empty_totals() -> dict:
+    return {"db_ms": 0.0, "wait_ms": 0.0, "pool_ms": 0.0, "statements": 0}
+
+
+class DbProbe:
+    """
+    Время запросов к БД по пользователям: запросы попадают к тому пользователю,
+    чей скрипт их выполняет (ключ в st.session_state), остальные — в "фон".
+    Отдельно — ожидание свободного соединения в пуле.
+    """
+
+    STATE_KEY = "_load_test_user"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.totals = defaultdict(_empty_totals)
+
+    def install(self, engine):
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+        # COMMIT не проходит через курсор, а выдача соединения — через события:
+        # оборачиваем методы диалекта и пула этого движка
+        do_commit = engine.dialect.do_commit
+        pool_connect = engine.pool.connect
+
+        def timed_commit(dbapi_connection):
+            self._start()
+            try:
+                do_commit(dbapi_connection)
+            finally:
+                self._stop()
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                return pool_connect()
+            finally:
+                waited = (time.perf_counter() - started) * 1000
+                owner = self._owner()
+                with self._lock:
+                    self.totals[owner]["pool_ms"] += waited
+
+        engine.dialect.do_commit = timed_commit
+        engine.pool.connect = timed_connect
+
+    def _owner(self) -> str:
+        thread = threading.current_thread()
+        owner = getattr(thread, "_load_test_owner", None)
+        if owner is None:
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+            ctx = get_script_run_ctx(suppress_warning=True)
+            owner = BACKGROUND
+            if ctx is not None and self.STATE_KEY in ctx.session_state:
+                owner = ctx.session_state[self.STATE_KEY]
+            thread._load_test_owner = owner  # поток скрипта создается заново на каждый перезапуск
+        return owner
+
+    def _start(self):
+        self._local.started = (time.perf_counter(), time.thread_time())
+
+    def _stop(self):
+        wall0, cpu0 = self._local.started
+        wall = time.perf_counter() - wall0
+        cpu = time.thread_time() - cpu0
+        owner = self._owner()
+        with self._lock:
+            totals = self.totals[owner]
+            totals["db_ms"] += wall * 1000
+            totals["wait_ms"] += max(0.0, wall - cpu) * 1000
+            totals["statements"] += 1
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._start()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self._stop()
+
+    def take(self, owner: str) -> dict:
+        with self._lock:
+            return self.totals.pop(owner, None) or _empty_totals()
+
+
+class LoadTest:
+    def __init__(self, users: int, duration: float, write: bool, think_time: float, seed: int = 1):
+        self.users = users
+        self.duration = duration
+        self.write = write
+        self.think_time = think_time
+        self.seed = seed
+        self.probe = DbProbe()
+        self.runs = defaultdict(list)  # страница -> [(мс перезапуска, мс в БД, мс ожидания БД, мс ожидания пула, запросов)]
+        self.exceptions = defaultdict(int)  # страница -> перезапусков с исключением
+        self.client_errors = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def _record(self, user: str, page: str, elapsed: float, at):
+        db = self.probe.take(user)
+        with self._lock:
+            self.runs[page].append((elapsed * 1000, db["db_ms"], db["wait_ms"], db["pool_ms"], db["statements"]))
+            if at.exception:
+                self.exceptions[page] += 1
+                if len(self.errors) < 10:
+                    self.errors.append(f"{page}: {at.exception[0].value}")
+
+    def _run(self, user: str, page: str, at):
+        started = time.perf_counter()
+        at.run()
+        self._record(user, page, time.perf_counter() - started, at)
+
+    def _new_session(self, user: str):
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(os.path.join(PROJECT_DIR, "main.py"), default_timeout=120)
+        at.session_state[DbProbe.STATE_KEY] = user
+        self._run(user, "🏠 Главная", at)
+        return at
+
+    def _visit(self, user: str, at, rnd: random.Random, deadline: float):
+        """Переход на случайную страницу и несколько действий на ней."""
+        page = rnd.choices(list(PAGE_MIX), list(PAGE_MIX.values()))[0]
+        at.sidebar.radio[0].set_value(page)
+        self._run(user, page, at)
+
+        for _ in range(ACTIONS_PER_PAGE):
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(rnd.uniform(0, self.think_time))
+            button = WRITE_BUTTONS.get(page) if self.write and rnd.random() < 0.3 else None
+            buttons = [b for b in at.main.button if button and b.label.startswith(button)]
+            if buttons:
+                buttons[0].click()
+            elif at.main.selectbox and len(at.main.selectbox[0].options) > 1:
+                # Первый выпадающий список на страницах — выбор ученика (или методики)
+                selectbox = at.main.selectbox[0]
+                selectbox.select_index(rnd.randrange(len(selectbox.options)))
+            else:
+                continue
+            self._run(user, page, at)
+
+    def _user(self, n: int, deadline: float):
+        rnd = random.Random(self.seed * 1000 + n)
+        user = f"user-{n}"
+        at = None
+        while time.monotonic() < deadline:
+            try:
+                if at is None:
+                    at = self._new_session(user)
+                self._visit(user, at, rnd, deadline)
+            except Exception as e:
+                # Сбой на стороне AppTest (разбор дерева элементов), а не страницы:
+                # продолжаем новой сессией
+                with self._lock:
+                    self.client_errors += 1
+                    if len(self.errors) < 10:
+                        self.errors.append(f"AppTest: {type(e).__name__}: {e}")
+                at = None
+
+    def run(self) -> dict:
+        from database.connection import engine, read_engine
+        # Отчеты и аналитика читают через отдельный движок (только чтение)
+        for bind in (engine, read_engine):
+            self.probe.install(bind)
+        allow_concurrent_app_tests()
+
+        started = time.monotonic()
+        deadline = started + self.duration
+        threads = [
+            threading.Thread(target=self._user, args=(n, deadline), name=f"load-user-{n}", daemon=True)
+            for n in range(self.users)
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)  # пользователи приходят не одновременно
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        def summary(runs):
+            latencies = sorted(r[0] for r in runs)
+            count = len(runs) or 1
+            return {
+                "reruns": len(runs),
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "max_ms": latencies[-1] if latencies else 0.0,
+                "db_ms_per_run": sum(r[1] for r in runs) / count,
+                "db_wait_ms_per_run": sum(r[2] for r in runs) / count,
+                "pool_wait_ms_per_run": sum(r[3] for r in runs) / count,
+                "statements_per_run": sum(r[4] for r in runs) / count,
+            }
+
+        all_runs = [r for runs in self.runs.values() for r in runs]
+        background = self.probe.take(BACKGROUND)
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "users": self.users,
+            "write": self.write,
+            "duration_s": round(elapsed, 2),
+            "reruns_per_s": len(all_runs) / elapsed if elapsed else 0.0,
+            "exceptions": sum(self.exceptions.values()),
+            "client_errors": self.client_errors,
+            "errors": self.errors,
+            "total": summary(all_runs),
+            "pages": {
+                page: dict(summary(runs), exceptions=self.exceptions[page])
+                for page, runs in sorted(self.runs.items())
+            },
+            "background": {
+                "db_ms": background["db_ms"],
+                "db_wait_ms": background["wait_ms"],
+                "statements": background["statements"],
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест страниц Streamlit")
+    parser.add_argument("--users", type=int, default=20, help="одновременных пользователей")
+    parser.add_argument("--duration", type=float, default=30, help="длительность, сек")
+    parser.add_argument("--students", type=int, default=200, help="учеников в сгенерированных данных")
+    parser.add_argument("--days", type=int, default=60, help="дней журнала в сгенерированных данных")
+    parser.add_argument("--snapshot", help="взять данные из снимка вместо генерации (utils/snapshot.py)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="пауза между действиями пользователя до N сек")
+    parser.add_argument("--write", action="store_true", help="пользователи сохраняют журнал и диагностики")
+    parser.add_argument("--max-p95-ms", type=float, help="допустимый p95 перезапуска по всем страницам, мс")
+    parser.add_argument("--output", help="дописать результат (JSON-строка) в файл")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    snapshot = os.path.abspath(args.snapshot) if args.snapshot else None
+
+    workdir = tempfile.mkdtemp(prefix="iom_load_")
+    try:
+        prepare_environment(workdir)
+        t0 = time.perf_counter()
+        if snapshot:
+            dataset = restore_dataset(snapshot)
+        else:
+            dataset = build_dataset(args.students, args.days)
+        print(f"Данные: {dataset['students']} учеников, {dataset['plan_items']} пунктов планов, "
+              f"{dataset['logs']} записей журнала ({time.perf_counter() - t0:.1f} с)")
+
+        report = LoadTest(args.users, args.duration, args.write, args.think_time).run()
+        report["dataset"] = dataset
+    finally:
+        os.chdir(PROJECT_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    total = report["total"]
+    print(f"{total['reruns']} перезапусков за {report['duration_s']} с, {args.users} пользователей: "
+          f"{report['reruns_per_s']:.1f} перезапусков/с, с исключением {report['exceptions']}, "
+          f"сбоев AppTest {report['client_errors']}")
+    print(f"{'страница':<22} {'запусков':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'БД':>8} {'ожид.БД':>8} {'пул':>8} {'запросов':>8}")
+    for page, s in list(report["pages"].items()) + [("ВСЕГО", total)]:
+        print(f"{page:<22} {s['reruns']:>8} {s['p50_ms']:>6.0f}мс {s['p95_ms']:>6.0f}мс {s['p99_ms']:>6.0f}мс "
+              f"{s['db_ms_per_run']:>6.1f}мс {s['db_wait_ms_per_run']:>6.1f}мс {s['pool_wait_ms_per_run']:>6.1f}мс "
+              f"{s['statements_per_run']:>8.1f}")
+    bg = report["background"]
+    print(f"{BACKGROUND}: {bg['statements']} запросов, {bg['db_ms']:.0f} мс в БД, из них ожидание {bg['db_wait_ms']:.0f} мс")
+    for error in report["errors"]:
+        print(f"  ! {error}")
+
+    if output:
+        with open(output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    failed = False
+    if report["exceptions"]:
+        print("ОШИБКА: исключения на страницах")
+        failed = True
+    if args.max_p95_ms is not None and total["p95_ms"] > args.max_p95_ms:
+        print("ОШИБКА: p95 превышает допустимое значение")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
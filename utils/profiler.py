@@ -0,0 +1,263 @@
+"""
+Профилирование страниц по запросу: включается в панели администратора
+на N следующих запусков выбранной страницы.
+
+Для каждого запуска сохраняются в Config.PROFILE_DIR/<время>_<страница>/:
+  profile.pstats   — статистика cProfile (python -m pstats, snakeviz);
+  stacks.txt       — стеки в свернутом формате "f1;f2;f3 N" по выборкам
+                     каждые PROFILE_SAMPLE_INTERVAL сек (flamegraph.pl, speedscope);
+  allocations.txt  — прирост памяти по строкам кода (tracemalloc) за время запуска.
+Сводка (самые долгие функции и крупнейшие выделения памяти) показывается под страницей.
+
+cProfile и tracemalloc действуют на весь процесс, поэтому одновременно
+профилируется только одна сессия, а в выделения памяти попадают и другие потоки.
+"""
+import cProfile
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import streamlit as st
+from config.settings import Config
+
+# Ключи session_state: сколько запусков еще профилировать и сводки последних профилей
+_PENDING_KEY = "_profile_pending"
+_RESULTS_KEY = "_profile_results"
+RESULTS_SHOWN = 5
+TOP_N = 15
+
+_profile_lock = threading.Lock()
+
+# Выделения самого профилировщика и механизма импорта в сводку не попадают
+_ALLOC_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+def request_profiling(runs: int):
+    """Профилировать следующие runs запусков страницы (в текущей сессии)."""
+    st.session_state[_PENDING_KEY] = runs
+
+
+def cancel_profiling():
+    st.session_state.pop(_PENDING_KEY, None)
+
+
+def remaining_runs() -> int:
+    return st.session_state.get(_PENDING_KEY, 0)
+
+
+def run_page(page: str, render: Callable[[], None]):
+    """Отрисовать страницу; если профилирование включено — под профилировщиком."""
+    if not remaining_runs():
+        render()
+        return
+    if not _profile_lock.acquire(blocking=False):
+        st.caption("🔬 Профилировщик занят другой сессией — этот запуск без профиля")
+        render()
+        return
+
+    try:
+        st.session_state[_PENDING_KEY] -= 1
+        if not st.session_state[_PENDING_KEY]:
+            cancel_profiling()
+
+        profile = PageProfile(page, render.__name__)
+        try:
+            # Исключения управления потоком Streamlit (st.rerun, st.stop) тоже проходят здесь:
+            # профиль сохраняется и в этом случае
+            profile.run(render)
+        finally:
+            results = st.session_state.setdefault(_RESULTS_KEY, [])
+            results.insert(0, profile.save())
+            del results[RESULTS_SHOWN:]
+    finally:
+        _profile_lock.release()
+
+
+def _profiled_call(render: Callable[[], None]):
+    # Граница стека: выборки записываются начиная с кадра страницы
+    render()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """Выборка стека потока страницы через равные интервалы (для flame graph)."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="page-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame.f_code is not _profiled_call.__code__:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if frame is not None and labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class PageProfile:
+    """Один профилированный запуск страницы: CPU (cProfile + выборки стека) и память (tracemalloc)."""
+
+    def __init__(self, page: str, name: str):
+        self.page = page
+        self.name = name
+        self.created_at = datetime.now()
+        self.profiler = cProfile.Profile()
+        self.sampler = _StackSampler(threading.get_ident(), Config.PROFILE_SAMPLE_INTERVAL)
+        self.cpu_enabled = False
+        self.elapsed = 0.0
+        self.peak = 0
+        self.allocations: List[tracemalloc.StatisticDiff] = []
+
+    def run(self, render: Callable[[], None]):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot().filter_traces(_ALLOC_FILTERS)
+        try:
+            # Другой профилировщик процесса (отладчик, coverage) — остается только память
+            self.profiler.enable()
+            self.cpu_enabled = True
+        except ValueError:
+            pass
+        self.sampler.start()
+        started = time.perf_counter()
+        try:
+            _profiled_call(render)
+        finally:
+            self.elapsed = time.perf_counter() - started
+            self.sampler.stop()
+            if self.cpu_enabled:
+                self.profiler.disable()
+            after = tracemalloc.take_snapshot().filter_traces(_ALLOC_FILTERS)
+            self.peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            self.allocations = [d for d in after.compare_to(before, "lineno") if d.size_diff > 0]
+
+    def top_functions(self) -> List[Dict]:
+        """Функции с наибольшим собственным временем."""
+        if not self.cpu_enabled:
+            return []
+        stats = pstats.Stats(self.profiler).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_N]
+        return [
+            {
+                "Функция": f"{func} ({os.path.basename(filename)}:{line})",
+                "Вызовов": calls,
+                "Собственное, мс": round(tottime * 1000, 1),
+                "С вложенными, мс": round(cumtime * 1000, 1),
+            }
+            for (filename, line, func), (_, calls, tottime, cumtime, _) in rows
+        ]
+
+    def top_allocations(self) -> List[Dict]:
+        """Строки кода с наибольшим приростом занятой памяти."""
+        return [
+            {
+                "Строка": f"{os.path.relpath(diff.traceback[0].filename, Config.BASE_DIR)}:{diff.traceback[0].lineno}",
+                "Прирост, КБ": round(diff.size_diff / 1024, 1),
+                "Блоков": diff.count_diff,
+            }
+            for diff in self.allocations[:TOP_N]
+        ]
+
+    def save(self) -> Dict:
+        """Записать файлы профиля, удалить старые профили сверх Config.PROFILE_KEEP, вернуть сводку."""
+        path = os.path.join(Config.PROFILE_DIR, f"{self.created_at:%Y%m%d-%H%M%S-%f}_{self.name}")
+        os.makedirs(path, exist_ok=True)
+        files = {}
+
+        if self.cpu_enabled:
+            files["profile.pstats"] = os.path.join(path, "profile.pstats")
+            self.profiler.dump_stats(files["profile.pstats"])
+
+        files["stacks.txt"] = os.path.join(path, "stacks.txt")
+        with open(files["stacks.txt"], "w", encoding="utf-8") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        files["allocations.txt"] = os.path.join(path, "allocations.txt")
+        with open(files["allocations.txt"], "w", encoding="utf-8") as f:
+            f.write(f"Пик отслеживаемой памяти: {self.peak / 1024:.1f} КБ\n\n")
+            for diff in self.allocations:
+                f.write(f"{diff}\n")
+
+        _rotate_profiles()
+        return {
+            "page": self.page,
+            "created_at": f"{self.created_at:%d.%m.%Y %H:%M:%S}",
+            "elapsed_ms": self.elapsed * 1000,
+            "peak_kb": self.peak / 1024,
+            "samples": sum(self.sampler.stacks.values()),
+            "functions": self.top_functions(),
+            "allocations": self.top_allocations(),
+            "files": files,
+        }
+
+
+def _rotate_profiles():
+    names = sorted(os.listdir(Config.PROFILE_DIR), reverse=True)
+    for name in names[Config.PROFILE_KEEP:]:
+        shutil.rmtree(os.path.join(Config.PROFILE_DIR, name), ignore_errors=True)
+
+
+def show_results():
+    """Сводки последних профилей под страницей, с файлами для скачивания."""
+    results = st.session_state.get(_RESULTS_KEY)
+    if not results:
+        return
+
+    st.markdown("---")
+    with st.expander(f"🔬 Профилирование страниц (последних: {len(results)})"):
+        if st.button("Скрыть результаты", key="profile_clear"):
+            st.session_state.pop(_RESULTS_KEY, None)
+            st.rerun()
+
+        for i, result in enumerate(results):
+            st.markdown(
+                f"**{result['page']}** — {result['created_at']}: {result['elapsed_ms']:.0f} мс, "
+                f"пик памяти {result['peak_kb']:.0f} КБ, выборок стека {result['samples']}"
+            )
+            c1, c2 = st.columns(2)
+            with c1:
+                st.caption("⏱ Функции (по собственному времени)")
+                if result["functions"]:
+                    st.dataframe(result["functions"], hide_index=True, use_container_width=True)
+                else:
+                    st.caption("cProfile недоступен: в процессе уже работает другой профилировщик")
+            with c2:
+                st.caption("🧠 Выделения памяти (прирост за запуск)")
+                st.dataframe(result["allocations"], hide_index=True, use_container_width=True)
+
+            buttons = st.columns(len(result["files"]))
+            for col, (file_name, file_path) in zip(buttons, result["files"].items()):
+                if os.path.exists(file_path):
+                    with open(file_path, "rb") as f:
+                        col.download_button(f"⬇️ {file_name}", f.read(), file_name=file_name,
+                                            key=f"profile_dl_{i}_{file_name}_{result['created_at']}")
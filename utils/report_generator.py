@@ -3,11 +3,14 @@ from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from io import BytesIO
 from datetime import date  # <--- ИСПРАВЛЕН ИМПОРТ
-from database.models import Student, EducationalPlan
+from database.models import Student
+from services.read_models import PlanItemRecord, PlanRecord
+from typing import List
 
-def generate_word_report(student: Student, plan: EducationalPlan, items: list, logs: list = None) -> BytesIO:
+def generate_word_report(student: Student, plan: PlanRecord, items: List[PlanItemRecord], logs: list = None) -> BytesIO:
     """
     Генерирует документ Word с индивидуальным планом и журналом.
+    logs — записи журнала плана; упражнение записи берется из items по plan_item_id.
     """
     doc = Document()
 
@@ -57,9 +60,8 @@ def generate_word_report(student: Student, plan: EducationalPlan, items: list, l
     for idx, item in enumerate(items):
         row_cells = table.add_row().cells
         row_cells[0].text = str(idx + 1)
-        skill_name = item.exercise.skill.name if item.exercise.skill else "Общее"
-        row_cells[1].text = skill_name
-        row_cells[2].text = item.exercise.title
+        row_cells[1].text = item.skill_name or "Общее"
+        row_cells[2].text = item.exercise_title or "—"
         row_cells[3].text = str(item.frequency) if item.frequency else "По графику"
 
     # --- 3. Журнал выполнения (Таблица результатов) ---
@@ -81,11 +83,12 @@ def generate_word_report(student: Student, plan: EducationalPlan, items: list, l
         # Словарь для красивого статуса
         status_map = {"completed": "Вып.", "failed": "Не спр.", "skipped": "Проп."}
 
+        titles = {item.id: item.exercise_title for item in items}
         for log in logs:
             row = log_table.add_row().cells
             row[0].text = log.date.strftime('%d.%m')
             # Получаем название упражнения
-            row[1].text = log.item.exercise.title
+            row[1].text = titles.get(log.plan_item_id) or "—"
             # Статус
             status_text = status_map.get(log.status.value, log.status.value)
             row[2].text = status_text
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from database.models import SkillCategory, Exercise, User, UserRole
 from config.constants import MEDICAL_TAGS
+from services.read_cache import reference_cache
 
 def seed_database(db: Session):
     if db.query(SkillCategory).first():
@@ -143,4 +144,5 @@ def seed_database(db: Session):
 
     db.add_all(exercises)
     db.commit()
+    reference_cache.clear()
     print("База наполнена 10 методиками с системой противопоказаний!")
\ No newline at end of file
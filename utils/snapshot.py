@@ -0,0 +1,297 @@
+"""
+Снимки данных: вся база (app.db и холодный архив archive.db) в одном сжатом файле
+для быстрого сброса демо-стенда и подготовки данных для замеров.
+
+Запуск из корня проекта:
+    python -m utils.snapshot export data.iomsnap          # снимок текущей базы
+    python -m utils.snapshot restore data.iomsnap         # восстановление (приложение остановлено)
+    python -m utils.snapshot info data.iomsnap            # манифест: версия схемы, число строк
+    python -m utils.snapshot generate big.iomsnap --students 20000 --days 120
+    python -m utils.snapshot demo                         # демо-снимок для кнопки администратора
+
+Снимок — zip-архив с файлами БД, сжатыми VACUUM INTO (без свободных страниц
+и с упорядоченными индексами), и manifest.json. Восстановление не вставляет
+строки по одной: файлы распаковываются и копируются постранично через backup API
+SQLite поверх рабочих (как utils/backup.py restore), поэтому занимает секунды
+и на миллионах строк. На время копирования фоновые задачи приостанавливаются,
+а запись в основную базу ждет. Снимок более старой версии схемы обновляется миграциями
+до копирования; снимок более новой версии не восстанавливается.
+
+generate собирает данные как нагрузочный тест (utils/load_test.py) во временном
+каталоге: рабочая база не затрагивается. Такие снимки подходят для
+python -m utils.load_test --snapshot ФАЙЛ.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from typing import Dict
+
+from config.settings import Config
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+# Порядок как в резервных копиях: основная база первой
+DATABASE_FILES = ("app.db", "archive.db")
+
+
+class SnapshotError(RuntimeError):
+    """Файл не является снимком или не может быть восстановлен в эту базу."""
+
+
+def _database_paths() -> Dict[str, str]:
+    # Импорт здесь, а не в начале модуля: generate сначала переходит во временный каталог
+    from database.connection import ARCHIVE_DB_PATH, engine
+    return {"app.db": os.path.abspath(engine.url.database), "archive.db": ARCHIVE_DB_PATH}
+
+
+def _table_counts(path: str) -> Dict[str, int]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in tables}
+    finally:
+        conn.close()
+
+
+def _schema_version(path: str) -> int:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def export_snapshot(path: str, source: str = "export") -> Dict:
+    """
+    Снимок текущей базы в файл path. Каждый файл БД читается одной транзакцией
+    (VACUUM INTO), приложение может продолжать работу. Возвращает манифест.
+    """
+    started = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix="iom_snapshot_")
+    try:
+        manifest = {
+            "format": FORMAT_VERSION,
+            "source": source,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "files": {},
+        }
+        for file_name, db_path in _database_paths().items():
+            if not os.path.exists(db_path):
+                continue
+            compact = os.path.join(workdir, file_name)
+            conn = sqlite3.connect(db_path, timeout=15)
+            try:
+                conn.execute("VACUUM INTO ?", (compact,))
+            finally:
+                conn.close()
+            manifest["files"][file_name] = {
+                "size": os.path.getsize(compact),
+                "schema_version": _schema_version(compact),
+                "tables": _table_counts(compact),
+            }
+
+        # Пишем рядом и переименовываем: недописанный снимок не подменит готовый
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial = f"{path}.partial"
+        with zipfile.ZipFile(partial, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(MANIFEST, json.dumps(manifest, ensure_ascii=False, indent=2))
+            for file_name in manifest["files"]:
+                archive.write(os.path.join(workdir, file_name), file_name)
+        os.replace(partial, path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    manifest["snapshot_size"] = os.path.getsize(path)
+    manifest["seconds"] = time.perf_counter() - started
+    return manifest
+
+
+def read_manifest(path: str) -> Dict:
+    try:
+        with zipfile.ZipFile(path) as archive:
+            manifest = json.loads(archive.read(MANIFEST))
+    except (OSError, KeyError, zipfile.BadZipFile, ValueError) as e:
+        raise SnapshotError(f"{path}: не снимок данных ({e})")
+    if manifest.get("format") != FORMAT_VERSION:
+        raise SnapshotError(f"{path}: неизвестная версия формата {manifest.get('format')}")
+    return manifest
+
+
+def _upgrade_schema(db_path: str, archive_path: str):
+    """Миграции распакованного снимка старой версии (database/schema.py) до копирования в рабочую базу."""
+    from sqlalchemy import create_engine, event
+    from database.connection import ARCHIVE_SCHEMA
+    from database.schema import bootstrap_schema
+
+    snapshot_engine = create_engine(f"sqlite:///{db_path}")
+    event.listen(snapshot_engine, "connect", lambda dbapi_connection, record: dbapi_connection.execute(
+        f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path,)
+    ))
+    try:
+        bootstrap_schema(snapshot_engine)
+    finally:
+        snapshot_engine.dispose()
+
+
+def _reset_caches():
+    """
+    Кэши и очередь журнала процесса помнят данные до восстановления
+    (и id, которые теперь означают другое).
+    """
+    from services.analytics_service import AnalyticsService
+    from services.cohort_service import CohortService
+    from services.diagnostic_service import DiagnosticService
+    from services.journal_queue import clear_journal_queue
+    from services.read_cache import reference_cache
+    reference_cache.clear()
+    AnalyticsService.invalidate()
+    CohortService.invalidate()
+    DiagnosticService.invalidate()
+    # Записи очереди ссылаются на пункты планов прежних данных
+    clear_journal_queue()
+
+
+def restore_snapshot(path: str) -> Dict:
+    """
+    Замена всех данных содержимым снимка. Из приложения (сброс демо) фоновые задачи
+    на время копирования приостанавливаются, а очередь журнала, ее конфликты
+    и отложенные записи отбрасываются: они относятся к прежним данным.
+    Возвращает манифест.
+    """
+    from database.schema import SCHEMA_VERSION
+    from utils.background import workers_paused
+    from utils.backup import copy_database
+
+    started = time.perf_counter()
+    manifest = read_manifest(path)
+    if "app.db" not in manifest["files"]:
+        raise SnapshotError(f"{path}: в снимке нет основной базы")
+    version = manifest["files"]["app.db"]["schema_version"]
+    if version > SCHEMA_VERSION:
+        raise SnapshotError(f"{path}: версия схемы снимка {version} новее поддерживаемой {SCHEMA_VERSION}")
+
+    targets = _database_paths()
+    # Распаковка рядом с рабочей базой (тот же диск), а не в системный временный каталог
+    workdir = tempfile.mkdtemp(prefix=".snapshot-", dir=os.path.dirname(targets["app.db"]))
+    try:
+        files = {}
+        with zipfile.ZipFile(path) as archive:
+            for file_name in DATABASE_FILES:
+                files[file_name] = os.path.join(workdir, file_name)
+                if file_name in manifest["files"]:
+                    # CRC каждого файла проверяется zipfile при чтении
+                    with archive.open(file_name) as src, open(files[file_name], "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                else:
+                    # Снимок без архива: пустой архив, таблицы создаст _upgrade_schema
+                    sqlite3.connect(files[file_name]).close()
+
+        if version < SCHEMA_VERSION or "archive.db" not in manifest["files"]:
+            _upgrade_schema(files["app.db"], files["archive.db"])
+
+        with workers_paused():
+            # Архив пишут только фоновые задачи; основную базу держим занятой
+            # (BEGIN IMMEDIATE), чтобы сохранения страниц ждали, пока заменяется архив.
+            # Основную базу backup API копирует одним шагом под своей блокировкой записи
+            lock = sqlite3.connect(targets["app.db"], timeout=15)
+            try:
+                lock.execute("BEGIN IMMEDIATE")
+                copy_database(files["archive.db"], targets["archive.db"], pages=-1, sleep=0)
+            finally:
+                lock.close()
+            copy_database(files["app.db"], targets["app.db"], pages=-1, sleep=0)
+            _reset_caches()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    manifest["seconds"] = time.perf_counter() - started
+    return manifest
+
+
+def generate_snapshot(path: str, students: int, days: int, source: str = "generate") -> Dict:
+    """
+    Снимок сгенерированных данных: демо-справочники + students учеников с диагностиками,
+    планами и журналом за days дней (utils/load_test.build_dataset) во временном каталоге.
+    Переводит процесс во временный каталог — вызывается из командной строки
+    до импорта модулей приложения.
+    """
+    from utils.load_test import PROJECT_DIR, build_dataset, prepare_environment
+
+    path = os.path.abspath(path)
+    workdir = tempfile.mkdtemp(prefix="iom_generate_")
+    try:
+        prepare_environment(workdir)
+        started = time.perf_counter()
+        dataset = build_dataset(students, days)
+        generated = time.perf_counter() - started
+        manifest = export_snapshot(path, source=source)
+        manifest.update(dataset=dataset, generate_seconds=generated)
+        return manifest
+    finally:
+        os.chdir(PROJECT_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _print_manifest(manifest: Dict):
+    for file_name, info in manifest["files"].items():
+        rows = sum(info["tables"].values())
+        print(f"{file_name}: {info['size'] / 1e6:.1f} МБ, схема v{info['schema_version']}, строк {rows}")
+        for table, count in sorted(info["tables"].items(), key=lambda item: -item[1])[:5]:
+            print(f"    {table:<22} {count:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимки данных")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="снимок текущей базы")
+    export.add_argument("path", help="файл снимка")
+    restore = sub.add_parser("restore", help="заменить данные снимком (приложение должно быть остановлено)")
+    restore.add_argument("path", help="файл снимка")
+    info = sub.add_parser("info", help="манифест снимка")
+    info.add_argument("path", help="файл снимка")
+    generate = sub.add_parser("generate", help="снимок сгенерированных данных")
+    generate.add_argument("path", help="файл снимка")
+    generate.add_argument("--students", type=int, default=1000, help="учеников")
+    generate.add_argument("--days", type=int, default=90, help="дней журнала")
+    demo = sub.add_parser("demo", help="демо-снимок для кнопки «Пересоздать демо-данные»")
+    demo.add_argument("--students", type=int, default=20, help="учеников")
+    demo.add_argument("--days", type=int, default=30, help="дней журнала")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            manifest = export_snapshot(args.path)
+            _print_manifest(manifest)
+            print(f"Снимок {args.path}: {manifest['snapshot_size'] / 1e6:.1f} МБ за {manifest['seconds']:.1f} с")
+
+        elif args.command == "restore":
+            manifest = restore_snapshot(args.path)
+            print(f"Восстановлен снимок от {manifest['created_at']} за {manifest['seconds']:.1f} с")
+
+        elif args.command == "info":
+            manifest = read_manifest(args.path)
+            print(f"Снимок от {manifest['created_at']} ({manifest['source']})")
+            _print_manifest(manifest)
+
+        elif args.command in ("generate", "demo"):
+            path = args.path if args.command == "generate" else Config.DEMO_SNAPSHOT
+            manifest = generate_snapshot(path, args.students, args.days, source=args.command)
+            _print_manifest(manifest)
+            print(f"Данные сгенерированы за {manifest['generate_seconds']:.1f} с, снимок {path}: "
+                  f"{manifest['snapshot_size'] / 1e6:.1f} МБ за {manifest['seconds']:.1f} с")
+    except SnapshotError as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
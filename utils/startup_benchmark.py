@@ -0,0 +1,112 @@
+"""
+Бенчмарк холодного старта: время импорта main.py в свежем процессе
+и время первого открытия каждой страницы.
+
+Запуск из корня проекта:
+    python -m utils.startup_benchmark
+    python -m utils.startup_benchmark --runs 7 --budget-ms 1500 --output bench_output.txt
+
+Код выхода 1, если медиана старта превышает бюджет или при старте
+импортируются тяжелые библиотеки, которые должны грузиться только страницами.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Бюджет на импорт main.py (мс). Основная часть — сам streamlit и sqlalchemy.
+DEFAULT_BUDGET_MS = 1500
+
+# Эти модули не должны попадать в процесс до открытия страницы
+HEAVY_MODULES = ["pandas", "numpy", "plotly.express", "docx"]
+
+# Код, выполняемый в отдельном процессе: импорт main и (опционально) модуля страницы
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+page_ms = None
+if {page!r}:
+    main.load_page({page!r})
+    page_ms = (time.perf_counter() - t1) * 1000
+print(json.dumps({{"startup_ms": (t1 - t0) * 1000, "page_ms": page_ms, "heavy": heavy}}))
+"""
+
+
+def probe(page: str = "") -> dict:
+    """Один замер в свежем интерпретаторе (без кэша модулей)."""
+    code = _PROBE.format(heavy=HEAVY_MODULES, page=page)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run_benchmark(runs: int) -> dict:
+    # Прогрев файлового кэша ОС и .pyc, чтобы не мерить компиляцию
+    probe()
+
+    startups = []
+    heavy = set()
+    for _ in range(runs):
+        result = probe()
+        startups.append(result["startup_ms"])
+        heavy.update(result["heavy"])
+
+    sys.path.insert(0, PROJECT_DIR)
+    from main import PAGES
+
+    pages = {}
+    for page in PAGES:
+        samples = [probe(page)["page_ms"] for _ in range(max(1, runs // 2))]
+        pages[page] = statistics.median(samples)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "runs": runs,
+        "startup_median_ms": statistics.median(startups),
+        "startup_max_ms": max(startups),
+        "heavy_at_startup": sorted(heavy),
+        "first_page_ms": pages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта приложения")
+    parser.add_argument("--runs", type=int, default=5, help="число замеров старта")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="бюджет медианы старта, мс")
+    parser.add_argument("--output", help="дописать результат (JSON-строка) в файл")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.runs)
+
+    print(f"Старт (import main): медиана {report['startup_median_ms']:.0f} мс, "
+          f"максимум {report['startup_max_ms']:.0f} мс, бюджет {args.budget_ms:.0f} мс")
+    print("Первое открытие страницы (импорт модуля):")
+    for page, ms in report["first_page_ms"].items():
+        print(f"  {page:<28} {ms:8.0f} мс")
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    failed = False
+    if report["heavy_at_startup"]:
+        print(f"ОШИБКА: при старте импортированы {', '.join(report['heavy_at_startup'])}")
+        failed = True
+    if report["startup_median_ms"] > args.budget_ms:
+        print("ОШИБКА: старт не укладывается в бюджет")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
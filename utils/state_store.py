@@ -0,0 +1,116 @@
+import pickle
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import streamlit as st
+
+# Служебный ключ: {namespace: OrderedDict(group -> {"keys": set, "ts": float})}
+_REGISTRY_KEY = "_state_store"
+
+
+class StateStore:
+    """
+    Пространство имен в st.session_state с ограниченным размером.
+
+    Ключи страницы объединяются в группы (например, все поля оценок одного ученика).
+    Группа, к которой давно не обращались (TTL), или самая старая группа сверх
+    лимита (LRU) удаляется из session_state целиком. Текущая группа всегда
+    самая свежая, поэтому ее виджеты не вытесняются.
+    """
+
+    def __init__(self, namespace: str, max_groups: int = 20, ttl_seconds: float = 3600):
+        self.namespace = namespace
+        self.max_groups = max_groups
+        self.ttl_seconds = ttl_seconds
+
+    def _groups(self) -> "OrderedDict[str, dict]":
+        registry = st.session_state.setdefault(_REGISTRY_KEY, {})
+        return registry.setdefault(self.namespace, OrderedDict())
+
+    def _value_key(self, group) -> str:
+        return f"{self.namespace}:{group}"
+
+    def use(self, group, *keys: str):
+        """
+        Отметить группу как используемую и зарегистрировать ее ключи
+        (ключи виджетов, которые страница создает для этой группы).
+        """
+        groups = self._groups()
+        group = str(group)
+        entry = groups.get(group)
+        if entry is None:
+            entry = groups[group] = {"keys": set(), "ts": 0.0}
+        entry["keys"].update(keys)
+        entry["ts"] = time.time()
+        groups.move_to_end(group)
+        self._evict(groups)
+
+    def get(self, group, default: Any = None) -> Any:
+        return st.session_state.get(self._value_key(group), default)
+
+    def set(self, group, value: Any):
+        key = self._value_key(group)
+        st.session_state[key] = value
+        self.use(group, key)
+
+    def __contains__(self, group) -> bool:
+        return self._value_key(group) in st.session_state
+
+    def evict(self, group):
+        """Удалить группу и все ее ключи из session_state."""
+        entry = self._groups().pop(str(group), None)
+        if entry:
+            for key in entry["keys"]:
+                st.session_state.pop(key, None)
+
+    def clear(self):
+        for group in list(self._groups()):
+            self.evict(group)
+
+    def _evict(self, groups: "OrderedDict[str, dict]"):
+        now = time.time()
+        # Сначала устаревшие по времени (кроме только что использованной — она последняя)
+        for group in list(groups)[:-1]:
+            if now - groups[group]["ts"] > self.ttl_seconds:
+                self.evict(group)
+        # Затем самые старые сверх лимита
+        while len(groups) > self.max_groups:
+            self.evict(next(iter(groups)))
+
+
+def _approx_size(value: Any) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def memory_report() -> List[Dict]:
+    """
+    Примерный объем session_state по пространствам имен (для панели администратора).
+    Ключи, не принадлежащие ни одному StateStore, собраны в строку "прочее".
+    """
+    registry = st.session_state.get(_REGISTRY_KEY, {})
+    tracked = set()
+    report = []
+    for namespace, groups in registry.items():
+        registered = set().union(*(g["keys"] for g in groups.values())) if groups else set()
+        tracked |= registered
+        keys = [k for k in registered if k in st.session_state]
+        report.append({
+            "namespace": namespace,
+            "groups": len(groups),
+            "keys": len(keys),
+            "bytes": sum(_approx_size(st.session_state[k]) for k in keys),
+        })
+
+    other = [k for k in st.session_state.keys() if k not in tracked and k != _REGISTRY_KEY]
+    report.append({
+        "namespace": "прочее",
+        "groups": 0,
+        "keys": len(other),
+        "bytes": sum(_approx_size(st.session_state[k]) for k in other),
+    })
+    return report
@@ -0,0 +1,74 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from database.connection import get_read_db
+from services.cohort_service import CohortService
+
+def show_cohorts_page():
+    st.header("📈 Результаты по группам диагнозов")
+    st.caption("Сравнение первичной и итоговой диагностики: прирост баллов по каждому навыку в группах учеников с одинаковым диагнозом.")
+
+    # Только чтение: один снимок базы на перезапуск, запись журнала не ждет отчетов
+    db = next(get_read_db())
+    cohort_service = CohortService(db)
+
+    active_only = st.checkbox("Только активные ученики", value=True)
+
+    outcomes = cohort_service.get_skill_outcomes(active_only)
+    if not outcomes:
+        st.info("Нет учеников, у которых есть и первичная, и итоговая диагностика.")
+        return
+
+    df = pd.DataFrame(outcomes)
+    group_sizes = cohort_service.get_group_sizes(active_only)
+
+    # 1. Размер групп
+    cols = st.columns(min(len(group_sizes), 4))
+    for idx, (diagnosis, cnt) in enumerate(sorted(group_sizes.items(), key=lambda x: -x[1])):
+        cols[idx % len(cols)].metric(diagnosis, f"{cnt} уч.")
+
+    st.markdown("---")
+
+    # 2. Тепловая карта медианного прироста
+    st.subheader("Медианный прирост (итоговая − первичная)")
+    heat = df.pivot_table(index="diagnosis", columns="skill", values="median_delta")
+    fig = px.imshow(
+        heat,
+        text_auto=".1f",
+        color_continuous_scale="RdYlGn",
+        color_continuous_midpoint=0,
+        aspect="auto",
+        labels=dict(x="Навык", y="Диагноз", color="Прирост")
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    # 3. Детальная таблица
+    with st.expander("📋 Таблица по группам и навыкам", expanded=False):
+        table = df[["diagnosis", "sphere", "skill", "students", "avg_primary", "avg_final",
+                    "median_delta", "avg_delta", "min_delta", "max_delta", "improved_share"]].copy()
+        table["improved_share"] = table["improved_share"] * 100
+        st.dataframe(
+            table.rename(columns={
+                "diagnosis": "Диагноз", "sphere": "Сфера", "skill": "Навык", "students": "Учеников",
+                "avg_primary": "Ср. до", "avg_final": "Ср. после", "median_delta": "Медиана",
+                "avg_delta": "Среднее", "min_delta": "Мин.", "max_delta": "Макс.",
+                "improved_share": "Улучшились, %",
+            }),
+            column_config={"Улучшились, %": st.column_config.ProgressColumn(format="%.0f%%", min_value=0, max_value=100)},
+            hide_index=True,
+            use_container_width=True
+        )
+
+    # 4. Распределение прироста по выбранному навыку
+    st.subheader("Распределение прироста")
+    skill_opts = df.drop_duplicates("skill_id").set_index("skill_id")["skill"].to_dict()
+    selected_skill = st.selectbox("Навык:", list(skill_opts.keys()), format_func=lambda x: skill_opts[x])
+
+    dist = pd.DataFrame(cohort_service.get_delta_distribution(active_only))
+    dist = dist[dist["skill_id"] == selected_skill]
+    fig = px.bar(
+        dist, x="bucket", y="students", color="diagnosis", barmode="group",
+        labels={"bucket": "Прирост (баллы)", "students": "Учеников", "diagnosis": "Диагноз"}
+    )
+    fig.update_xaxes(dtick=1)
+    st.plotly_chart(fig, use_container_width=True)
@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from database.connection import get_db
+from database.connection import get_read_db
 from services.student_service import StudentService
+from services.analytics_service import AnalyticsService
 from database.models import Exercise, SkillCategory, EducationalPlan
 
 def show_dashboard():
@@ -14,7 +15,8 @@ def show_dashboard():
     </div>
     """, unsafe_allow_html=True)
     
-    db = next(get_db())
+    # Только чтение: один снимок базы на перезапуск, запись журнала не ждет отчетов
+    db = next(get_read_db())
     student_service = StudentService(db)
     
     # Собираем статистику
@@ -57,6 +59,16 @@ def show_dashboard():
         else:
             st.info("Нет данных для графика.")
 
+        st.subheader("🩺 Медицинские особенности")
+        tag_counts = student_service.get_tag_counts()
+        if tag_counts:
+            df_tags = pd.DataFrame(list(tag_counts.items()), columns=["Особенность", "Учеников"])
+            df_tags = df_tags.sort_values("Учеников", ascending=False)
+            fig_tags = px.bar(df_tags, x="Особенность", y="Учеников", color_discrete_sequence=["#4A90E2"])
+            st.plotly_chart(fig_tags, use_container_width=True)
+        else:
+            st.caption("У учеников не отмечено медицинских особенностей.")
+
     with col_right:
         st.subheader("⚡ Быстрый старт")
         with st.container():
@@ -65,4 +77,39 @@ def show_dashboard():
             st.markdown("#### Что сделать сейчас?")
             st.markdown("- [➕ Добавить ученика](#)")
             st.markdown("- [🩺 Провести диагностику](#)")
-            st.markdown("- [📅 Заполнить журнал](#)")
\ No newline at end of file
+            st.markdown("- [📅 Заполнить журнал](#)")
+
+    st.markdown("---")
+
+    # Регулярность занятий (по колоночному снимку журнала)
+    st.subheader("🔥 Регулярность занятий")
+    analytics = AnalyticsService(db)
+    sessions_7d, completion_7d = analytics.activity_window(days=7)
+
+    k1, k2 = st.columns(2)
+    k1.metric("Занятий за 7 дней", sessions_7d)
+    k2.metric("Выполнено за 7 дней", f"{completion_7d:.0%}")
+
+    streaks = analytics.streaks()
+    if not streaks.empty:
+        rates = analytics.completion_rates(by_exercise=False)
+        names = {s.id: s.full_name for s in student_service.get_all_students()}
+
+        table = streaks.merge(rates[["student_id", "completion_rate"]], on="student_id")
+        table = table[table["student_id"].isin(names.keys())]
+        table["Ученик"] = table["student_id"].map(names)
+        table["completion_rate"] = table["completion_rate"] * 100
+        table = table.sort_values(["current_streak", "longest_streak"], ascending=False)
+
+        st.dataframe(
+            table[["Ученик", "current_streak", "longest_streak", "completion_rate"]].rename(columns={
+                "current_streak": "Текущая серия (дн.)",
+                "longest_streak": "Лучшая серия (дн.)",
+                "completion_rate": "Доля выполненных",
+            }),
+            column_config={"Доля выполненных": st.column_config.ProgressColumn(format="%.0f%%", min_value=0, max_value=100)},
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("В журнале пока нет выполненных занятий.")
\ No newline at end of file
@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from database.connection import get_db
+from database.connection import get_db, release_sessions
 from services.student_service import StudentService
 from services.diagnostic_service import DiagnosticService
 from database.models import DiagnosticType
+from utils.state_store import StateStore
 
 # Словарь для перевода
 TYPE_MAPPING = {
@@ -13,6 +14,9 @@ TYPE_MAPPING = {
     "final": "Итоговая"
 }
 
+# Поля оценок по ученикам: храним не больше 10 учеников, неиспользуемые — 2 часа
+DIAG_SCORES = StateStore("diag_scores", max_groups=10, ttl_seconds=2 * 3600)
+
 # --- Вспомогательная функция для синхронизации ---
 def sync_input(source_key, target_key):
     """
@@ -22,9 +26,96 @@ def sync_input(source_key, target_key):
     if source_key in st.session_state:
         st.session_state[target_key] = st.session_state[source_key]
 
+@st.fragment
+@release_sessions()
+def render_score_entry(diagnostic_service: DiagnosticService, student_id: int, skill_rows: list):
+    """
+    Форма ввода баллов. Фрагмент перезапускается отдельно от страницы:
+    движение ползунка не вызывает повторных запросов учеников, навыков и графиков.
+    """
+    # МЫ УБРАЛИ st.form, чтобы работала синхронизация
+    c1, c2 = st.columns(2)
+    with c1:
+        selected_type_ru = st.selectbox("Тип диагностики", list(TYPE_MAPPING.values()))
+        d_type = [k for k, v in TYPE_MAPPING.items() if v == selected_type_ru][0]
+    with c2:
+        st.info("Изменение ползунка автоматически меняет число и наоборот.")
+
+    # Ключи полей этого ученика; поля давно не открытых учеников вытесняются
+    DIAG_SCORES.use(student_id, *[f"{prefix}_{student_id}_{skill_id}" for skill_id, _, _ in skill_rows for prefix in ("num", "slide")])
+
+    # Итоговые значения собираем из st.session_state при нажатии кнопки
+    current_group = None
+    
+    # Контейнер для списка навыков
+    for skill_id, skill_name, group_name in skill_rows:
+        # Группировка
+        if group_name != current_group:
+            st.markdown(f"#### {group_name}")
+            current_group = group_name
+
+        # Уникальные ключи
+        base_key = f"{student_id}_{skill_id}"
+        num_key = f"num_{base_key}"
+        slide_key = f"slide_{base_key}"
+
+        # Инициализация значений (по умолчанию 0)
+        if num_key not in st.session_state:
+            st.session_state[num_key] = 0
+        if slide_key not in st.session_state:
+            st.session_state[slide_key] = 0
+
+        # Верстка в одну строку
+        col_input, col_slider = st.columns([1, 4])
+        
+        with col_input:
+            st.number_input(
+                label="Балл",
+                min_value=0, max_value=5,
+                label_visibility="collapsed",
+                key=num_key,
+                on_change=sync_input,
+                args=(num_key, slide_key) 
+            )
+        
+        with col_slider:
+            st.slider(
+                label=skill_name,
+                min_value=0, max_value=5,
+                label_visibility="visible",
+                key=slide_key,
+                on_change=sync_input,
+                args=(slide_key, num_key)
+            )
+
+    st.markdown("---")
+    comment = st.text_area("Заключение специалиста")
+    
+    # Кнопка сохранения (Обычная, не внутри формы)
+    if st.button("💾 Сохранить результаты", type="primary"):
+        input_scores = {
+            skill_id: st.session_state[f"num_{student_id}_{skill_id}"]
+            for skill_id, _, _ in skill_rows
+        }
+
+        diagnostic_service.save_diagnostic(
+            student_id=student_id,
+            teacher_id=1,
+            d_type=d_type,
+            scores=input_scores,
+            summary=comment
+        )
+        
+        # КРАСИВОЕ УВЕДОМЛЕНИЕ (показывается после полного перезапуска)
+        st.session_state["diag_msg"] = "Результаты диагностики успешно сохранены!"
+        st.rerun()  # полный перезапуск: график должен увидеть новую диагностику
+
 def show_diagnostics_page():
     st.header("🩺 Диагностика и Профиль развития")
 
+    if "diag_msg" in st.session_state:
+        st.toast(st.session_state.pop("diag_msg"), icon="🩺")
+
     db = next(get_db())
     student_service = StudentService(db)
     diagnostic_service = DiagnosticService(db)
@@ -49,128 +140,37 @@ def show_diagnostics_page():
     # --- Вкладка 1: Ввод данных ---
     with tab1:
         st.subheader("Оценка навыков")
-        skills = diagnostic_service.get_assessment_skills()
+        # Справочник навыков загружается один раз за полный прогон страницы
+        # и передается во фрагмент простыми кортежами
+        skill_rows = diagnostic_service.get_assessment_skill_rows()
         
-        if not skills:
+        if not skill_rows:
             st.error("Справочник навыков пуст.")
         else:
-            # МЫ УБРАЛИ st.form, чтобы работала синхронизация
-            c1, c2 = st.columns(2)
-            with c1:
-                selected_type_ru = st.selectbox("Тип диагностики", list(TYPE_MAPPING.values()))
-                d_type = [k for k, v in TYPE_MAPPING.items() if v == selected_type_ru][0]
-            with c2:
-                st.info("Изменение ползунка автоматически меняет число и наоборот.")
-
-            # Словарь для сбора итоговых значений
-            # Мы будем собирать их из st.session_state при нажатии кнопки
-            current_group = None
-            
-            # Контейнер для списка навыков
-            for skill in skills:
-                # Группировка
-                group_name = skill.parent.name if skill.parent else "Общие навыки"
-                if group_name != current_group:
-                    st.markdown(f"#### {group_name}")
-                    current_group = group_name
-
-                # Уникальные ключи
-                base_key = f"{selected_student_id}_{skill.id}"
-                num_key = f"num_{base_key}"
-                slide_key = f"slide_{base_key}"
-
-                # Инициализация значений (по умолчанию 0)
-                if num_key not in st.session_state:
-                    st.session_state[num_key] = 0
-                if slide_key not in st.session_state:
-                    st.session_state[slide_key] = 0
-
-                # Верстка в одну строку
-                col_input, col_slider = st.columns([1, 4])
-                
-                with col_input:
-                    st.number_input(
-                        label="Балл",
-                        min_value=0, max_value=5,
-                        label_visibility="collapsed",
-                        key=num_key,
-                        on_change=sync_input,
-                        args=(num_key, slide_key) 
-                    )
-                
-                with col_slider:
-                    st.slider(
-                        label=skill.name,
-                        min_value=0, max_value=5,
-                        label_visibility="visible",
-                        key=slide_key,
-                        on_change=sync_input,
-                        args=(slide_key, num_key)
-                    )
-
-            st.markdown("---")
-            comment = st.text_area("Заключение специалиста")
-            
-            # Кнопка сохранения (Обычная, не внутри формы)
-            save_clicked = st.button("💾 Сохранить результаты", type="primary")
-
-            if save_clicked:
-                # ВАЛИДАЦИЯ (например, проверка на пустой комментарий - опционально)
-                
-                input_scores = {}
-                for skill in skills:
-                    key = f"num_{selected_student_id}_{skill.id}"
-                    input_scores[skill.id] = st.session_state[key]
-
-                diagnostic_service.save_diagnostic(
-                    student_id=selected_student_id,
-                    teacher_id=1,
-                    d_type=d_type,
-                    scores=input_scores,
-                    summary=comment
-                )
-                
-                # КРАСИВОЕ УВЕДОМЛЕНИЕ
-                st.toast("Результаты диагностики успешно сохранены!", icon="🩺")
-                st.rerun()
+            render_score_entry(diagnostic_service, selected_student_id, skill_rows)
 
     # --- Вкладка 2: Сравнительный график ---
     with tab2:
         st.subheader("Мониторинг динамики")
         
-        all_diags = diagnostic_service.get_all_diagnostics(selected_student_id)
+        # Профиль уже развернут по этапам: (Группа, Навык) × последний срез каждого типа
+        profile = diagnostic_service.get_progress_profile(selected_student_id)
         
-        if not all_diags:
+        if not profile.stages:
             st.info("Нет данных диагностики.")
         else:
-            # --- ЛОГИКА ФИЛЬТРАЦИИ ---
-            # Оставляем только ПОСЛЕДНЮЮ запись каждого типа
-            latest_diagnostics_map = {}
-            for diag in all_diags:
-                latest_diagnostics_map[diag.type] = diag
-            
-            filtered_diags = list(latest_diagnostics_map.values())
-            
-            # Сортировка порядка слоев (Первичная -> Промежуточная -> Итоговая)
-            order = ["primary", "intermediate", "final"]
-            filtered_diags.sort(key=lambda x: order.index(x.type.value) if x.type.value in order else 99)
-
-            # Данные для Plotly
-            chart_data = []
-            for diag in filtered_diags:
-                type_name = TYPE_MAPPING.get(diag.type.value, diag.type.value)
-                legend_label = f"{type_name} ({diag.date.strftime('%d.%m')})"
-                
-                for res in diag.results:
-                    chart_data.append({
-                        "Навык": res.skill.name,
-                        "Баллы": res.score,
-                        "Этап": legend_label,
-                        "Группа": res.skill.parent.name if res.skill.parent else "Общее"
-                    })
+            # Подписи этапов: "Первичная (08.02)"
+            stage_labels = {
+                stage.type: f"{TYPE_MAPPING.get(stage.type, stage.type)} ({stage.date.strftime('%d.%m')})"
+                for stage in profile.stages
+            }
             
-            if chart_data:
-                df = pd.DataFrame(chart_data)
+            if profile.scores:
+                # Данные для Plotly (длинный формат)
+                df = profile.frame().rename(columns=stage_labels)\
+                    .reset_index()\
+                    .melt(id_vars=["Группа", "Навык"], var_name="Этап", value_name="Баллы")\
+                    .dropna(subset=["Баллы"])
                 
                 # Построение графика
                 fig = px.line_polar(
@@ -189,9 +189,9 @@ def show_diagnostics_page():
                 
                 # Текстовая история
                 with st.expander("Детальная история (Показаны последние срезы)"):
-                    for diag in filtered_diags:
-                        type_ru = TYPE_MAPPING.get(diag.type.value, diag.type.value)
-                        st.markdown(f"**{type_ru} — {diag.date}**")
-                        st.write(f"_{diag.summary if diag.summary else 'Без комментария'}_")
+                    for stage in profile.stages:
+                        type_ru = TYPE_MAPPING.get(stage.type, stage.type)
+                        st.markdown(f"**{type_ru} — {stage.date}**")
+                        st.write(f"_{stage.summary if stage.summary else 'Без комментария'}_")
             else:
                 st.warning("Данные есть, но результаты пустые.")
\ No newline at end of file
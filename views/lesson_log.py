@@ -1,19 +1,140 @@
 import streamlit as st
 import datetime
-from database.connection import get_db
+import uuid
+from database.connection import get_db, release_sessions
 from services.student_service import StudentService
 from services.log_service import LogService
+from services.journal_queue import get_journal_queue
+from utils.state_store import StateStore
 from database.models import LogStatus
 
 STATUS_MAPPING = {"completed": "Выполнено", "failed": "Не справился", "skipped": "Пропущено"}
 REVERSE_STATUS_MAPPING = {v: k for k, v in STATUS_MAPPING.items()}
 
+# Поля журнала по дням (план + дата) и выбранный день по неделям.
+# Открытые ранее дни вытесняются из памяти сессии.
+JOURNAL_DAYS = StateStore("journal_days", max_groups=14, ttl_seconds=4 * 3600)
+JOURNAL_WEEKS = StateStore("journal_weeks", max_groups=8, ttl_seconds=4 * 3600)
+
+def journal_author() -> str:
+    """Идентификатор сессии пользователя: по нему очередь отличает свои сохранения от чужих."""
+    if "journal_author" not in st.session_state:
+        st.session_state["journal_author"] = uuid.uuid4().hex
+    return st.session_state["journal_author"]
+
 def sync_log_score(source, target):
     if source in st.session_state:
         st.session_state[target] = st.session_state[source]
 
+@st.fragment
+@release_sessions()
+def render_day_editor(log_service: LogService, item_rows: list, current_date: datetime.date, day_name: str, day_values: dict):
+    """
+    Форма одного дня журнала. Фрагмент перезапускается отдельно от страницы:
+    изменение оценки не перечитывает учеников, план и журнал недели.
+    item_rows: [(plan_item_id, название, инвентарь)]
+    day_values: {plan_item_id: (статус, балл, заметка, версия)} — уже сохраненные данные
+    """
+    # --- РИСУЕМ ФОРМУ ДЛЯ ОДНОГО ДНЯ ---
+    # Важно: используем current_date в ключах (key), чтобы виджеты были уникальны для каждого дня
+    
+    with st.container():
+        for item_id, title, materials in item_rows:
+            # Данные из базы или дефолт
+            status_val, score_val, note_val, _ = day_values.get(item_id, ("Выполнено", 5, "", None))
+
+            # Уникальные ключи: ID_Упражнения + ДАТА
+            bk = f"{item_id}_{current_date}"
+            
+            # Инициализация
+            if f"num_{bk}" not in st.session_state: st.session_state[f"num_{bk}"] = score_val
+            if f"slide_{bk}" not in st.session_state: st.session_state[f"slide_{bk}"] = score_val
+
+            c1, c2, c3, c4 = st.columns([2, 1.5, 2, 3])
+            with c1:
+                st.write(f"**{title}**")
+                st.caption(f"{materials or ''}")
+            with c2:
+                st.selectbox("Статус", list(STATUS_MAPPING.values()), 
+                             index=list(STATUS_MAPPING.values()).index(status_val), 
+                             key=f"stat_{bk}", label_visibility="collapsed")
+            with c3:
+                # Оценка
+                col_n, col_s = st.columns([1,2])
+                col_n.number_input("Б", 1, 5, key=f"num_{bk}", on_change=sync_log_score, args=(f"num_{bk}", f"slide_{bk}"), label_visibility="collapsed")
+                col_s.slider("Б", 1, 5, key=f"slide_{bk}", on_change=sync_log_score, args=(f"slide_{bk}", f"num_{bk}"), label_visibility="collapsed")
+            with c4:
+                st.text_input("Заметка", value=note_val, key=f"note_{bk}", placeholder="Комментарий...", label_visibility="collapsed")
+            
+            st.divider()
+        
+        # Кнопка сохранения для выбранного дня
+        if st.button(f"💾 Сохранить за {day_name}", key=f"save_btn_{current_date}"):
+            entries = []
+            for item_id, _, _ in item_rows:
+                bk = f"{item_id}_{current_date}"
+                # Берем из стейта (с проверкой на наличие ключа)
+                if f"stat_{bk}" in st.session_state:
+                    entries.append({
+                        "item_id": item_id,
+                        "date": current_date,
+                        "status": REVERSE_STATUS_MAPPING[st.session_state[f"stat_{bk}"]],
+                        "score": st.session_state[f"num_{bk}"],
+                        "notes": st.session_state[f"note_{bk}"],
+                        # Версия записи, которую видел пользователь: чужие изменения не перезаписываются
+                        "version": day_values[item_id][3] if item_id in day_values else None,
+                        "author": journal_author(),
+                    })
+
+            try:
+                # Запись в локальную очередь; в БД ее перенесет фоновый процесс
+                get_journal_queue().enqueue(entries)
+            except Exception as e:
+                st.error(f"Ошибка при сохранении: {e}")
+            else:
+                # Полный перезапуск, чтобы обновились отметки заполненных дней
+                st.session_state["log_msg"] = f"Сохранено {len(entries)} записей за {day_name}!"
+                st.rerun()
+
+def render_conflicts(item_rows: list, current_date: datetime.date, day_group: str, day_conflicts: dict):
+    """Записи дня, не сохраненные из-за изменений другого специалиста: выбор, чьи значения оставить."""
+    titles = {item_id: title for item_id, title, _ in item_rows}
+
+    def describe(values):
+        if values is None:
+            return "запись удалена"
+        note = f", «{values['notes']}»" if values["notes"] else ""
+        return f"{STATUS_MAPPING.get(values['status'], values['status'])}, {values['score']}{note}"
+
+    with st.container(border=True):
+        st.warning("⚠️ Часть записей этого дня уже изменил другой специалист. Ваши значения не сохранены.")
+        for item_id, conflict in day_conflicts.items():
+            st.markdown(
+                f"**{titles.get(item_id, item_id)}** — в базе: {describe(conflict['current'])}; "
+                f"ваши: {describe(conflict['entry'])}"
+            )
+
+        queue = get_journal_queue()
+        c1, c2 = st.columns(2)
+        if c1.button("Оставить значения из базы", key=f"conflict_keep_{current_date}"):
+            queue.discard_conflicts(journal_author(), [(item_id, current_date) for item_id in day_conflicts])
+            # Сбрасываем поля формы, чтобы они заново заполнились из базы
+            JOURNAL_DAYS.evict(day_group)
+            st.rerun()
+        if c2.button("Сохранить мои значения", key=f"conflict_override_{current_date}"):
+            queue.enqueue([
+                dict(conflict["entry"], date=current_date,
+                     version=conflict["current"]["version"] if conflict["current"] else None)
+                for conflict in day_conflicts.values()
+            ])
+            st.session_state["log_msg"] = f"Перезаписано {len(day_conflicts)} записей."
+            st.rerun()
+
 def show_log_page():
     st.header("📅 Дневник занятий (Недельный вид)")
+
+    if "log_msg" in st.session_state:
+        st.toast(st.session_state.pop("log_msg"), icon="📝")
     
     db = next(get_db())
     student_service = StudentService(db)
@@ -47,89 +168,57 @@ def show_log_page():
 
     st.markdown("---")
 
-    # 3. Генерация вкладок по дням недели
-    # Список названий вкладок
+    # 3. Журнал за всю неделю — одним запросом
+    week_logs = log_service.get_logs_for_range(active_plan.id, start_of_week, end_of_week)
+    items = active_plan.items
+
+    # Сохраненные, но еще не перенесенные в БД записи поверх данных из БД
+    week_pending = get_journal_queue().pending([item.id for item in items], start_of_week, end_of_week)
+
+    # 4. Выбор дня. Виджеты строятся только для выбранного дня
+    # (вкладки st.tabs выполняли код всех семи дней на каждом перезапуске)
     days_ru = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+    days_short = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+    def day_label(i):
+        day = start_of_week + datetime.timedelta(days=i)
+        filled = len(week_logs.get(day, {}).keys() | week_pending.get(day, {}).keys())
+        mark = f" ✅ {filled}/{len(items)}" if filled else ""
+        return f"{days_short[i]} {day.strftime('%d.%m')}{mark}"
+
+    today = datetime.date.today()
+    default_day = today.weekday() if start_of_week <= today <= end_of_week else 0
+    JOURNAL_WEEKS.use(start_of_week, f"log_day_{start_of_week}")
+    i = st.radio("День:", list(range(7)), index=default_day, format_func=day_label,
+                 horizontal=True, key=f"log_day_{start_of_week}", label_visibility="collapsed")
+
+    # Вычисляем дату выбранного дня
+    current_date = start_of_week + datetime.timedelta(days=i)
+    st.subheader(f"{days_ru[i]}, {current_date.strftime('%d.%m.%Y')}")
     
-    # Создаем 7 вкладок
-    tabs = st.tabs([f"{day} ({ (start_of_week + datetime.timedelta(days=i)).strftime('%d.%m') })" for i, day in enumerate(days_ru)])
-
-    # 4. Наполняем каждую вкладку
-    for i, tab in enumerate(tabs):
-        with tab:
-            # Вычисляем дату для этой конкретной вкладки
-            current_date = start_of_week + datetime.timedelta(days=i)
-            
-            # Проверяем, будущее ли это (опционально, можно разрешить планировать вперед)
-            is_future = current_date > datetime.date.today()
-            if is_future:
-                st.caption("⚠️ Это дата в будущем. Вы можете заполнить план заранее.")
+    # Проверяем, будущее ли это (опционально, можно разрешить планировать вперед)
+    is_future = current_date > today
+    if is_future:
+        st.caption("⚠️ Это дата в будущем. Вы можете заполнить план заранее.")
 
-            # Загружаем логи именно для ЭТОГО дня
-            day_logs = log_service.get_logs_for_date(active_plan.id, current_date)
-            
-            # --- РИСУЕМ ФОРМУ ДЛЯ ОДНОГО ДНЯ ---
-            # Важно: используем current_date в ключах (key), чтобы виджеты были уникальны для каждой вкладки
-            
-            with st.container():
-                cnt = 0
-                for item in active_plan.items:
-                    ex = item.exercise
-                    
-                    # Данные из базы или дефолт
-                    if item.id in day_logs:
-                        l = day_logs[item.id]
-                        status_val = STATUS_MAPPING.get(l.status.value, "Выполнено")
-                        score_val = l.performance_score
-                        note_val = l.teacher_notes or ""
-                    else:
-                        status_val = "Выполнено"
-                        score_val = 5
-                        note_val = ""
-
-                    # Уникальные ключи: ID_Упражнения + ДАТА
-                    bk = f"{item.id}_{current_date}"
-                    
-                    # Инициализация
-                    if f"num_{bk}" not in st.session_state: st.session_state[f"num_{bk}"] = score_val
-                    if f"slide_{bk}" not in st.session_state: st.session_state[f"slide_{bk}"] = score_val
-
-                    c1, c2, c3, c4 = st.columns([2, 1.5, 2, 3])
-                    with c1:
-                        st.write(f"**{ex.title}**")
-                        st.caption(f"{ex.materials or ''}")
-                    with c2:
-                        st.selectbox("Статус", list(STATUS_MAPPING.values()), 
-                                     index=list(STATUS_MAPPING.values()).index(status_val), 
-                                     key=f"stat_{bk}", label_visibility="collapsed")
-                    with c3:
-                        # Оценка
-                        col_n, col_s = st.columns([1,2])
-                        col_n.number_input("Б", 1, 5, key=f"num_{bk}", on_change=sync_log_score, args=(f"num_{bk}", f"slide_{bk}"), label_visibility="collapsed")
-                        col_s.slider("Б", 1, 5, key=f"slide_{bk}", on_change=sync_log_score, args=(f"slide_{bk}", f"num_{bk}"), label_visibility="collapsed")
-                    with c4:
-                        st.text_input("Заметка", value=note_val, key=f"note_{bk}", placeholder="Комментарий...", label_visibility="collapsed")
-                    
-                    st.divider()
-                    cnt += 1
-                
-                # Кнопка сохранения для конкретного дня
-                if st.button(f"💾 Сохранить за {days_ru[i]}", key=f"save_btn_{current_date}"):
-                    saved_count = 0
-                    try:
-                        for item in active_plan.items:
-                            bk = f"{item.id}_{current_date}"
-                            # Берем из стейта (с проверкой на наличие ключа)
-                            if f"stat_{bk}" in st.session_state:
-                                s_ru = st.session_state[f"stat_{bk}"]
-                                score = st.session_state[f"num_{bk}"]
-                                note = st.session_state[f"note_{bk}"]
-                                
-                                log_service.save_daily_log(
-                                    item.id, current_date, REVERSE_STATUS_MAPPING[s_ru], score, note
-                                )
-                                saved_count += 1
-                        
-                        st.toast(f"Сохранено {saved_count} записей за {days_ru[i]}!", icon="📝")
-                    except Exception as e:
-                        st.error(f"Ошибка при сохранении: {e}")
\ No newline at end of file
+    # Записи именно для ЭТОГО дня (уже загружены вместе с неделей).
+    # Во фрагмент передаем простые данные: его перезапуски не обращаются к БД.
+    item_rows = [(item.id, item.exercise_title, item.materials) for item in items]
+    day_values = {
+        item_id: (STATUS_MAPPING.get(l.status.value, "Выполнено"), l.performance_score, l.teacher_notes or "", l.version)
+        for item_id, l in week_logs.get(current_date, {}).items()
+    }
+    for item_id, entry in week_pending.get(current_date, {}).items():
+        day_values[item_id] = (STATUS_MAPPING.get(entry["status"], "Выполнено"), entry["score"], entry["notes"] or "", entry["version"])
+    day_group = f"{active_plan.id}_{current_date}"
+    JOURNAL_DAYS.use(
+        day_group,
+        *[f"{prefix}_{item_id}_{current_date}" for item_id, _, _ in item_rows for prefix in ("num", "slide", "stat", "note")]
+    )
+
+    # 5. Конфликты: записи, которые другой специалист изменил раньше, чем перенеслась наша очередь
+    conflicts = get_journal_queue().conflicts(journal_author(), [item.id for item in items], current_date, current_date)
+    day_conflicts = conflicts.get(current_date, {})
+    if day_conflicts:
+        render_conflicts(item_rows, current_date, day_group, day_conflicts)
+    render_day_editor(log_service, item_rows, current_date, days_ru[i], day_values)
\ No newline at end of file
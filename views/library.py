@@ -37,7 +37,7 @@ def show_library_page():
                 c1, c2, c3, c4, c5, c6, c7 = st.columns([0.5, 3, 2, 1, 1, 2, 0.5])
                 c1.write(str(ex.id))
                 c2.write(ex.title)
-                c3.write(ex.skill.name if ex.skill else "—")
+                c3.write(ex.skill_name or "—")
                 c4.write(str(ex.difficulty_level))
                 c5.write(f"{ex.effectiveness_score} ⭐")
                 c6.write(ex.materials)
@@ -47,7 +47,7 @@ def show_library_page():
                     st.session_state["lib_msg"] = "Методика удалена из базы."
                     st.rerun()
                 
-                if ex.contraindications: st.caption(f"⛔ {ex.contraindications}")
+                if ex.contraindications: st.caption(f"⛔ {', '.join(ex.contraindications)}")
                 st.markdown("---")
 
     # --- Вкладка 2: Создание ---
@@ -83,9 +83,7 @@ def show_library_page():
                     st.error("Название методики обязательно!")
                 else:
                     score = st.session_state["num_new_score"]
-                    new_ex = service.create_exercise(title, desc, skill_id, diff, mat, dur, score)
-                    new_ex.contraindications = ",".join(contras)
-                    db.commit()
+                    service.create_exercise(title, desc, skill_id, diff, mat, dur, score, contras)
                     
                     st.session_state["lib_msg"] = f"Методика '{title}' успешно добавлена!"
                     st.rerun()
@@ -98,7 +96,7 @@ def show_library_page():
             st.info("Нет методик.")
         else:
             sel_id = st.selectbox("Выберите методику:", list(ex_opts.keys()), format_func=lambda x: ex_opts[x])
-            target_ex = [x for x in service.get_all_exercises() if x.id == sel_id][0]
+            target_ex = service.get_exercise_by_id(sel_id)
             
             c1, c2 = st.columns(2)
             with c1:
@@ -113,7 +111,7 @@ def show_library_page():
                 with cc1: st.number_input("Р", 0.0, 10.0, step=0.5, key="num_e_score", on_change=sync_rating, args=("num_e_score", "slide_e_score"))
                 with cc2: st.slider("Р", 0.0, 10.0, step=0.5, key="slide_e_score", on_change=sync_rating, args=("slide_e_score", "num_e_score"), label_visibility="collapsed")
 
-            cur_con = [x for x in (target_ex.contraindications.split(",") if target_ex.contraindications else []) if x in MEDICAL_TAGS]
+            cur_con = [x for x in target_ex.contraindications if x in MEDICAL_TAGS]
             e_contras = st.multiselect("⛔ Противопоказания", options=MEDICAL_TAGS, default=cur_con, key="e_contras")
             e_desc = st.text_area("Описание", value=target_ex.description, key="e_desc")
 
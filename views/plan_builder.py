@@ -2,9 +2,41 @@ import streamlit as st
 import datetime
 import pandas as pd
 from database.connection import get_db
-from database.models import EducationalPlan, PlanStatus, Exercise
+from database.models import Exercise
+from services.log_service import LogService
 from services.student_service import StudentService
-from services.trajectory_service import TrajectoryService
+from services.trajectory_service import PlanHistoryError, TrajectoryService
+from services.concurrency import VersionConflictError
+from utils.state_store import StateStore
+
+# Черновики планов по ученикам: в памяти сессии держим не больше 10 последних
+PLAN_DRAFTS = StateStore("plan_drafts", max_groups=10, ttl_seconds=4 * 3600)
+# (id, версия) активного плана, от которого начато редактирование черновика
+PLAN_BASES = StateStore("plan_bases", max_groups=10, ttl_seconds=4 * 3600)
+
+def _save_plan(trajectory_service, student_id, goal, start_d, end_d, ids_to_save, mode, drop_history=False):
+    """
+    Сохранение черновика: mode="edit" — изменить активный план на месте
+    (журнал оставшихся упражнений сохраняется), mode="new" — новая версия плана,
+    текущий уходит в архив. Возвращает текст уведомления.
+    """
+    base = PLAN_BASES.get(student_id)
+    if mode == "edit" and base:
+        diff = trajectory_service.update_plan_items(
+            base, ids_to_save, goal, start_d, end_d, drop_history=drop_history
+        )
+        PLAN_BASES.set(student_id, (base[0], diff["version"]))
+        return (f"План обновлен: добавлено {diff['added']}, убрано {diff['removed']}, "
+                f"переставлено {diff['moved']}.")
+
+    final_objs = trajectory_service.db.query(Exercise).filter(Exercise.id.in_(ids_to_save)).all()
+    # Порядок как в черновике
+    final_objs.sort(key=lambda ex: ids_to_save.index(ex.id))
+    new_plan = trajectory_service.create_educational_plan(
+        student_id, 1, goal, start_d, end_d, final_objs, base_plan=base
+    )
+    PLAN_BASES.set(student_id, (new_plan.id, new_plan.version))
+    return f"План успешно сохранен! ({len(final_objs)} упр.)"
 
 def show_plan_builder():
     st.header("🚀 Конструктор траектории (ИОМ)")
@@ -31,38 +63,82 @@ def show_plan_builder():
     st.markdown("---")
 
     # --- УПРАВЛЕНИЕ СОСТОЯНИЕМ (State Management) ---
-    session_key = f"plan_data_{selected_student_id}"
-
     # Если данных в памяти нет, пытаемся загрузить АКТИВНЫЙ план из БД
-    if session_key not in st.session_state:
-        active_plan = db.query(EducationalPlan).filter(
-            EducationalPlan.student_id == selected_student_id,
-            EducationalPlan.status == PlanStatus.ACTIVE
-        ).order_by(EducationalPlan.created_at.desc()).first() # Берем самый свежий
+    if selected_student_id not in PLAN_DRAFTS:
+        active_plan = LogService(db).get_active_plan(selected_student_id) # Самый свежий, с пунктами по порядку
 
         if active_plan:
             # Превращаем сохраненный план в список для редактора
             loaded_data = []
             for item in active_plan.items:
-                ex = item.exercise
+                if item.exercise_id is None:
+                    continue # Методику удалили из базы
                 loaded_data.append({
-                    "id": ex.id,
-                    "title": ex.title,
-                    "skill": ex.skill.name if ex.skill else "—",
-                    "score": ex.effectiveness_score,
-                    "materials": ex.materials,
+                    "id": item.exercise_id,
+                    "title": item.exercise_title,
+                    "skill": item.skill_name or "—",
+                    "score": item.effectiveness_score,
+                    "materials": item.materials,
                     "selected": True # Они выбраны, так как уже в плане
                 })
-            st.session_state[session_key] = loaded_data
+            PLAN_DRAFTS.set(selected_student_id, loaded_data)
+            PLAN_BASES.set(selected_student_id, (active_plan.id, active_plan.version))
             st.info(f"📂 Загружен текущий план: {len(loaded_data)} упражнений.")
         else:
-            st.session_state[session_key] = [] # Плана нет
+            PLAN_DRAFTS.set(selected_student_id, []) # Плана нет
+            PLAN_BASES.set(selected_student_id, None)
+    elif selected_student_id not in PLAN_BASES:
+        PLAN_BASES.set(selected_student_id, trajectory_service.get_active_plan_version(selected_student_id))
+
+    # --- КОНФЛИКТ: план успел сохранить другой специалист ---
+    conflict_key = f"pb_conflict_{selected_student_id}"
+    if conflict_key in st.session_state:
+        st.warning(f"⚠️ {st.session_state[conflict_key]} Ваш черновик не сохранен.")
+        c1, c2 = st.columns(2)
+        if c1.button("📂 Загрузить актуальный план"):
+            PLAN_DRAFTS.evict(selected_student_id)
+            PLAN_BASES.evict(selected_student_id)
+            del st.session_state[conflict_key]
+            st.rerun()
+        if c2.button("✍️ Продолжить с моим черновиком"):
+            # Следующее сохранение заменит текущий активный план
+            PLAN_BASES.set(selected_student_id, trajectory_service.get_active_plan_version(selected_student_id))
+            del st.session_state[conflict_key]
+            st.rerun()
+
+    # --- ПОДТВЕРЖДЕНИЕ: из плана убираются упражнения с записями дневника ---
+    history_key = f"pb_history_{selected_student_id}"
+    if history_key in st.session_state:
+        pending = st.session_state[history_key]
+        st.warning(f"⚠️ {pending['message']} Как сохранить план?")
+        c1, c2, c3 = st.columns(3)
+        choice = None
+        if c1.button("🗑️ Убрать вместе с записями дневника"):
+            choice = ("edit", True)
+        if c2.button("🗂 Новая версия плана (история останется в архиве)"):
+            choice = ("new", False)
+        if c3.button("Отмена"):
+            del st.session_state[history_key]
+            st.rerun()
+        if choice:
+            del st.session_state[history_key]
+            try:
+                message = _save_plan(trajectory_service, selected_student_id, *pending["params"],
+                                     mode=choice[0], drop_history=choice[1])
+            except VersionConflictError as e:
+                st.session_state[conflict_key] = str(e)
+                st.rerun()
+            st.toast(message, icon="🚀")
+            saved_ids = pending["params"][3]
+            PLAN_DRAFTS.set(selected_student_id,
+                            [row for row in PLAN_DRAFTS.get(selected_student_id) if row["id"] in saved_ids])
+            st.rerun()
 
     # --- КНОПКИ ---
     col1, col2 = st.columns([1, 3])
     with col1:
         # Если список пуст - кнопка "Сгенерировать". Если не пуст - "Пересоздать"
-        has_data = len(st.session_state[session_key]) > 0
+        has_data = len(PLAN_DRAFTS.get(selected_student_id)) > 0
         label = "♻️ Пересоздать (Новый поиск)" if has_data else "🤖 Сгенерировать рекомендации"
         
         if st.button(label, type="primary"):
@@ -71,7 +147,7 @@ def show_plan_builder():
             
             if not weak_points:
                 st.warning("Дефицитов не найдено или нет диагностики.")
-                st.session_state[session_key] = []
+                PLAN_DRAFTS.set(selected_student_id, [])
             else:
                 # Получаем новые рекомендации
                 recs_objects = trajectory_service.get_recommendations(selected_student_id, list(weak_points.keys()))
@@ -82,17 +158,17 @@ def show_plan_builder():
                     new_data.append({
                         "id": ex.id,
                         "title": ex.title,
-                        "skill": ex.skill.name if ex.skill else "—",
+                        "skill": ex.skill_name or "—",
                         "score": ex.effectiveness_score,
                         "materials": ex.materials,
                         "selected": True # По умолчанию предлагаем все
                     })
-                st.session_state[session_key] = new_data
+                PLAN_DRAFTS.set(selected_student_id, new_data)
                 st.toast(f"Алгоритм предложил {len(new_data)} вариантов", icon="🤖")
                 st.rerun()
 
     # --- ТАБЛИЦА ---
-    current_data = st.session_state[session_key]
+    current_data = PLAN_DRAFTS.get(selected_student_id)
 
     if current_data:
         st.subheader("Состав программы")
@@ -124,7 +200,18 @@ def show_plan_builder():
             )
 
             # --- ЛОГИКА СОХРАНЕНИЯ С ВАЛИДАЦИЕЙ ---
-            if st.form_submit_button("💾 Сохранить активный план"):
+            # Есть активный план — по умолчанию меняем его на месте, журнал упражнений сохраняется
+            has_base = PLAN_BASES.get(selected_student_id) is not None
+            b1, b2 = st.columns(2)
+            if has_base:
+                save_edit = b1.form_submit_button("💾 Сохранить изменения", type="primary")
+                save_new = b2.form_submit_button("🗂 Сохранить как новую версию",
+                                                 help="Текущий план уйдет в архив вместе с журналом")
+            else:
+                save_edit = False
+                save_new = b1.form_submit_button("💾 Сохранить активный план", type="primary")
+
+            if save_edit or save_new:
                 
                 # 1. Валидация дат
                 if start_d >= end_d:
@@ -143,17 +230,20 @@ def show_plan_builder():
                 if not ids_to_save:
                     st.error("Ошибка: План пуст. Выберите хотя бы одно упражнение.")
                 else:
-                    # Загружаем "живые" объекты из БД для сохранения
-                    final_objs = db.query(Exercise).filter(Exercise.id.in_(ids_to_save)).all()
-                    
-                    # Сохраняем (старые уйдут в архив автоматически)
-                    trajectory_service.create_educational_plan(
-                        selected_student_id, 1, goal, start_d, end_d, final_objs
-                    )
+                    params = (goal, start_d, end_d, [int(i) for i in ids_to_save])
+                    try:
+                        message = _save_plan(trajectory_service, selected_student_id, *params,
+                                             mode="edit" if save_edit else "new")
+                    except PlanHistoryError as e:
+                        st.session_state[history_key] = {"message": str(e), "params": params}
+                        st.rerun()
+                    except VersionConflictError as e:
+                        st.session_state[conflict_key] = str(e)
+                        st.rerun()
                     
-                    st.toast(f"План успешно сохранен! ({len(final_objs)} упр.)", icon="🚀")
+                    st.toast(message, icon="🚀")
                     
-                    # Обновляем session_state, оставляя только выбранные (чтобы галочки не сбрасывались)
+                    # Обновляем черновик, оставляя только выбранные (чтобы галочки не сбрасывались)
                     updated_view = [row for row in current_data if row["id"] in ids_to_save]
-                    st.session_state[session_key] = updated_view
+                    PLAN_DRAFTS.set(selected_student_id, updated_view)
                     st.rerun()
\ No newline at end of file
@@ -1,14 +1,17 @@
 import streamlit as st
-from database.connection import get_db
+import pandas as pd
+import plotly.express as px
+from database.connection import get_read_db
 from services.student_service import StudentService
-from database.models import EducationalPlan, PlanStatus
+from database.models import PlanStatus
 from services.log_service import LogService # <--- Импортируем сервис логов
 from utils.report_generator import generate_word_report
 
 def show_reports_page():
     st.header("🖨️ Отчетность и Экспорт")
 
-    db = next(get_db())
+    # Только чтение: один снимок базы на перезапуск, запись журнала не ждет отчетов
+    db = next(get_read_db())
     student_service = StudentService(db)
     # Инициализируем сервис логов
     log_service = LogService(db)
@@ -20,37 +23,58 @@ def show_reports_page():
     student_options = {s.id: f"{s.full_name}" for s in students}
     selected_student_id = st.selectbox("Ученик:", list(student_options.keys()), format_func=lambda x: student_options[x])
 
-    # Ищем активный план
-    current_plan = db.query(EducationalPlan)\
-        .filter(EducationalPlan.student_id == selected_student_id)\
-        .filter(EducationalPlan.status == PlanStatus.ACTIVE)\
-        .order_by(EducationalPlan.created_at.desc())\
-        .first()
+    # Планы ученика: по умолчанию активный, архивные — для исторических отчетов
+    plans = log_service.get_student_plans(selected_student_id)
+    if not plans:
+        st.info("У ученика нет планов."); return
 
-    if not current_plan:
-        st.info("У ученика нет активного плана."); return
+    def plan_label(plan):
+        if plan.status == PlanStatus.ACTIVE:
+            return f"Активный план (с {plan.start_date.strftime('%d.%m.%Y')})" if plan.start_date else "Активный план"
+        period = f": {plan.start_date.strftime('%d.%m.%Y')} — {plan.end_date.strftime('%d.%m.%Y')}" if plan.start_date and plan.end_date else ""
+        return f"Архив №{plan.id}{period}" + (" 🧊" if plan.cold_archived_at else "")
 
-    # Данные плана
-    items = current_plan.items
+    plan_opts = {p.id: p for p in plans}
+    # Ключ по ученику: выбор плана другого ученика не переносится на нового
+    selected_plan_id = st.selectbox("План:", list(plan_opts.keys()), format_func=lambda x: plan_label(plan_opts[x]),
+                                    key=f"report_plan_{selected_student_id}")
+    current_plan = plan_opts[selected_plan_id]
+    if current_plan.status != PlanStatus.ACTIVE:
+        st.caption("Отчет по архивному плану." + (" Журнал хранится в холодном архиве." if current_plan.cold_archived_at else ""))
+
+    # Данные плана (пункты архивных планов читаются из архива)
+    items = log_service.get_plan_items(current_plan.id)
     
-    # НОВОЕ: Получаем историю журнала
-    logs = log_service.get_all_logs_for_plan(current_plan.id)
+    # Сводка журнала считается в БД (без загрузки всех записей)
+    metrics = log_service.get_plan_metrics(current_plan.id)
 
     st.markdown("---")
     st.subheader(f"План: {current_plan.goal_description}")
     
     c1, c2, c3 = st.columns(3)
     c1.metric("Упражнений", len(items))
-    c2.metric("Проведено занятий", len(set([l.date for l in logs]))) # Уникальные даты
-    # Средняя оценка
-    avg_score = sum([l.performance_score for l in logs]) / len(logs) if logs else 0
-    c3.metric("Средний балл", f"{avg_score:.1f}")
+    c2.metric("Проведено занятий", metrics["sessions"]) # Уникальные даты
+    c3.metric("Средний балл", f"{metrics['avg_score']:.1f}")
+
+    # Динамика по каждому упражнению
+    series = log_service.get_exercise_score_series(current_plan.id)
+    if series:
+        bucket_caption = {"day": "по дням", "week": "по неделям", "month": "по месяцам"}
+        st.markdown(f"#### 📈 Динамика по упражнениям ({bucket_caption[series[0]['bucket']]})")
+
+        df = pd.DataFrame(series).rename(columns={"period": "Период", "avg_score": "Средний балл"})
+        chart_cols = st.columns(2)
+        for idx, (title, ex_df) in enumerate(df.groupby("title", sort=False)):
+            fig = px.line(ex_df, x="Период", y="Средний балл", markers=True, range_y=[0, 5.5], title=title)
+            fig.update_layout(height=280, margin=dict(l=10, r=10, t=40, b=10))
+            chart_cols[idx % 2].plotly_chart(fig, use_container_width=True)
 
     # Предпросмотр журнала
     with st.expander("Предпросмотр данных журнала"):
-        if logs:
-            for log in logs[:5]: # Показываем последние 5
-                st.write(f"{log.date}: {log.item.exercise.title} — {log.performance_score}")
+        recent = log_service.get_recent_log_rows(current_plan.id, limit=5) # Показываем последние 5
+        if recent:
+            for row in recent:
+                st.write(f"{row['date']}: {row['title']} — {row['score']}")
         else:
             st.write("Журнал пуст.")
 
@@ -58,7 +82,8 @@ def show_reports_page():
     student = student_service.get_student_by_id(selected_student_id)
     
     if st.button("📄 Скачать полный отчет (.docx)"):
-        # Передаем logs в генератор
+        # Полную историю загружаем только для документа
+        logs = log_service.get_all_logs_for_plan(current_plan.id)
         file_buffer = generate_word_report(student, current_plan, items, logs)
         
         st.download_button(
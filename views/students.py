@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import date
 from database.connection import get_db
+from config.settings import Config
 from services.student_service import StudentService
 from config.constants import MEDICAL_TAGS, DIAGNOSIS_MAPPING
 
@@ -70,9 +71,8 @@ def show_students_page():
                     cols[2].write(s.birth_date.strftime('%d.%m.%Y'))
                     cols[3].caption(s.diagnosis_code)
                     
-                    tags = s.medical_tags.split(",") if s.medical_tags else []
-                    if tags:
-                        cols[4].caption(", ".join(tags))
+                    if s.medical_tags:
+                        cols[4].caption(", ".join(s.medical_tags))
                     else:
                         cols[4].write("—")
                         
@@ -80,10 +80,31 @@ def show_students_page():
                     
                     if cols[6].button("❌", key=f"del_student_{s.id}", help="Удалить ученика"):
                         service.delete_student(s.id)
-                        st.session_state["student_msg"] = f"Ученик {s.full_name} удален."
+                        st.session_state["student_msg"] = (
+                            f"Ученик {s.full_name} удален. Его можно восстановить в течение "
+                            f"{Config.STUDENT_PURGE_AFTER_DAYS} дней (раздел «Удаленные ученики» ниже)."
+                        )
                         st.rerun()
                     st.markdown("---")
 
+        # Мягко удаленные ученики: восстановление или окончательное удаление
+        deleted = service.get_deleted_students()
+        if deleted:
+            with st.expander(f"🗑️ Удаленные ученики ({len(deleted)})"):
+                st.caption(f"Удаляются окончательно через {Config.STUDENT_PURGE_AFTER_DAYS} дней после удаления.")
+                for s in deleted:
+                    c_name, c_date, c_restore, c_purge = st.columns([3, 2, 1, 1])
+                    c_name.write(s.full_name)
+                    c_date.caption(f"удален {s.deleted_at:%d.%m.%Y}")
+                    if c_restore.button("↩️", key=f"restore_student_{s.id}", help="Восстановить"):
+                        service.restore_student(s.id)
+                        st.session_state["student_msg"] = f"Ученик {s.full_name} восстановлен."
+                        st.rerun()
+                    if c_purge.button("🔥", key=f"purge_student_{s.id}", help="Удалить навсегда со всеми данными"):
+                        service.delete_student(s.id, hard=True)
+                        st.session_state["student_msg"] = f"Ученик {s.full_name} и все его данные удалены."
+                        st.rerun()
+
     # --- Вкладка 2: Добавление ---
     with tab2:
         st.subheader("Регистрация нового ребенка")